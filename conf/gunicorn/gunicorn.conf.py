@@ -0,0 +1,93 @@
+"""Gunicorn config for the production workers.
+
+See conf/systemd/production_gunicorn.service. The application is imported once by
+the master and the workers are forked from it, sharing its memory copy-on-write.
+Everything the master allocated is moved out of the garbage collector's reach
+before each fork, so collections in the workers do not write to (and so copy) the
+shared pages. Each worker then warms up before accepting requests, see
+webapp.warmup.
+
+Requests are logged to stdout, except auth-test when webapp.decision_log logs it.
+
+The master keeps the code it imported, so restart the service to deploy rather
+than reloading it.
+"""
+# pylint: disable=invalid-name,unused-argument,import-outside-toplevel
+import gc
+import os
+from functools import lru_cache
+
+from gunicorn.glogging import Logger
+
+bind = "unix:/var/run/gunicorn/gunicorn.socket"
+workers = 2
+threads = 3
+timeout = 60
+loglevel = "error"
+accesslog = "-"
+max_requests = 500
+# NOTE: Recycle the workers at different times so they are never all cold at once.
+max_requests_jitter = 50
+preload_app = True
+
+# NOTE: The config is read before the application is imported, so this reaches
+# the settings. Keep each request thread's database connection open for this long.
+os.environ.setdefault("DATABASE_CONN_MAX_AGE", "600")
+
+
+@lru_cache(maxsize=None)
+def get_unlogged_path():
+    """Return auth-test's path if the decision log has its requests, else None."""
+    from django.conf import settings
+    from django.urls import reverse
+
+    return reverse("auth-test") if settings.AUTH_DECISION_LOG else None
+
+
+class AccessLogger(Logger):
+    """Gunicorn's logger leaving out what the decision log has."""
+
+    def access(self, resp, req, environ, request_time):
+        """Log a request unless it is in the decision log."""
+        if environ.get("PATH_INFO") == get_unlogged_path():
+            return
+        super().access(resp, req, environ, request_time)
+
+
+logger_class = AccessLogger
+
+
+def when_ready(server):
+    """Collect the master's garbage before the first workers are forked."""
+    gc.collect()
+
+
+def pre_fork(server, worker):
+    """Leave the master's objects to the workers untouched by the collector."""
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    """Warm the worker up before it accepts requests."""
+    from webapp.warmup import warm_up
+
+    warm_up()
+
+
+def post_worker_init(worker):
+    """Open database connections on the threads that will serve requests."""
+    from webapp.warmup import connect_databases, run_on_each_thread
+
+    pool = getattr(worker, "tpool", None)
+    if pool is None:
+        connect_databases()
+    else:
+        run_on_each_thread(pool, worker.cfg.threads, connect_databases)
+
+
+def child_exit(server, worker):
+    """Tell prometheus_client a worker exited, as its multiprocess mode asks."""
+    if "prometheus_multiproc_dir" in os.environ:
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(worker.pid)
@@ -1,2 +1,7 @@
 """Webapp app."""
-from webapp.celery import app  # noqa
+from django.conf import settings
+
+# NOTE: Auth gateway workers create the celery app when they first send a task, see
+# webapp.tasks.
+if not settings.AUTH_GATEWAY:
+    from webapp.celery import app  # noqa
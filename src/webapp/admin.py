@@ -0,0 +1,39 @@
+"""Webapp admin."""
+from django.contrib import admin, messages
+
+from webapp.api_keys import make_key
+from webapp.models import APIKey, AuthRule
+
+
+@admin.register(AuthRule)
+class AuthRuleAdmin(admin.ModelAdmin):
+    """Manage auth rules, changes apply without restarting."""
+
+    list_display = ["path", "host"]
+    list_filter = ["host", "groups"]
+    search_fields = ["path", "host"]
+    filter_horizontal = ["groups", "permissions"]
+
+
+@admin.register(APIKey)
+class APIKeyAdmin(admin.ModelAdmin):
+    """Manage API keys, a new key is only shown once when it is created."""
+
+    list_display = ["name", "user", "prefix", "created", "expires"]
+    list_select_related = ["user"]
+    search_fields = ["name", "prefix", "user__username"]
+    raw_id_fields = ["user"]
+    readonly_fields = ["prefix", "created"]
+
+    def save_model(self, request, obj, form, change):
+        """Generate the key of a new API key and show it."""
+        if change:
+            super().save_model(request, obj, form, change)
+            return
+        key, obj.prefix, obj.hashed_key = make_key()
+        super().save_model(request, obj, form, change)
+        self.message_user(
+            request,
+            f"The new API key is {key} - copy it now, it will not be shown again.",
+            messages.WARNING,
+        )
@@ -0,0 +1,129 @@
+"""API keys for machine clients of the auth-test path.
+
+A key is ``<prefix>.<secret>`` and is sent as ``Authorization: Bearer <key>``. Keys
+are long and random, so unlike passwords they need no slow hash: only an
+HMAC-SHA256 of the secret is stored, and the unique prefix finds it with one indexed
+lookup. Keys are cached like sessions, so repeat requests make no queries.
+"""
+import hashlib
+import hmac
+import re
+import secrets
+from datetime import datetime
+from functools import lru_cache
+from typing import Iterable, NamedTuple, Optional, Tuple
+
+from django.conf import settings
+from django.http import HttpRequest
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare
+
+from webapp.auth import LookupRequired, get_cache
+from webapp.local_cache import LocalCache
+from webapp.models import APIKey
+
+SALT = "webapp.api_keys"
+PREFIX_LENGTH = 12
+KEY_PATTERN = re.compile(rf"[0-9a-f]{{{PREFIX_LENGTH}}}\.[A-Za-z0-9_-]+")
+
+
+class CachedKey(NamedTuple):
+    """A stored key as kept in the caches, user_id is None for unknown prefixes."""
+
+    hashed_key: str = ""
+    user_id: Optional[int] = None
+    expires: Optional[datetime] = None
+
+
+def hash_secret(secret: str) -> str:
+    """Return the keyed hash stored for a secret."""
+    key = hashlib.sha256(f"{SALT}{settings.SECRET_KEY}".encode()).digest()
+    return hmac.new(key, secret.encode(), hashlib.sha256).hexdigest()
+
+
+def make_key() -> Tuple[str, str, str]:
+    """Return a new key along with the prefix and hash to store."""
+    prefix = secrets.token_hex(PREFIX_LENGTH // 2)
+    secret = secrets.token_urlsafe(32)
+    return f"{prefix}.{secret}", prefix, hash_secret(secret)
+
+
+def api_key_cache_key(prefix: str) -> str:
+    """Return the cache key holding the stored key for a prefix."""
+    return f"auth-test:api-key:{prefix}"
+
+
+@lru_cache(maxsize=None)
+def get_local_api_key_cache() -> LocalCache:
+    """Return this process' cache of stored keys."""
+    return LocalCache(
+        settings.AUTH_TEST_LOCAL_CACHE_SIZE, settings.AUTH_TEST_LOCAL_CACHE_TIMEOUT
+    )
+
+
+def get_bearer_key(request: HttpRequest) -> Optional[str]:
+    """Return the API key in the request's Authorization header or None.
+
+    Bearer values not shaped like an API key, such as tokens meant for the upstream
+    app, are not API keys and None is returned.
+    """
+    scheme, _, key = request.META.get("HTTP_AUTHORIZATION", "").partition(" ")
+    key = key.strip()
+    if scheme.lower() != "bearer" or not KEY_PATTERN.fullmatch(key):
+        return None
+    return key
+
+
+def load_api_key(prefix: str) -> CachedKey:
+    """Load the key with the prefix, if its user is active, from the database."""
+    row = (
+        APIKey.objects.filter(prefix=prefix, user__is_active=True)
+        .values_list("hashed_key", "user_id", "expires")
+        .first()
+    )
+    return CachedKey(*row) if row is not None else CachedKey()
+
+
+def get_api_key(prefix: str, local_only: bool = False) -> CachedKey:
+    """Return the stored key for a prefix, cached like sessions are.
+
+    Unknown prefixes are only cached in this process, so guessing keys neither
+    reaches the database again nor fills the shared cache. With local_only,
+    LookupRequired is raised instead of leaving this process.
+    """
+    local_cache = get_local_api_key_cache()
+    cached_key = local_cache.get(prefix)
+    if cached_key is not None:
+        return cached_key
+    if local_only:
+        raise LookupRequired()
+    timeout = settings.AUTH_TEST_CACHE_TIMEOUT
+    cached_key = get_cache().get(api_key_cache_key(prefix)) if timeout else None
+    if cached_key is None:
+        cached_key = load_api_key(prefix)
+        if timeout and cached_key.user_id is not None:
+            get_cache().set(api_key_cache_key(prefix), cached_key, timeout)
+    local_cache.set(prefix, cached_key)
+    return cached_key
+
+
+def get_api_key_user_id(key: str, local_only: bool = False) -> Optional[int]:
+    """Return the id of the user a valid key belongs to or None."""
+    prefix, _, secret = key.partition(".")
+    cached_key = get_api_key(prefix, local_only)
+    if cached_key.user_id is None:
+        return None
+    if not constant_time_compare(cached_key.hashed_key, hash_secret(secret)):
+        return None
+    if cached_key.expires is not None and cached_key.expires <= timezone.now():
+        return None
+    return cached_key.user_id
+
+
+def forget_api_keys(prefixes: Iterable[str]):
+    """Remove keys from the caches."""
+    prefixes = list(prefixes)
+    local_cache = get_local_api_key_cache()
+    for prefix in prefixes:
+        local_cache.delete(prefix)
+    get_cache().delete_many([api_key_cache_key(prefix) for prefix in prefixes])
@@ -0,0 +1,144 @@
+"""
+ASGI config for webapp project.
+
+It exposes the ASGI callable as a module-level variable named ``application``.
+
+Django 2.2 cannot serve ASGI itself, so auth-test requests are answered here by
+``webapp.views.check_auth_async`` and everything else is handed to the WSGI
+application on the event loop's default thread pool. Serve it with any ASGI server,
+for example ``uvicorn webapp.asgi:application``.
+"""
+import asyncio
+import io
+import os
+import sys
+from typing import Any, Dict, List, Tuple
+
+from django.core.handlers.wsgi import WSGIRequest
+from django.core.wsgi import get_wsgi_application
+from django.http import HttpResponse
+from django.urls import reverse
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "webapp.settings")
+
+wsgi_application = get_wsgi_application()
+
+# NOTE: The views can only be imported once Django has been set up.
+# pylint: disable=wrong-import-position
+from webapp.views import check_auth_async  # isort:skip
+
+AUTH_TEST_PATH = reverse("auth-test")
+
+Headers = List[Tuple[bytes, bytes]]
+
+
+def get_environ(scope: Dict[str, Any], body: bytes) -> Dict[str, Any]:
+    """Return the WSGI environ for an ASGI HTTP scope."""
+    script_name = scope.get("root_path", "")
+    path = scope["path"]
+    if script_name and path.startswith(script_name):
+        path = path[len(script_name) :]
+    server = scope.get("server") or ("localhost", 80)
+    client = scope.get("client") or ("", 0)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": script_name.encode("utf-8").decode("latin-1"),
+        "PATH_INFO": path.encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "REMOTE_ADDR": client[0],
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    for raw_name, raw_value in scope.get("headers", []):
+        name = raw_name.decode("latin-1").upper().replace("-", "_")
+        value = raw_value.decode("latin-1")
+        if name not in ("CONTENT_TYPE", "CONTENT_LENGTH"):
+            name = f"HTTP_{name}"
+        if name in environ:
+            # NOTE: Cookie headers are joined as one Cookie, not as a list.
+            separator = "; " if name == "HTTP_COOKIE" else ","
+            value = f"{environ[name]}{separator}{value}"
+        environ[name] = value
+    return environ
+
+
+def call_wsgi(environ: Dict[str, Any]) -> Tuple[int, Headers, bytes]:
+    """Call the WSGI application and return the status, headers and body."""
+    started: Dict[str, Any] = {}
+
+    def start_response(status, headers, *_):
+        started["status"] = int(status.split(" ", 1)[0])
+        started["headers"] = [
+            (name.encode("latin-1"), value.encode("latin-1")) for name, value in headers
+        ]
+
+    result = wsgi_application(environ, start_response)
+    try:
+        body = b"".join(result)
+    finally:
+        if hasattr(result, "close"):
+            result.close()
+    return started["status"], started["headers"], body
+
+
+def get_response_headers(response: HttpResponse) -> Headers:
+    """Return the headers and cookies of a Django response."""
+    headers = [
+        (name.encode("latin-1"), str(value).encode("latin-1"))
+        for name, value in response.items()
+    ]
+    for cookie in response.cookies.values():
+        headers.append((b"Set-Cookie", cookie.output(header="").strip().encode()))
+    return headers
+
+
+async def read_body(receive) -> bytes:
+    """Read the whole request body."""
+    body = b""
+    more_body = True
+    while more_body:
+        message = await receive()
+        body += message.get("body", b"")
+        more_body = message.get("more_body", False)
+    return body
+
+
+async def lifespan(receive, send):
+    """Acknowledge startup and shutdown."""
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def application(scope, receive, send):
+    """Serve auth-test without blocking and everything else through WSGI."""
+    if scope["type"] == "lifespan":
+        await lifespan(receive, send)
+        return
+    if scope["type"] != "http":
+        raise ValueError(f"Unsupported ASGI scope type: {scope['type']}")
+    if scope["path"] == AUTH_TEST_PATH:
+        response = await check_auth_async(WSGIRequest(get_environ(scope, b"")))
+        status, headers, body = (
+            response.status_code,
+            get_response_headers(response),
+            response.content,
+        )
+    else:
+        environ = get_environ(scope, await read_body(receive))
+        loop = asyncio.get_event_loop()
+        status, headers, body = await loop.run_in_executor(None, call_wsgi, environ)
+    await send({"type": "http.response.start", "status": status, "headers": headers})
+    await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,233 @@
+"""Resolve the user behind an auth-test subrequest."""
+from functools import lru_cache
+from importlib import import_module
+from typing import FrozenSet, Iterable, List, NamedTuple, Optional, Tuple
+from urllib.parse import quote
+
+from django.conf import settings
+from django.contrib.auth import get_user, get_user_model
+from django.core.cache import caches
+from django.http import HttpRequest
+
+from webapp import metrics, sessions
+from webapp.local_cache import LocalCache
+
+
+class LookupRequired(Exception):
+    """Raised when answering needs I/O but the caller asked for none."""
+
+
+class SessionUser(NamedTuple):
+    """The user a session belongs to, as kept in the in-process cache."""
+
+    user_id: int
+    is_active: bool
+
+
+class Access(NamedTuple):
+    """What a user is allowed to do and the headers identifying them upstream."""
+
+    is_superuser: bool
+    groups: FrozenSet[str]
+    permissions: FrozenSet[str]
+    headers: Tuple[Tuple[str, str], ...] = ()
+
+
+def session_cache_key(session_key: str) -> str:
+    """Return the cache key holding the user id for a session."""
+    return f"auth-test:session:{session_key}"
+
+
+def user_cache_key(user_id: int) -> str:
+    """Return the cache key holding the cached session keys for a user."""
+    return f"auth-test:user:{user_id}"
+
+
+def access_cache_key(user_id: int) -> str:
+    """Return the cache key holding what a user may access."""
+    return f"auth-test:access:{user_id}"
+
+
+def get_cache():
+    """Return the cache used for verified sessions."""
+    return caches[settings.AUTH_TEST_CACHE]
+
+
+@lru_cache(maxsize=None)
+def get_local_cache() -> LocalCache:
+    """Return this process' cache of verified sessions."""
+    return LocalCache(
+        settings.AUTH_TEST_LOCAL_CACHE_SIZE, settings.AUTH_TEST_LOCAL_CACHE_TIMEOUT
+    )
+
+
+@lru_cache(maxsize=None)
+def get_local_access_cache() -> LocalCache:
+    """Return this process' cache of what users may access."""
+    return LocalCache(
+        settings.AUTH_TEST_LOCAL_CACHE_SIZE, settings.AUTH_TEST_LOCAL_CACHE_TIMEOUT
+    )
+
+
+def load_session_user_id(request: HttpRequest, session_key: str) -> Optional[int]:
+    """Load the session and user the same way AuthenticationMiddleware does.
+
+    With sliding sessions, a session close to expiring is queued for a refresh.
+    """
+    if not hasattr(request, "session"):
+        engine = import_module(settings.SESSION_ENGINE)
+        request.session = engine.SessionStore(session_key)  # type: ignore
+    user = get_user(request)
+    if not user.is_authenticated:
+        return None
+    if settings.AUTH_SESSION_SLIDING and sessions.needs_touch(request.session):
+        sessions.record_touch(session_key)
+    return user.pk
+
+
+def record_lookup(request: HttpRequest, source: str):
+    """Count where a session was found and keep it for the decision log."""
+    metrics.inc(metrics.SESSION_LOOKUPS, source)
+    # NOTE: Not an HttpRequest attribute, webapp.decision_log reads it with getattr.
+    setattr(request, "session_lookup", source)
+
+
+def get_session_user_id(
+    request: HttpRequest, local_only: bool = False
+) -> Optional[int]:
+    """Return the id of the user logged in to the request's session or None.
+
+    A burst of requests with the same cookie is answered from this process' cache.
+    Otherwise this is a single lookup in the shared cache and no queries. On a miss
+    in both the session and user are loaded from the database and the result is
+    cached for ``settings.AUTH_TEST_CACHE_TIMEOUT`` seconds. Where the session was
+    found is kept in ``request.session_lookup`` for the decision log.
+
+    With local_only, LookupRequired is raised instead of leaving this process.
+    """
+    session_key = request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+    if not session_key:
+        return None
+    local_cache = get_local_cache()
+    session_user = local_cache.get(session_key)
+    if session_user is not None:
+        record_lookup(request, "local")
+        return session_user.user_id if session_user.is_active else None
+    if local_only:
+        raise LookupRequired()
+    timeout = settings.AUTH_TEST_CACHE_TIMEOUT
+    if timeout:
+        user_id = get_cache().get(session_cache_key(session_key))
+        if user_id is not None:
+            record_lookup(request, "shared")
+            local_cache.set(session_key, SessionUser(user_id, True))
+            return user_id
+    record_lookup(request, "database")
+    user_id = load_session_user_id(request, session_key)
+    if user_id is not None and timeout:
+        remember_session(session_key, user_id, timeout)
+        local_cache.set(session_key, SessionUser(user_id, True))
+    return user_id
+
+
+def remember_session(session_key: str, user_id: int, timeout: int):
+    """Cache the session and record it against the user for later invalidation."""
+    cache = get_cache()
+    cache.set(session_cache_key(session_key), user_id, timeout)
+    key = user_cache_key(user_id)
+    session_keys: List[str] = cache.get(key, [])
+    if session_key not in session_keys:
+        session_keys.append(session_key)
+    cache.set(key, session_keys, timeout)
+
+
+def forget_session(session_key: str):
+    """Remove a session from the caches."""
+    get_local_cache().delete(session_key)
+    get_cache().delete(session_cache_key(session_key))
+
+
+def forget_user(user_id: int, is_active: bool = True):
+    """Remove every cached session belonging to a user.
+
+    A deactivated user's sessions stay in this process' cache marked inactive, so
+    the rest of a burst is rejected without a lookup. Other processes keep their
+    own copy for up to ``settings.AUTH_TEST_LOCAL_CACHE_TIMEOUT`` seconds.
+    """
+    local_cache = get_local_cache()
+    local_keys = local_cache.delete_matching(lambda value: value.user_id == user_id)
+    if not is_active:
+        for local_key in local_keys:
+            local_cache.set(local_key, SessionUser(user_id, False))
+    cache = get_cache()
+    key = user_cache_key(user_id)
+    session_keys: List[str] = cache.get(key, [])
+    cache.delete_many([key, *[session_cache_key(skey) for skey in session_keys]])
+
+
+def get_identity_value(user, field: str, groups: FrozenSet[str]) -> str:
+    """Return a user field as a header value.
+
+    Values are percent-encoded UTF-8 and groups are a comma separated list of
+    percent-encoded names, so any value is safe to send in a header.
+    """
+    if field == "groups":
+        return ",".join(quote(name, safe="@ ") for name in sorted(groups))
+    if field == "username":
+        value = user.get_username()
+    else:
+        value = getattr(user, field)
+    return quote(str(value), safe="@ ")
+
+
+def load_user_access(user_id: int) -> Optional[Access]:
+    """Load the user's groups, permissions and identity headers from the database.
+
+    Return None if the user no longer exists.
+    """
+    user = get_user_model().objects.filter(pk=user_id).first()
+    if user is None:
+        return None
+    groups = frozenset(user.groups.values_list("name", flat=True))
+    return Access(
+        is_superuser=user.is_superuser,
+        groups=groups,
+        permissions=frozenset(user.get_all_permissions()),
+        headers=tuple(
+            (header, get_identity_value(user, field, groups))
+            for header, field in settings.AUTH_TEST_IDENTITY_HEADERS.items()
+        ),
+    )
+
+
+def get_user_access(user_id: int, local_only: bool = False) -> Optional[Access]:
+    """Return what the user may access and their headers, cached like sessions are.
+
+    Return None if the user no longer exists, which is not cached. With local_only,
+    LookupRequired is raised instead of leaving this process.
+    """
+    local_cache = get_local_access_cache()
+    access = local_cache.get(user_id)
+    if access is not None:
+        return access
+    if local_only:
+        raise LookupRequired()
+    timeout = settings.AUTH_TEST_CACHE_TIMEOUT
+    access = get_cache().get(access_cache_key(user_id)) if timeout else None
+    if access is None:
+        access = load_user_access(user_id)
+        if access is None:
+            return None
+        if timeout:
+            get_cache().set(access_cache_key(user_id), access, timeout)
+    local_cache.set(user_id, access)
+    return access
+
+
+def forget_access(user_ids: Iterable[int]):
+    """Remove what the users may access from the caches."""
+    user_ids = list(user_ids)
+    local_cache = get_local_access_cache()
+    for user_id in user_ids:
+        local_cache.delete(user_id)
+    get_cache().delete_many([access_cache_key(user_id) for user_id in user_ids])
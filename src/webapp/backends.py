@@ -0,0 +1,40 @@
+"""Project wide authentication backends."""
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.hashers import check_password, make_password
+
+from webapp.hash_pool import get_hash_pool
+
+
+def check_user_password(user, password: str) -> bool:
+    """Check a user's password on the hash pool.
+
+    Unlike ``AbstractBaseUser.check_password`` an outdated hash is not upgraded
+    here, logging in queues ``webapp.tasks.rehash_password`` instead.
+    """
+    return get_hash_pool().run(check_password, password, user.password)
+
+
+class HashPoolBackend(ModelBackend):
+    """ModelBackend hashing passwords on the hash pool, see webapp.hash_pool.
+
+    PoolFull is raised when the pool is too busy. It is not a PermissionDenied so it
+    does not count as a failed login.
+    """
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        """Return the user if the password is correct."""
+        user_model = get_user_model()
+        if username is None:
+            username = kwargs.get(user_model.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+        try:
+            user = user_model.objects.get_by_natural_key(username)
+        except user_model.DoesNotExist:
+            # NOTE: Hash anyway so unknown usernames take as long as known ones.
+            get_hash_pool().run(make_password, password)
+            return None
+        if check_user_password(user, password) and self.user_can_authenticate(user):
+            return user
+        return None
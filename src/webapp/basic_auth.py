@@ -0,0 +1,118 @@
+"""HTTP Basic auth for clients that can neither log in nor send an API key.
+
+Checking a password runs the password hasher, which is slow on purpose, so each
+verified username and password is remembered for ``settings.AUTH_BASIC_CACHE_TIMEOUT``
+seconds under a keyed hash of both and only the first request in that window pays for
+it. Credentials are checked with ``authenticate`` and so ``AxesBackend``, failures
+count towards a lockout like failed logins do.
+"""
+import base64
+import binascii
+import hashlib
+import hmac
+from functools import lru_cache
+from typing import List, Optional, Tuple
+
+from django.conf import settings
+from django.contrib.auth import authenticate
+from django.http import HttpRequest
+
+from webapp.auth import LookupRequired, get_cache
+from webapp.hash_pool import PoolFull
+from webapp.local_cache import LocalCache
+
+SALT = "webapp.basic_auth"
+
+
+def get_basic_credentials(request: HttpRequest) -> Optional[Tuple[str, str]]:
+    """Return the username and password in the Authorization header or None.
+
+    Malformed credentials are returned empty so they are rejected.
+    """
+    scheme, _, encoded = request.META.get("HTTP_AUTHORIZATION", "").partition(" ")
+    if scheme.lower() != "basic":
+        return None
+    try:
+        decoded = base64.b64decode(encoded.strip(), validate=True).decode("utf-8")
+    except (binascii.Error, UnicodeDecodeError):
+        return "", ""
+    username, _, password = decoded.partition(":")
+    return username, password
+
+
+def credentials_cache_key(username: str, password: str) -> str:
+    """Return the cache key holding the user id for verified credentials."""
+    key = hashlib.sha256(f"{SALT}{settings.SECRET_KEY}".encode()).digest()
+    credentials = f"{username}\0{password}".encode()
+    return f"auth-test:basic:{hmac.new(key, credentials, hashlib.sha256).hexdigest()}"
+
+
+def basic_user_cache_key(user_id: int) -> str:
+    """Return the cache key holding the cached credentials keys for a user."""
+    return f"auth-test:basic-user:{user_id}"
+
+
+@lru_cache(maxsize=None)
+def get_local_credentials_cache() -> LocalCache:
+    """Return this process' cache of verified credentials."""
+    return LocalCache(
+        settings.AUTH_TEST_LOCAL_CACHE_SIZE,
+        min(settings.AUTH_TEST_LOCAL_CACHE_TIMEOUT, settings.AUTH_BASIC_CACHE_TIMEOUT),
+    )
+
+
+def get_basic_user_id(
+    request: HttpRequest, credentials: Tuple[str, str], local_only: bool = False
+) -> Optional[int]:
+    """Return the id of the user the credentials belong to or None.
+
+    With local_only, LookupRequired is raised instead of leaving this process.
+    """
+    username, password = credentials
+    if not username:
+        return None
+    key = credentials_cache_key(username, password)
+    local_cache = get_local_credentials_cache()
+    user_id = local_cache.get(key)
+    if user_id is not None:
+        return user_id
+    if local_only:
+        raise LookupRequired()
+    timeout = settings.AUTH_BASIC_CACHE_TIMEOUT
+    user_id = get_cache().get(key) if timeout else None
+    if user_id is None:
+        try:
+            user = authenticate(request, username=username, password=password)
+        except PoolFull:
+            # NOTE: Turned away rather than waiting, the client can try again.
+            return None
+        if user is None:
+            return None
+        user_id = user.pk
+        if timeout:
+            remember_credentials(key, user_id, timeout)
+    local_cache.set(key, user_id)
+    return user_id
+
+
+def remember_credentials(key: str, user_id: int, timeout: int):
+    """Cache verified credentials and record them against the user."""
+    cache = get_cache()
+    cache.set(key, user_id, timeout)
+    user_key = basic_user_cache_key(user_id)
+    keys: List[str] = cache.get(user_key, [])
+    if key not in keys:
+        keys.append(key)
+    cache.set(user_key, keys, timeout)
+
+
+def forget_credentials(user_id: int):
+    """Remove every cached credential belonging to a user.
+
+    Other processes keep their own copy for up to
+    ``settings.AUTH_TEST_LOCAL_CACHE_TIMEOUT`` seconds.
+    """
+    get_local_credentials_cache().delete_matching(lambda value: value == user_id)
+    cache = get_cache()
+    user_key = basic_user_cache_key(user_id)
+    cache.delete_many([user_key, *cache.get(user_key, [])])
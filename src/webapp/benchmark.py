@@ -0,0 +1,114 @@
+"""Helpers shared by the benchmark management commands."""
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List
+
+from django.db import close_old_connections, connection
+from django.test.runner import DiscoverRunner
+
+
+@contextmanager
+def test_database():
+    """Run the block against a throwaway test database."""
+    runner = DiscoverRunner(verbosity=0, interactive=False)
+    runner.setup_test_environment()
+    old_config = runner.setup_databases()
+    try:
+        yield
+    finally:
+        runner.teardown_databases(old_config)
+        runner.teardown_test_environment()
+
+
+def percentile(samples: List[float], percent: float) -> float:
+    """Return the given percentile of already sorted samples."""
+    index = min(len(samples) - 1, int(round(percent / 100 * (len(samples) - 1))))
+    return samples[index]
+
+
+def summarise(samples: List[float], elapsed: float) -> Dict[str, float]:
+    """Return the latency percentiles in ms and the throughput of the samples."""
+    samples = sorted(samples)
+    return {
+        "mean_ms": statistics.mean(samples) * 1000,
+        "p50_ms": percentile(samples, 50) * 1000,
+        "p95_ms": percentile(samples, 95) * 1000,
+        "p99_ms": percentile(samples, 99) * 1000,
+        "requests_per_second": len(samples) / elapsed,
+    }
+
+
+def format_table(results: Dict[str, Dict[str, float]]) -> List[str]:
+    """Return the results as the lines of a table, one row per scenario."""
+    columns = list(next(iter(results.values())))
+    width = max(len(name) for name in ["scenario", *results])
+    lines = [" ".join([f"{'scenario':<{width}}", *[f"{c:>20}" for c in columns]])]
+    for name, result in results.items():
+        values = [f"{result[c]:>20.3f}" for c in columns]
+        lines.append(" ".join([f"{name:<{width}}", *values]))
+    return lines
+
+
+def run_concurrently(
+    request: Callable[[], None], requests: int, concurrency: int
+) -> Dict[str, float]:
+    """Call request on a pool of concurrency threads and summarise the calls.
+
+    Also counts the database queries per call.
+    """
+    samples: List[float] = []
+    queries = [0]
+    lock = threading.Lock()
+
+    def count(execute, *args):
+        with lock:
+            queries[0] += 1
+        return execute(*args)
+
+    def timed():
+        before = time.perf_counter()
+        try:
+            with connection.execute_wrapper(count):
+                request()
+        finally:
+            close_old_connections()
+        samples.append(time.perf_counter() - before)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        started = time.perf_counter()
+        for future in [pool.submit(timed) for _ in range(requests)]:
+            future.result()
+        elapsed = time.perf_counter() - started
+    return {**summarise(samples, elapsed), "queries_per_request": queries[0] / requests}
+
+
+def compare(
+    baseline: Dict[str, Dict[str, Any]],
+    results: Dict[str, Dict[str, Any]],
+    threshold: float,
+) -> List[str]:
+    """Return how the results regressed from the baseline by more than threshold.
+
+    A scenario regresses when its p99 latency rises or its throughput falls by more
+    than threshold percent, or when it makes more queries per request.
+    """
+    regressions = []
+    for name, result in results.items():
+        before = baseline.get(name)
+        if before is None:
+            continue
+        p99 = (result["p99_ms"] / before["p99_ms"] - 1) * 100
+        if p99 > threshold:
+            regressions.append(f"{name}: p99 latency {p99:+.1f}%")
+        throughput = result["requests_per_second"] / before["requests_per_second"] - 1
+        if throughput * 100 < -threshold:
+            regressions.append(f"{name}: throughput {throughput * 100:+.1f}%")
+        if result["queries_per_request"] > before["queries_per_request"]:
+            regressions.append(
+                f"{name}: {before['queries_per_request']:.2f} to "
+                f"{result['queries_per_request']:.2f} queries per request"
+            )
+    return regressions
@@ -0,0 +1,135 @@
+"""A newline-delimited JSON log of auth-test decisions.
+
+When ``settings.AUTH_DECISION_LOG`` is set, every auth-test answer is logged with the
+user, the decision and why, the URI nginx asked about, how long it took and where the
+session was found. Recording one only appends a tuple to a bounded deque. A thread
+formats whatever has been recorded every ``settings.AUTH_DECISION_LOG_FLUSH_INTERVAL``
+seconds and writes it to stdout ("-") or the file in one call, so a slow pipe or
+disk never holds up a response.
+
+The deque holds ``settings.AUTH_DECISION_LOG_BUFFER_SIZE`` records. If the thread
+falls that far behind the oldest records are dropped and the next batch ends with a
+line saying how many.
+"""
+import atexit
+import json
+import os
+import sys
+import threading
+import time
+from collections import deque
+from functools import lru_cache
+from typing import Any, Deque, Optional, Tuple
+
+from django.conf import settings
+from django.http import HttpRequest
+
+FIELDS = (
+    "time",
+    "status",
+    "reason",
+    "credential",
+    "user_id",
+    "host",
+    "uri",
+    "ms",
+    "session_lookup",
+)
+
+
+class DecisionLog:
+    """A ring buffer of decisions written out in batches by a thread."""
+
+    def __init__(self, path: str, size: int, interval: float):
+        """Start empty, the thread starts with the first record."""
+        self.path = path
+        self.interval = interval
+        self.records: Deque[Tuple[Any, ...]] = deque(maxlen=size)
+        self.dropped = 0
+        self._writing = False
+        self._lock = threading.Lock()
+
+    def record(self, values: Tuple[Any, ...]):
+        """Queue a record, dropping the oldest when full."""
+        # NOTE: Threads may race on the count, it only needs to be about right.
+        if len(self.records) == self.records.maxlen:
+            self.dropped += 1
+        self.records.append(values)
+        if not self._writing:
+            self.start()
+
+    def start(self):
+        """Start writing in the background, and once more at exit."""
+        with self._lock:
+            if self._writing:
+                return
+            self._writing = True
+        threading.Thread(target=self.run, name="decision-log", daemon=True).start()
+        atexit.register(self.flush)
+
+    def run(self):
+        """Write the queued records forever."""
+        while True:
+            time.sleep(self.interval)
+            self.flush()
+
+    def flush(self):
+        """Write the queued records in one call."""
+        with self._lock:
+            lines = []
+            while self.records:
+                values = self.records.popleft()
+                lines.append(json.dumps(dict(zip(FIELDS, values))))
+            dropped, self.dropped = self.dropped, 0
+            if dropped:
+                lines.append(json.dumps({"time": time.time(), "dropped": dropped}))
+            if lines:
+                self.write("".join(f"{line}\n" for line in lines))
+
+    def write(self, text: str):
+        """Append text to the log.
+
+        The file is opened for every batch so it can be rotated without a reload.
+        """
+        if self.path == "-":
+            sys.stdout.write(text)
+            sys.stdout.flush()
+            return
+        with open(self.path, "a") as output:
+            output.write(text)
+
+
+@lru_cache(maxsize=None)
+def get_decision_log() -> Optional[DecisionLog]:
+    """Return this process' decision log, or None when disabled."""
+    if not settings.AUTH_DECISION_LOG:
+        return None
+    return DecisionLog(
+        settings.AUTH_DECISION_LOG,
+        settings.AUTH_DECISION_LOG_BUFFER_SIZE,
+        settings.AUTH_DECISION_LOG_FLUSH_INTERVAL,
+    )
+
+
+# NOTE: The writing thread does not survive a fork, so children start their own.
+os.register_at_fork(after_in_child=get_decision_log.cache_clear)
+
+
+def record(request: HttpRequest, decision, seconds: float):
+    """Log an auth-test decision (a ``webapp.views.Decision``) if enabled."""
+    decision_log = get_decision_log()
+    if decision_log is None:
+        return
+    decision_log.record(
+        (
+            time.time(),
+            decision.status,
+            decision.reason,
+            decision.credential,
+            decision.user_id,
+            request.META.get("HTTP_HOST"),
+            request.META.get("HTTP_X_ORIGINAL_URI"),
+            round(seconds * 1000, 3),
+            getattr(request, "session_lookup", None),
+        )
+    )
@@ -0,0 +1,21 @@
+"""Project wide forms."""
+from django.contrib.auth.forms import AuthenticationForm
+from django.core.exceptions import ValidationError
+
+from webapp.hash_pool import PoolFull
+
+
+class LoginForm(AuthenticationForm):
+    """Ask the user to try again when too many logins are being checked at once."""
+
+    error_messages = {
+        **AuthenticationForm.error_messages,
+        "busy": "Too many people are logging in right now. Please try again.",
+    }
+
+    def clean(self):
+        """Check the credentials."""
+        try:
+            return super().clean()
+        except PoolFull as error:
+            raise ValidationError(self.error_messages["busy"], code="busy") from error
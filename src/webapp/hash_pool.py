@@ -0,0 +1,118 @@
+"""A bounded pool of threads for password hashing.
+
+A burst of logins would otherwise run one password hash per worker thread and leave
+none free for auth-test. Hashes run on at most ``settings.AUTH_HASH_WORKERS`` threads
+instead, ``hashlib`` releases the GIL while hashing so they run in parallel with the
+rest of the process. A few more may wait their turn, anything beyond that is turned
+away straight away with PoolFull.
+"""
+import threading
+import time
+from concurrent import futures
+from functools import lru_cache
+from typing import Any, Callable, Dict, Optional
+
+from django.conf import settings
+
+
+class PoolFull(Exception):
+    """Raised when a hash can not be started in time."""
+
+
+class PoolCounters:
+    """What a hash pool has done, guarded by the pool's lock."""
+
+    def __init__(self):
+        """Start at zero."""
+        self.queued = 0
+        self.running = 0
+        self.completed = 0
+        self.rejected = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+
+class HashPool:
+    """Run at most ``workers`` hashes at once with up to ``queue_size`` waiting.
+
+    Hashes that have not started after ``timeout`` seconds are cancelled. With no
+    workers hashes run on the calling thread.
+    """
+
+    def __init__(self, workers: int, queue_size: int, timeout: float):
+        """Create the pool, its threads start when first needed."""
+        self.timeout = timeout
+        self._executor: Optional[futures.ThreadPoolExecutor] = None
+        if workers:
+            self._executor = futures.ThreadPoolExecutor(
+                workers, thread_name_prefix="hash"
+            )
+        self._slots = threading.BoundedSemaphore(workers + queue_size)
+        self._lock = threading.Lock()
+        self.workers = workers
+        self.counters = PoolCounters()
+
+    def run(self, func: Callable[..., Any], *args) -> Any:
+        """Return func(*args) run on the pool, raising PoolFull if it is too busy."""
+        if self._executor is None:
+            return func(*args)
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.counters.rejected += 1
+            raise PoolFull()
+        with self._lock:
+            self.counters.queued += 1
+        future = self._executor.submit(self._call, time.perf_counter(), func, *args)
+        try:
+            return future.result(self.timeout)
+        except futures.TimeoutError as error:
+            if not future.cancel():
+                return future.result()
+            with self._lock:
+                self.counters.queued -= 1
+                self.counters.rejected += 1
+            self._slots.release()
+            raise PoolFull() from error
+
+    def _call(self, submitted: float, func: Callable[..., Any], *args) -> Any:
+        """Record the wait and run func(*args) on a pool thread."""
+        waited = time.perf_counter() - submitted
+        counters = self.counters
+        with self._lock:
+            counters.queued -= 1
+            counters.running += 1
+            counters.total_wait += waited
+            counters.max_wait = max(counters.max_wait, waited)
+        try:
+            return func(*args)
+        finally:
+            with self._lock:
+                counters.running -= 1
+                counters.completed += 1
+            self._slots.release()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the queue depth, counters and wait times."""
+        counters = self.counters
+        with self._lock:
+            started = counters.running + counters.completed
+            mean_wait = counters.total_wait / started if started else 0.0
+            return {
+                "workers": self.workers,
+                "queued": counters.queued,
+                "running": counters.running,
+                "completed": counters.completed,
+                "rejected": counters.rejected,
+                "mean_wait_ms": mean_wait * 1000,
+                "max_wait_ms": counters.max_wait * 1000,
+            }
+
+
+@lru_cache(maxsize=None)
+def get_hash_pool() -> HashPool:
+    """Return this process' hash pool."""
+    return HashPool(
+        settings.AUTH_HASH_WORKERS,
+        settings.AUTH_HASH_QUEUE_SIZE,
+        settings.AUTH_HASH_TIMEOUT,
+    )
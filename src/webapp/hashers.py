@@ -0,0 +1,56 @@
+"""Password hashers tuned for this host and rehashing after login.
+
+``PBKDF2PasswordHasher`` uses ``settings.AUTH_PASSWORD_ITERATIONS``, see the
+``benchmark_hashers`` command for a recommendation. Passwords hashed with anything
+else are rehashed by ``webapp.tasks.rehash_password`` once their user logs in, so
+logins never pay for a second hash. The task needs the password, which is encrypted
+with a key derived from ``SECRET_KEY`` while it waits on the broker.
+"""
+import base64
+import hashlib
+from typing import Optional
+
+from cryptography.fernet import Fernet, InvalidToken
+from django.conf import settings
+from django.contrib.auth import hashers
+
+SALT = "webapp.hashers"
+
+
+class PBKDF2PasswordHasher(hashers.PBKDF2PasswordHasher):
+    """Django's PBKDF2 hasher using ``settings.AUTH_PASSWORD_ITERATIONS``."""
+
+    @property  # type: ignore
+    def iterations(self):
+        """Return the configured iterations or Django's default."""
+        return settings.AUTH_PASSWORD_ITERATIONS or super().iterations
+
+
+def needs_rehash(encoded: str) -> bool:
+    """Return whether a password hash differs from the preferred hasher's."""
+    preferred = hashers.get_hasher()
+    try:
+        hasher = hashers.identify_hasher(encoded)
+    except ValueError:
+        return False
+    return hasher.algorithm != preferred.algorithm or preferred.must_update(encoded)
+
+
+def get_fernet() -> Fernet:
+    """Return the cipher for passwords waiting to be rehashed."""
+    key = hashlib.sha256(f"{SALT}{settings.SECRET_KEY}".encode()).digest()
+    return Fernet(base64.urlsafe_b64encode(key))
+
+
+def encrypt_password(password: str) -> str:
+    """Return the password encrypted for the broker."""
+    return get_fernet().encrypt(password.encode()).decode()
+
+
+def decrypt_password(token: str) -> Optional[str]:
+    """Return an encrypted password or None if it is invalid or too old."""
+    try:
+        ttl = settings.AUTH_PASSWORD_REHASH_TTL
+        return get_fernet().decrypt(token.encode(), ttl).decode()
+    except InvalidToken:
+        return None
@@ -0,0 +1,79 @@
+"""A small in-process cache for the auth-test hot path."""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Tuple
+
+# NOTE: An entry is the monotonic time it expires at and its value.
+Entry = Tuple[float, Any]
+
+
+class LocalCache:
+    """A thread safe LRU cache whose entries expire after a fixed timeout.
+
+    Each worker process gets its own copy, so lookups cost no network round trip
+    but invalidation only reaches the current process. Keep the timeout short.
+    """
+
+    def __init__(self, max_size: int, timeout: float):
+        """Set the limits and zero the counters."""
+        self.max_size = max_size
+        self.timeout = timeout
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[Hashable, Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Return the value for key, or default if it is missing or expired."""
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None:
+                if item[0] > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return item[1]
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key: Hashable, value: Any):
+        """Store value for key, evicting the least recently used entry if full."""
+        if self.max_size <= 0 or self.timeout <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.timeout, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def delete(self, key: Hashable):
+        """Remove key if present."""
+        with self._lock:
+            self._data.pop(key, None)
+
+    def delete_matching(self, predicate: Callable[[Any], bool]) -> List[Hashable]:
+        """Remove every entry whose value matches predicate and return their keys."""
+        with self._lock:
+            keys = [k for k, (_, v) in self._data.items() if predicate(v)]
+            for key in keys:
+                del self._data[key]
+        return keys
+
+    def clear(self):
+        """Remove every entry and zero the counters."""
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the size and the hit and miss counters."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+            }
@@ -0,0 +1,198 @@
+"""Reject locked out clients without asking the axes cache.
+
+Every login attempt normally reads the client's failure count from the axes cache.
+Each process also remembers the cache keys of clients it has seen locked out for
+``settings.AUTH_LOCKOUT_LOCAL_TIMEOUT`` seconds, so an attack from a locked out client
+is turned away without a network call. Lockouts and resets are published on a redis
+channel when the axes cache is redis, so every process learns about them. The axes
+cache stays authoritative: a client unknown to this process is always looked up.
+
+Lockouts are also queued on a redis list, which
+``webapp.tasks.email_admins_lockout_digest`` drains into one email every
+``settings.AUTH_LOCKOUT_DIGEST_INTERVAL`` seconds.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional
+
+from axes.handlers.cache import AxesCacheHandler
+from axes.helpers import get_client_cache_key
+from axes.models import AccessAttempt
+from django.conf import settings
+from django.core.cache import caches
+from django.utils import timezone
+from django_redis import get_redis_connection
+
+from webapp.local_cache import LocalCache
+
+logger = logging.getLogger(__name__)
+
+EVENTS_KEY = "lockout-events"
+EVENTS_MAX_LENGTH = 10000
+
+
+class LockoutFilter:
+    """The axes cache keys this process knows are locked out."""
+
+    def __init__(self, max_size: int, timeout: int):
+        """Start empty."""
+        self.locked = LocalCache(max_size, timeout)
+        self._listening = False
+        self._lock = threading.Lock()
+
+    def is_locked(self, keys: Iterable[str]) -> bool:
+        """Return whether any of the keys is known to be locked out."""
+        self.listen()
+        return any(self.locked.get(key) for key in keys)
+
+    def receive(self, message: Dict[str, List[str]]):
+        """Apply a lockout or reset."""
+        for key in message.get("locked", []):
+            self.locked.set(key, True)
+        for key in message.get("reset", []):
+            self.locked.delete(key)
+
+    def publish(self, message: Dict[str, List[str]]):
+        """Apply a lockout or reset here and tell every other process about it."""
+        self.receive(message)
+        try:
+            connection = get_redis_connection(settings.AXES_CACHE)
+        except NotImplementedError:
+            return
+        connection.publish(get_channel(), json.dumps(message))
+
+    def listen(self):
+        """Start listening for other processes' lockouts if the cache is redis."""
+        if self._listening:
+            return
+        with self._lock:
+            if self._listening:
+                return
+            self._listening = True
+            try:
+                connection = get_redis_connection(settings.AXES_CACHE)
+            except NotImplementedError:
+                return
+            threading.Thread(
+                target=self.run, args=[connection], name="lockouts", daemon=True
+            ).start()
+
+    def run(self, connection):
+        """Apply messages from the channel forever, reconnecting after errors."""
+        while True:
+            try:
+                pubsub = connection.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(get_channel())
+                for message in pubsub.listen():
+                    self.receive(json.loads(message["data"]))
+            except Exception:  # pylint: disable=broad-except
+                logger.exception("Lost the lockout channel, reconnecting.")
+                time.sleep(1)
+
+
+def get_channel() -> str:
+    """Return the redis channel lockouts are published on."""
+    return caches[settings.AXES_CACHE].make_key("lockouts")
+
+
+@lru_cache(maxsize=None)
+def get_lockout_filter() -> LockoutFilter:
+    """Return this process' lockout filter."""
+    return LockoutFilter(
+        settings.AUTH_TEST_LOCAL_CACHE_SIZE, settings.AUTH_LOCKOUT_LOCAL_TIMEOUT
+    )
+
+
+# NOTE: The listener thread does not survive a fork, so children start their own.
+os.register_at_fork(after_in_child=get_lockout_filter.cache_clear)
+
+
+class LockoutFilterHandler(AxesCacheHandler):
+    """AxesCacheHandler checking the lockout filter before the cache."""
+
+    def is_locked(self, request, credentials: dict = None) -> bool:
+        """Return whether the client is locked out."""
+        keys = get_client_cache_key(request, credentials)
+        if get_lockout_filter().is_locked(keys):
+            return True
+        return super().is_locked(request, credentials)
+
+    def user_login_failed(self, sender, credentials: dict, request=None, **kwargs):
+        """Record a failure unless the client is known to be locked out already."""
+        if request is not None:
+            keys = get_client_cache_key(request, credentials)
+            if get_lockout_filter().is_locked(keys):
+                return
+        super().user_login_failed(sender, credentials, request, **kwargs)
+
+    def reset_attempts(self, *, ip_address=None, username=None, ip_or_username=False):
+        """Reset the client's attempts and tell every process it is not locked out.
+
+        AxesCacheHandler leaves resetting to the database handler, so the client's
+        failure counts are deleted from the axes cache here. Returns the number of
+        failures deleted. With ip_or_username the address and the username are reset
+        on their own.
+        """
+        if ip_or_username:
+            attempts = [
+                AccessAttempt(ip_address=ip_address),
+                AccessAttempt(username=username),
+            ]
+        else:
+            attempts = [AccessAttempt(username=username, ip_address=ip_address)]
+        keys = sorted(
+            {key for attempt in attempts for key in get_client_cache_key(attempt)}
+        )
+        count = sum(self.cache.get_many(keys).values())
+        self.cache.delete_many(keys)
+        get_lockout_filter().publish({"reset": keys})
+        return count
+
+
+def remember_lockout(request, credentials: Optional[dict]):
+    """Tell every process a client has been locked out."""
+    get_lockout_filter().publish({"locked": get_client_cache_key(request, credentials)})
+
+
+def record_lockout(username: Optional[str], ip_address: str):
+    """Queue a lockout for the next digest, keeping only the latest ones."""
+    event = json.dumps(
+        {
+            "username": username,
+            "ip_address": ip_address,
+            "time": timezone.now().isoformat(),
+        }
+    )
+    cache = caches[settings.AXES_CACHE]
+    try:
+        connection = get_redis_connection(settings.AXES_CACHE)
+    except NotImplementedError:
+        events = [*cache.get(EVENTS_KEY, []), event][-EVENTS_MAX_LENGTH:]
+        cache.set(EVENTS_KEY, events, None)
+        return
+    key = cache.make_key(EVENTS_KEY)
+    pipeline = connection.pipeline()
+    pipeline.rpush(key, event)
+    pipeline.ltrim(key, -EVENTS_MAX_LENGTH, -1)
+    pipeline.execute()
+
+
+def drain_lockouts() -> List[Dict[str, str]]:
+    """Remove and return every queued lockout, oldest first."""
+    cache = caches[settings.AXES_CACHE]
+    try:
+        connection = get_redis_connection(settings.AXES_CACHE)
+    except NotImplementedError:
+        events = cache.get(EVENTS_KEY, [])
+        cache.delete(EVENTS_KEY)
+    else:
+        key = cache.make_key(EVENTS_KEY)
+        pipeline = connection.pipeline()
+        pipeline.lrange(key, 0, -1)
+        pipeline.delete(key)
+        events = pipeline.execute()[0]
+    return [json.loads(event) for event in events]
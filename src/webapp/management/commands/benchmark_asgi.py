@@ -0,0 +1,186 @@
+"""Management Command to compare the ASGI and WSGI entry points under load."""
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from webapp import auth
+from webapp.benchmark import format_table, summarise, test_database
+
+
+class SlowCache:
+    """Delay reads from a cache to stand in for a network round trip."""
+
+    def __init__(self, cache, latency: float):
+        """Wrap cache."""
+        self.cache = cache
+        self.latency = latency
+
+    def get(self, *args, **kwargs):
+        """Sleep and then read from the cache."""
+        time.sleep(self.latency)
+        return self.cache.get(*args, **kwargs)
+
+    def __getattr__(self, name):
+        """Delegate everything else."""
+        return getattr(self.cache, name)
+
+
+class InFlight:
+    """Count how many requests are being handled at once."""
+
+    def __init__(self):
+        """Start at zero."""
+        self.current = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        """Count a request in."""
+        with self._lock:
+            self.current += 1
+            self.peak = max(self.peak, self.current)
+
+    def __exit__(self, *args):
+        """Count a request out."""
+        with self._lock:
+            self.current -= 1
+
+
+def run_wsgi(scope: Dict[str, Any], requests: int, threads: int) -> Dict[str, Any]:
+    """Send a burst of requests to the WSGI application on a fixed thread pool."""
+    # pylint: disable=import-outside-toplevel
+    from webapp.asgi import call_wsgi, get_environ
+
+    in_flight = InFlight()
+    samples: List[float] = []
+
+    def handle(queued: float):
+        with in_flight:
+            status = call_wsgi(get_environ(scope, b""))[0]
+        samples.append(time.perf_counter() - queued)
+        return status
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        started = time.perf_counter()
+        futures = [pool.submit(handle, time.perf_counter()) for _ in range(requests)]
+        statuses = {future.result() for future in futures}
+        elapsed = time.perf_counter() - started
+    if statuses != {204}:
+        raise RuntimeError(f"Expected only 204s but got {statuses}.")
+    return {**summarise(samples, elapsed), "peak_in_flight": in_flight.peak}
+
+
+def run_asgi(scope: Dict[str, Any], requests: int) -> Dict[str, Any]:
+    """Send a burst of requests to the ASGI application all at once."""
+    # pylint: disable=import-outside-toplevel
+    from webapp.asgi import application
+
+    in_flight = InFlight()
+    samples: List[float] = []
+    statuses = set()
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            statuses.add(message["status"])
+
+    async def handle(queued: float):
+        with in_flight:
+            await application(scope, receive, send)
+        samples.append(time.perf_counter() - queued)
+
+    async def burst():
+        await asyncio.gather(*[handle(time.perf_counter()) for _ in range(requests)])
+
+    started = time.perf_counter()
+    asyncio.run(burst())
+    elapsed = time.perf_counter() - started
+    if statuses != {204}:
+        raise RuntimeError(f"Expected only 204s but got {statuses}.")
+    return {**summarise(samples, elapsed), "peak_in_flight": in_flight.peak}
+
+
+def run_benchmark(requests: int, threads: int, latency: float):
+    """Time warm and cold bursts against both entry points."""
+    user = get_user_model().objects.create_user(
+        "benchmark", "benchmark@example.com", "password"
+    )
+    client = Client()
+    client.force_login(user)
+    cookie = "; ".join(f"{k}={v.value}" for k, v in client.cookies.items())
+    scope = {
+        "type": "http",
+        "method": "GET",
+        "path": reverse("auth-test"),
+        "query_string": b"",
+        "headers": [(b"host", b"testserver"), (b"cookie", cookie.encode())],
+        "server": ("testserver", 80),
+        "client": ("127.0.0.1", 0),
+    }
+    slow_cache = SlowCache(auth.get_cache(), latency)
+    results = {}
+    auth.get_local_cache.cache_clear()
+    results["wsgi warm"] = run_wsgi(scope, requests, threads)
+    results["asgi warm"] = run_asgi(scope, requests)
+    patch = mock.patch("webapp.auth.get_cache", return_value=slow_cache)
+    with patch, override_settings(AUTH_TEST_LOCAL_CACHE_SIZE=0):
+        auth.get_local_cache.cache_clear()
+        results["wsgi cold"] = run_wsgi(scope, requests, threads)
+        results["asgi cold"] = run_asgi(scope, requests)
+    return results
+
+
+class Command(BaseCommand):
+    """Compare ASGI against a gunicorn style WSGI worker for a burst of auth-tests.
+
+    "warm" requests are answered from the in-process session cache, "cold" requests
+    disable it so every request reads the shared cache, which is slowed down by
+    --cache-latency-ms to stand in for redis. A throwaway test database is created
+    so no real data is touched.
+    """
+
+    help = __doc__
+
+    def add_arguments(self, parser):
+        """Add benchmark arguments."""
+        parser.add_argument(
+            "--requests",
+            type=int,
+            default=2000,
+            help="The number of requests in each burst. Default: 2000",
+        )
+        parser.add_argument(
+            "--threads",
+            type=int,
+            default=3,
+            help="The number of threads of the WSGI worker. Default: 3",
+        )
+        parser.add_argument(
+            "--cache-latency-ms",
+            type=float,
+            default=1.0,
+            help="The delay added to each shared cache read. Default: 1.0",
+        )
+
+    def handle(self, *args, **options):
+        """Run the benchmark."""
+        with test_database():
+            results = run_benchmark(
+                options["requests"],
+                options["threads"],
+                options["cache_latency_ms"] / 1000,
+            )
+        auth.get_local_cache.cache_clear()
+        for line in format_table(results):
+            self.stdout.write(line)
@@ -0,0 +1,103 @@
+"""Management Command to benchmark the auth-test endpoint."""
+import time
+from typing import Any, Dict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+
+from webapp import auth
+from webapp.benchmark import format_table, summarise, test_database
+
+FAST_PATH_MIDDLEWARE = "webapp.middleware.AuthTestMiddleware"
+
+
+def run_scenario(cookies, requests: int, warmup: int) -> Dict[str, Any]:
+    """Time auth-test requests with the currently active settings."""
+    auth.get_local_cache.cache_clear()
+    auth.get_cache().clear()
+    client = Client()
+    client.cookies = cookies
+    path = reverse("auth-test")
+    for _ in range(warmup):
+        client.get(path)
+    samples = []
+    with CaptureQueriesContext(connection) as queries:
+        started = time.perf_counter()
+        for _ in range(requests):
+            before = time.perf_counter()
+            response = client.get(path)
+            samples.append(time.perf_counter() - before)
+        elapsed = time.perf_counter() - started
+    if response.status_code != 204:
+        raise RuntimeError(f"Expected a 204 but got a {response.status_code}.")
+    return {
+        **summarise(samples, elapsed),
+        "queries_per_request": len(queries) / requests,
+        "local_hit_ratio": auth.get_local_cache().stats()["hit_ratio"],
+    }
+
+
+def run_benchmark(requests: int, warmup: int) -> Dict[str, Dict[str, Any]]:
+    """Time the full request cycle, the shared cache and then the fast path."""
+    user = get_user_model().objects.create_user(
+        "benchmark", "benchmark@example.com", "password"
+    )
+    client = Client()
+    client.force_login(user)
+    full_cycle = [m for m in settings.MIDDLEWARE if m != FAST_PATH_MIDDLEWARE]
+    results = {}
+    with override_settings(MIDDLEWARE=full_cycle, AUTH_TEST_CACHE_TIMEOUT=0):
+        results["full cycle"] = run_scenario(client.cookies, requests, warmup)
+    with override_settings(AUTH_TEST_LOCAL_CACHE_SIZE=0):
+        results["shared cache"] = run_scenario(client.cookies, requests, warmup)
+    results["fast path"] = run_scenario(client.cookies, requests, warmup)
+    return results
+
+
+class Command(BaseCommand):
+    """Compare the auth-test fast path against the full request cycle.
+
+    A throwaway test database is created so no real data is touched.
+    """
+
+    help = __doc__
+
+    def add_arguments(self, parser):
+        """Add benchmark arguments."""
+        parser.add_argument(
+            "--requests",
+            type=int,
+            default=1000,
+            help="The number of requests to time per scenario. Default: 1000",
+        )
+        parser.add_argument(
+            "--warmup",
+            type=int,
+            default=50,
+            help="The number of untimed requests per scenario. Default: 50",
+        )
+
+    def handle(self, *args, **options):
+        """Run the benchmark."""
+        with test_database():
+            results = run_benchmark(options["requests"], options["warmup"])
+        auth.get_local_cache.cache_clear()
+        self.report(results)
+
+    def report(self, results: Dict[str, Dict[str, Any]]):
+        """Write the results as a table."""
+        for line in format_table(results):
+            self.stdout.write(line)
+        baseline, fast = results["full cycle"], results["fast path"]
+        latency = baseline["mean_ms"] / fast["mean_ms"]
+        throughput = fast["requests_per_second"] / baseline["requests_per_second"]
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Mean latency {latency:.1f}x lower, throughput {throughput:.1f}x higher."
+            )
+        )
@@ -0,0 +1,85 @@
+"""Management Command to benchmark the password hashers on this host."""
+import math
+import time
+from typing import Optional, Tuple
+
+from django.contrib.auth.hashers import (
+    BCryptSHA256PasswordHasher,
+    PBKDF2PasswordHasher,
+    get_hashers,
+)
+from django.core.management.base import BaseCommand
+
+
+def time_hasher(hasher, rounds: int) -> float:
+    """Return the fastest of several hashes in seconds."""
+    salt = hasher.salt()
+    samples = []
+    for _ in range(rounds):
+        before = time.perf_counter()
+        hasher.encode("benchmark-password", salt)
+        samples.append(time.perf_counter() - before)
+    return min(samples)
+
+
+def recommend(hasher, elapsed: float, target: float) -> Optional[Tuple[str, int, int]]:
+    """Return the cost setting, its value and the value meeting the target.
+
+    Returns None for hashers without a tunable cost.
+    """
+    scale = target / elapsed
+    if isinstance(hasher, PBKDF2PasswordHasher):
+        iterations = hasher.iterations
+        return "iterations", iterations, max(1000, int(round(iterations * scale, -3)))
+    if isinstance(hasher, BCryptSHA256PasswordHasher):
+        rounds = hasher.rounds
+        return "rounds", rounds, max(4, rounds + round(math.log2(scale)))
+    if hasattr(hasher, "time_cost"):
+        time_cost = hasher.time_cost
+        return "time_cost", time_cost, max(1, round(time_cost * scale))
+    return None
+
+
+class Command(BaseCommand):
+    """Time each of PASSWORD_HASHERS and recommend costs for a target latency.
+
+    The first hasher is used for new passwords and the PBKDF2 iterations can be set
+    with AUTH_PASSWORD_ITERATIONS. Run this on the production hosts as it measures
+    the CPU it runs on.
+    """
+
+    help = __doc__
+
+    def add_arguments(self, parser):
+        """Add benchmark arguments."""
+        parser.add_argument(
+            "--target-ms",
+            type=float,
+            default=250.0,
+            help="The time one password hash should take. Default: 250",
+        )
+        parser.add_argument(
+            "--rounds",
+            type=int,
+            default=3,
+            help="The number of hashes to time per hasher. Default: 3",
+        )
+
+    def handle(self, *args, **options):
+        """Run the benchmark."""
+        target = options["target_ms"] / 1000
+        header = ["hasher", "cost", "current", "ms", "recommended"]
+        self.stdout.write("".join(f"{column:>20}" for column in header))
+        for hasher in get_hashers():
+            try:
+                elapsed = time_hasher(hasher, options["rounds"])
+            except ValueError:
+                # NOTE: Raised when the hasher's library is not installed.
+                row = [hasher.algorithm, "not installed", "-", "-", "-"]
+                self.stdout.write("".join(f"{column:>20}" for column in row))
+                continue
+            row = [hasher.algorithm, "-", "-", f"{elapsed * 1000:.1f}", "-"]
+            advice = recommend(hasher, elapsed, target)
+            if advice is not None:
+                row[1], row[2], row[4] = advice[0], str(advice[1]), str(advice[2])
+            self.stdout.write("".join(f"{column:>20}" for column in row))
@@ -0,0 +1,131 @@
+"""Management Command to benchmark auth-test during a burst of logins."""
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Tuple
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from webapp import auth, hash_pool
+from webapp.benchmark import format_table, summarise, test_database
+
+Job = Tuple[Callable[[], None], List[float]]
+
+
+def run_jobs(jobs: List[Job], threads: int) -> float:
+    """Run each job on a fixed thread pool, recording its latency in its samples.
+
+    Return how long all of them took.
+    """
+
+    def timed(func: Callable[[], None], samples: List[float]):
+        before = time.perf_counter()
+        try:
+            func()
+        finally:
+            close_old_connections()
+        samples.append(time.perf_counter() - before)
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        started = time.perf_counter()
+        for future in [pool.submit(timed, *job) for job in jobs]:
+            future.result()
+        return time.perf_counter() - started
+
+
+def run_mix(
+    cookies, logins: int, checks: int, threads: int
+) -> Dict[str, Dict[str, Any]]:
+    """Send logins and auth-tests in a random order to a fixed thread pool."""
+    hash_pool.get_hash_pool.cache_clear()
+    login_samples: List[float] = []
+    check_samples: List[float] = []
+
+    def login():
+        Client().post(
+            reverse("login"), {"username": "benchmark", "password": "password"}
+        )
+
+    def check():
+        client = Client()
+        client.cookies = cookies
+        if client.get(reverse("auth-test")).status_code != 204:
+            raise RuntimeError("Expected a 204.")
+
+    jobs = [(login, login_samples)] * logins + [(check, check_samples)] * checks
+    random.Random(0).shuffle(jobs)
+    elapsed = run_jobs(jobs, threads)
+    stats = hash_pool.get_hash_pool().stats()
+    extra = {
+        "hashes_rejected": stats["rejected"],
+        "hash_max_wait_ms": stats["max_wait_ms"],
+    }
+    return {
+        "auth-test": {**summarise(check_samples, elapsed), **extra},
+        "login": {**summarise(login_samples, elapsed), **extra},
+    }
+
+
+def run_benchmark(logins: int, checks: int, threads: int):
+    """Time the burst hashing inline and on the hash pool."""
+    user = get_user_model().objects.create_user(
+        "benchmark", "benchmark@example.com", "password"
+    )
+    client = Client()
+    client.force_login(user)
+    results = {}
+    for name, workers in [("inline", 0), ("pool", None)]:
+        auth.get_local_cache.cache_clear()
+        overrides = {} if workers is None else {"AUTH_HASH_WORKERS": workers}
+        with override_settings(**overrides):
+            mix = run_mix(client.cookies, logins, checks, threads)
+        for kind, result in mix.items():
+            results[f"{name} {kind}"] = result
+    return results
+
+
+class Command(BaseCommand):
+    """Compare auth-test latency during a login burst with and without the hash pool.
+
+    Logins and auth-tests for an already logged in user are sent in a random order
+    to a gunicorn style worker with --threads threads. A throwaway test database is
+    created so no real data is touched.
+    """
+
+    help = __doc__
+
+    def add_arguments(self, parser):
+        """Add benchmark arguments."""
+        parser.add_argument(
+            "--logins",
+            type=int,
+            default=50,
+            help="The number of logins in the burst. Default: 50",
+        )
+        parser.add_argument(
+            "--checks",
+            type=int,
+            default=500,
+            help="The number of auth-tests in the burst. Default: 500",
+        )
+        parser.add_argument(
+            "--threads",
+            type=int,
+            default=6,
+            help="The number of threads of the worker. Default: 6",
+        )
+
+    def handle(self, *args, **options):
+        """Run the benchmark."""
+        with test_database():
+            results = run_benchmark(
+                options["logins"], options["checks"], options["threads"]
+            )
+        hash_pool.get_hash_pool.cache_clear()
+        for line in format_table(results):
+            self.stdout.write(line)
@@ -0,0 +1,91 @@
+"""Management Command to compare worker startup with and without AUTH_GATEWAY."""
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict, List
+
+from django.core.management.base import BaseCommand, CommandError
+
+from webapp.benchmark import format_table
+
+# NOTE: Runs in a fresh interpreter, so it pays for every import a worker would.
+WORKER = """
+import io, json, logging, resource, sys, time
+started = time.perf_counter()
+from webapp.wsgi import application
+logging.getLogger("django.request").setLevel(logging.ERROR)
+environ = {
+    "REQUEST_METHOD": "GET",
+    "PATH_INFO": "/auth-test/",
+    "SERVER_NAME": "localhost",
+    "SERVER_PORT": "80",
+    "wsgi.input": io.BytesIO(),
+    "wsgi.url_scheme": "http",
+}
+application(environ, lambda status, headers: None)
+print(json.dumps({
+    "ready_ms": (time.perf_counter() - started) * 1000,
+    "rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    "modules": len(sys.modules),
+}))
+"""
+
+PROFILES = {"full": "false", "gateway": "true"}
+
+
+def start_worker(gateway: str) -> Dict[str, float]:
+    """Start a fresh interpreter, answer one auth-test and return what it took."""
+    process = subprocess.run(
+        [sys.executable, "-W", "ignore", "-c", WORKER],
+        capture_output=True,
+        check=False,
+        cwd=Path(__file__).parents[3],
+        env={**os.environ, "AUTH_GATEWAY": gateway},
+    )
+    if process.returncode:
+        raise CommandError(process.stderr.decode())
+    return json.loads(process.stdout.decode().splitlines()[-1])
+
+
+def summarise_starts(starts: List[Dict[str, float]]) -> Dict[str, float]:
+    """Return the median of each measurement."""
+    return {name: statistics.median(s[name] for s in starts) for name in starts[0]}
+
+
+class Command(BaseCommand):
+    """Time how long a fresh worker takes to answer auth-test and its peak RSS.
+
+    Each profile, the full INSTALLED_APPS and AUTH_GATEWAY, is started --runs times
+    in a fresh interpreter that imports webapp.wsgi and answers one anonymous
+    auth-test. The medians of the time until it answered, its peak RSS and the
+    number of modules it imported are reported.
+    """
+
+    help = __doc__
+
+    def add_arguments(self, parser):
+        """Add the number of runs argument."""
+        parser.add_argument(
+            "--runs",
+            type=int,
+            default=5,
+            help="The number of workers to start per profile. Default: 5",
+        )
+
+    def handle(self, *args, **options):
+        """Run the benchmark."""
+        results = {}
+        for name, gateway in PROFILES.items():
+            starts = [start_worker(gateway) for _ in range(options["runs"])]
+            results[name] = summarise_starts(starts)
+        for line in format_table(results):
+            self.stdout.write(line)
+        full, gateway = results["full"], results["gateway"]
+        self.stdout.write(
+            f"The gateway is ready "
+            f"{100 * (1 - gateway['ready_ms'] / full['ready_ms']):.0f}% sooner and "
+            f"{full['rss_mb'] - gateway['rss_mb']:.1f} MB lighter."
+        )
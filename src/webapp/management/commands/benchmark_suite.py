@@ -0,0 +1,216 @@
+"""Management Command to benchmark auth-test, login and logout against a baseline."""
+import json
+import logging
+import os
+import platform
+import queue
+import subprocess
+import tempfile
+from typing import Any, Callable, Dict
+
+import django
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from webapp import auth
+from webapp.benchmark import compare, format_table, run_concurrently, test_database
+
+USERNAME = "benchmark"
+PASSWORD = "password"
+
+
+def expect(response, status: int):
+    """Raise unless the response has the status."""
+    if response.status_code != status:
+        raise RuntimeError(f"Expected a {status} but got a {response.status_code}.")
+
+
+def get_scenarios(user, logouts: int) -> Dict[str, Callable[[], None]]:
+    """Return a function sending one request for each scenario.
+
+    Each logout needs its own session, so that many are logged in up front.
+    """
+    logged_in = Client()
+    logged_in.force_login(user)
+    sessions: "queue.SimpleQueue[Any]" = queue.SimpleQueue()
+    for _ in range(logouts):
+        client = Client()
+        client.force_login(user)
+        sessions.put(client.cookies)
+
+    def allowed():
+        client = Client()
+        client.cookies = logged_in.cookies
+        expect(client.get(reverse("auth-test")), 204)
+
+    def denied():
+        expect(Client().get(reverse("auth-test")), 401)
+
+    def login():
+        data = {"username": USERNAME, "password": PASSWORD}
+        expect(Client().post(reverse("login"), data), 302)
+
+    def logout():
+        client = Client()
+        client.cookies = sessions.get_nowait()
+        expect(client.get(reverse("logout")), 302)
+
+    return {
+        "auth-test 204": allowed,
+        "auth-test 401": denied,
+        "login": login,
+        "logout": logout,
+    }
+
+
+def run_suite(
+    requests: int, concurrency: int, warmup: int
+) -> Dict[str, Dict[str, float]]:
+    """Time every scenario after warming it up.
+
+    The login rate limits are lifted, otherwise most logins would get a 429.
+    """
+    auth.get_local_cache.cache_clear()
+    auth.get_cache().clear()
+    user = get_user_model().objects.create_user(
+        USERNAME, "benchmark@example.com", PASSWORD
+    )
+    scenarios = get_scenarios(user, requests + warmup)
+    results = {}
+    with override_settings(
+        AUTH_LOGIN_RATE_LIMIT_IP=0, AUTH_LOGIN_RATE_LIMIT_USERNAME=0
+    ):
+        for name, request in scenarios.items():
+            run_concurrently(request, warmup, concurrency)
+            results[name] = run_concurrently(request, requests, concurrency)
+    auth.get_local_cache.cache_clear()
+    return results
+
+
+def get_commit() -> str:
+    """Return the current git commit or an empty string outside a checkout."""
+    try:
+        process = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            check=True,
+            cwd=os.path.dirname(__file__),
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+    return process.stdout.decode().strip()
+
+
+def get_environment(options: Dict[str, Any]) -> Dict[str, Any]:
+    """Return what the results depend on besides the code."""
+    return {
+        "commit": get_commit(),
+        "created": timezone.now().isoformat(),
+        "python": platform.python_version(),
+        "django": django.get_version(),
+        "database": connection.vendor,
+        "auth_cache": settings.CACHES[settings.AUTH_TEST_CACHE]["BACKEND"],
+        "session_engine": settings.SESSION_ENGINE,
+        "cpus": os.cpu_count(),
+        "requests": options["requests"],
+        "concurrency": options["concurrency"],
+        "warmup": options["warmup"],
+    }
+
+
+class Command(BaseCommand):
+    """Time auth-test, login and logout at a fixed concurrency.
+
+    Each scenario is sent --requests times from --concurrency threads after
+    --warmup untimed requests, and reports latency percentiles, throughput and
+    database queries per request. --save writes the results and the environment
+    they were measured in to a JSON file, --compare fails when the results regressed
+    from such a file by more than --threshold percent.
+
+    A throwaway test database is created so no real data is touched. It runs with
+    whatever database and caches are configured, SQLite and locmem work offline but
+    only compare results measured the same way.
+    """
+
+    help = __doc__
+
+    def add_arguments(self, parser):
+        """Add benchmark arguments."""
+        parser.add_argument(
+            "--requests",
+            type=int,
+            default=500,
+            help="The number of requests to time per scenario. Default: 500",
+        )
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=4,
+            help="The number of threads sending requests. Default: 4",
+        )
+        parser.add_argument(
+            "--warmup",
+            type=int,
+            default=50,
+            help="The number of untimed requests per scenario. Default: 50",
+        )
+        parser.add_argument("--save", help="Write the results to this JSON file.")
+        parser.add_argument(
+            "--compare", help="Compare the results with this JSON file."
+        )
+        parser.add_argument(
+            "--threshold",
+            type=float,
+            default=10.0,
+            help="The regression in percent --compare tolerates. Default: 10",
+        )
+
+    def handle(self, *args, **options):
+        """Run the benchmark."""
+        baseline = None
+        if options["compare"]:
+            with open(options["compare"]) as baseline_file:
+                baseline = json.load(baseline_file)
+        # NOTE: Otherwise every 401 is logged as a warning.
+        logging.getLogger("django.request").setLevel(logging.ERROR)
+        if connection.vendor == "sqlite":
+            # NOTE: The threads can't share SQLite's in-memory test database.
+            connection.settings_dict["TEST"]["NAME"] = os.path.join(
+                tempfile.mkdtemp(), "benchmark.sqlite3"
+            )
+        with test_database():
+            results = run_suite(
+                options["requests"], options["concurrency"], options["warmup"]
+            )
+        for line in format_table(results):
+            self.stdout.write(line)
+        if options["save"]:
+            report = {"environment": get_environment(options), "results": results}
+            with open(options["save"], "w") as report_file:
+                json.dump(report, report_file, indent=2)
+            self.stdout.write(f"Saved the results to {options['save']}.")
+        if baseline is not None:
+            self.compare(baseline, results, options["threshold"])
+
+    def compare(
+        self,
+        baseline: Dict[str, Any],
+        results: Dict[str, Dict[str, float]],
+        threshold: float,
+    ):
+        """Fail if the results regressed from the baseline."""
+        environment = baseline["environment"]
+        self.stdout.write(
+            f"Comparing with {environment['commit'] or 'a baseline'} measured on "
+            f"{environment['database']} at concurrency {environment['concurrency']}."
+        )
+        regressions = compare(baseline["results"], results, threshold)
+        if regressions:
+            raise CommandError("Regressed:\n" + "\n".join(regressions))
+        self.stdout.write(self.style.SUCCESS("No regressions."))
@@ -0,0 +1,55 @@
+"""Management Command to copy database sessions to the redis session cache."""
+from typing import List, Tuple
+
+from django.contrib.sessions.backends.db import SessionStore
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from webapp.sessions import redis
+
+
+class Command(BaseCommand):
+    """Copy every unexpired database session to the redis session cache.
+
+    Run it before switching SESSION_ENGINE to webapp.sessions.redis or
+    webapp.sessions.redis_db so nobody is logged out. Sessions are streamed from the
+    database and each batch is written in one round trip. Sessions already in redis
+    are left alone, so it is safe to run again.
+    """
+
+    help = __doc__
+
+    def add_arguments(self, parser):
+        """Add the batch size argument."""
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="The number of sessions read and written at once. Default: 1000",
+        )
+
+    def handle(self, *args, **options):
+        """Copy the sessions."""
+        batch_size = options["batch_size"]
+        store = SessionStore()
+        now = timezone.now()
+        rows = (
+            Session.objects.filter(expire_date__gt=now)
+            .order_by()
+            .values_list("session_key", "session_data", "expire_date")
+            .iterator(chunk_size=batch_size)
+        )
+        copied = read = 0
+        batch: List[Tuple[str, bytes, int]] = []
+        for session_key, session_data, expire_date in rows:
+            age = int((expire_date - now).total_seconds())
+            batch.append((session_key, redis.encode(store.decode(session_data)), age))
+            if len(batch) == batch_size:
+                copied += redis.write_many(batch)
+                read += len(batch)
+                batch = []
+        if batch:
+            copied += redis.write_many(batch)
+            read += len(batch)
+        self.stdout.write(f"Copied {copied} of {read} sessions.")
@@ -0,0 +1,40 @@
+"""Hand authorised media downloads to nginx with X-Accel-Redirect.
+
+``webapp.views.protected_media`` checks each download like auth-test and then
+answers with an empty response naming an internal nginx location, which sends the
+file so no worker ever streams one. See ``conf/nginx/auth_locations.conf``.
+
+With ``settings.AUTH_MEDIA_BACKEND`` "local" that location serves ``MEDIA_ROOT``
+from disk. With "s3" the file is presigned for
+``settings.AUTH_MEDIA_URL_EXPIRY`` seconds, which needs no request to S3, and that
+location proxies the presigned URL.
+"""
+import mimetypes
+import posixpath
+from typing import Optional
+from urllib.parse import quote, urlsplit
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+
+
+def get_media_name(path: str) -> Optional[str]:
+    """Return the name of a file under MEDIA_ROOT or None if path leaves it."""
+    name = posixpath.normpath(path)
+    if name in (".", "..") or name.startswith(("/", "../")):
+        return None
+    return name
+
+
+def get_content_type(name: str) -> str:
+    """Return the content type nginx should send the file with."""
+    return mimetypes.guess_type(name)[0] or "application/octet-stream"
+
+
+def get_redirect(name: str) -> str:
+    """Return the internal nginx URI that sends a media file."""
+    if settings.AUTH_MEDIA_BACKEND == "s3":
+        url = urlsplit(default_storage.url(name, expire=settings.AUTH_MEDIA_URL_EXPIRY))
+        location = settings.AUTH_MEDIA_S3_LOCATION
+        return f"{location}{url.scheme}/{url.netloc}{url.path}?{url.query}"
+    return f"{settings.AUTH_MEDIA_LOCAL_LOCATION}{quote(name)}"
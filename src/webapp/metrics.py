@@ -0,0 +1,222 @@
+"""Prometheus metrics for auth-test and logins, served at ``/metrics``.
+
+Recording a sample only adds to running totals belonging to the current thread,
+so requests take no lock at all. Only that thread ever writes its totals. Every
+``FLUSH_INTERVAL`` seconds a background thread adds what each thread's totals grew
+by to the prometheus_client metrics, as does every scrape, so the metrics lag by
+about a second even for idle threads.
+
+Start the workers with the ``prometheus_multiproc_dir`` environment variable set to
+an empty directory and prometheus_client keeps each worker's metrics in a file
+there, which ``/metrics`` adds up. Otherwise only the worker answering the scrape
+is counted.
+"""
+import os
+import threading
+import time
+from bisect import bisect_left
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+from prometheus_client import (
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+)
+from prometheus_client.multiprocess import MultiProcessCollector
+
+FLUSH_INTERVAL = 1.0
+LATENCY_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    float("inf"),
+)
+
+AUTH_TEST_DECISIONS = Counter(
+    "auth_test_decisions_total", "Answers to auth-test subrequests.", ["status"]
+)
+AUTH_TEST_SECONDS = Histogram(
+    "auth_test_seconds", "Time taken to answer auth-test.", buckets=LATENCY_BUCKETS
+)
+SESSION_LOOKUPS = Counter(
+    "auth_test_session_lookups_total",
+    "Sessions verified by auth-test by where they were found.",
+    ["source"],
+)
+LOGINS = Counter("auth_logins_total", "Login attempts by result.", ["result"])
+LOGIN_SECONDS = Histogram(
+    "auth_login_seconds",
+    "Time taken to answer the login view.",
+    buckets=LATENCY_BUCKETS,
+)
+
+
+# NOTE: prometheus_client can only observe one value at a time, so buffered
+# observations are added to the private bucket and sum values its Histogram has
+# kept since 0.4. Should a release drop them, observations skip the buffer.
+HISTOGRAM_INTERNALS = ("_upper_bounds", "_buckets", "_sum")
+BUFFER_OBSERVATIONS = all(
+    hasattr(AUTH_TEST_SECONDS, name) for name in HISTOGRAM_INTERNALS
+)
+
+
+def get_upper_bounds(histogram: Histogram) -> List[float]:
+    """Return the upper bounds of a histogram's buckets."""
+    return histogram._upper_bounds  # pylint: disable=protected-access
+
+
+def add_observations(histogram: Histogram, buckets: List[int], total: float):
+    """Add observations already counted into buckets to a histogram."""
+    # pylint: disable=protected-access
+    for index, count in enumerate(buckets):
+        if count:
+            histogram._buckets[index].inc(count)
+    histogram._sum.inc(total)
+
+
+class Buffer:
+    """The running totals of one thread's samples."""
+
+    def __init__(self):
+        """Start empty."""
+        self.thread = threading.current_thread()
+        self.counts: Dict[Tuple[Counter, str], int] = {}
+        self.observations: Dict[Histogram, Tuple[List[int], List[float]]] = {}
+        self.flushed_counts: Dict[Tuple[Counter, str], int] = {}
+        self.flushed_observations: Dict[Histogram, Tuple[List[int], float]] = {}
+
+    def flush(self):
+        """Add what the totals grew by since the last flush to the metrics.
+
+        The totals are read while their thread may be adding to them, anything
+        missed is added by the next flush. Callers must hold ``flush_lock``.
+        """
+        for key, count in list(self.counts.items()):
+            flushed = self.flushed_counts.get(key, 0)
+            if count > flushed:
+                counter, label = key
+                counter.labels(label).inc(count - flushed)
+                self.flushed_counts[key] = count
+        for histogram, (buckets, total) in list(self.observations.items()):
+            buckets = list(buckets)
+            flushed_buckets, flushed_total = self.flushed_observations.get(
+                histogram, ([0] * len(buckets), 0.0)
+            )
+            add_observations(
+                histogram,
+                [count - flushed for count, flushed in zip(buckets, flushed_buckets)],
+                total[0] - flushed_total,
+            )
+            self.flushed_observations[histogram] = (buckets, total[0])
+
+
+class Buffers(threading.local):
+    """The current thread's buffer, registered with every other thread's."""
+
+    def __init__(self):
+        """Start without a buffer for the current thread."""
+        super().__init__()
+        self.buffer: Optional[Buffer] = None
+
+    def get(self) -> Buffer:
+        """Return the current thread's buffer."""
+        if self.buffer is None:
+            self.buffer = Buffer()
+            with every_buffer_lock:
+                every_buffer.append(self.buffer)
+            get_flusher()
+        return self.buffer
+
+
+every_buffer_lock = threading.Lock()
+every_buffer: List[Buffer] = []
+buffers = Buffers()
+flush_lock = threading.Lock()
+
+
+def inc(counter: Counter, label: str):
+    """Count one sample of a counter with a single label."""
+    counts = buffers.get().counts
+    key = (counter, label)
+    counts[key] = counts.get(key, 0) + 1
+
+
+def observe(histogram: Histogram, value: float):
+    """Record one sample of a histogram without labels."""
+    if not BUFFER_OBSERVATIONS:
+        histogram.observe(value)
+        return
+    observations = buffers.get().observations
+    observation = observations.get(histogram)
+    if observation is None:
+        observation = ([0] * len(get_upper_bounds(histogram)), [0.0])
+        observations[histogram] = observation
+    observation[0][bisect_left(get_upper_bounds(histogram), value)] += 1
+    observation[1][0] += value
+
+
+def flush():
+    """Add every thread's samples to the prometheus_client metrics.
+
+    Buffers of threads that have finished are flushed one last time and dropped.
+    """
+    with every_buffer_lock:
+        flushing = list(every_buffer)
+        every_buffer[:] = [buffer for buffer in flushing if buffer.thread.is_alive()]
+    with flush_lock:
+        for buffer in flushing:
+            buffer.flush()
+
+
+def run_flusher():
+    """Flush every ``FLUSH_INTERVAL`` seconds forever."""
+    while True:
+        time.sleep(FLUSH_INTERVAL)
+        flush()
+
+
+@lru_cache(maxsize=None)
+def get_flusher() -> threading.Thread:
+    """Return this process' flusher thread, starting it on first use."""
+    thread = threading.Thread(target=run_flusher, name="metrics", daemon=True)
+    thread.start()
+    return thread
+
+
+def forget_buffers():
+    """Drop the parent's buffers, only the forking thread is left to reset."""
+    every_buffer.clear()
+    buffers.buffer = None
+    get_flusher.cache_clear()
+
+
+# NOTE: The flusher thread does not survive a fork, so children start their own.
+os.register_at_fork(after_in_child=forget_buffers)
+
+
+def get_registry():
+    """Return the registry holding every worker's metrics."""
+    if "prometheus_multiproc_dir" not in os.environ:
+        return REGISTRY
+    registry = CollectorRegistry()
+    MultiProcessCollector(registry)
+    return registry
+
+
+def render() -> bytes:
+    """Return the metrics in the Prometheus text format."""
+    flush()
+    return generate_latest(get_registry())
@@ -0,0 +1,73 @@
+"""Project wide middleware."""
+from axes.helpers import get_client_ip_address
+from django.conf import settings
+from django.http import HttpResponse
+from django.urls import reverse
+
+from webapp import metrics
+from webapp.rate_limit import get_login_rate_limiter
+from webapp.views import check_auth
+
+
+class AuthTestMiddleware:
+    """Answer auth-test subrequests before any other middleware runs.
+
+    The subrequests nginx sends have no body and only need a 204 or a 401, so the
+    session, CORS, CSRF, messages and clickjacking middleware are pure overhead.
+    This must be the first entry in ``settings.MIDDLEWARE``.
+    """
+
+    def __init__(self, get_response):
+        """Store get_response and resolve the auth-test path once."""
+        self.get_response = get_response
+        self.path = reverse("auth-test")
+
+    def __call__(self, request):
+        """Short circuit auth-test requests."""
+        if request.path_info == self.path:
+            return check_auth(request)
+        return self.get_response(request)
+
+
+class LoginRateLimitMiddleware:
+    """Turn away logins over the rate limits before the login form runs.
+
+    Logins are limited per IP address and per username, see webapp.rate_limit. This
+    should come straight after AuthTestMiddleware in ``settings.MIDDLEWARE``.
+    """
+
+    def __init__(self, get_response):
+        """Store get_response and resolve the login path once."""
+        self.get_response = get_response
+        self.path = reverse("login")
+
+    def __call__(self, request):
+        """Answer with a 429 when a limit is exceeded.
+
+        The IP address is checked first so clients over its limit are turned away
+        before their form is parsed.
+        """
+        if request.method == "POST" and request.path_info == self.path:
+            limiter = get_login_rate_limiter()
+            if settings.AUTH_LOGIN_RATE_LIMIT_IP:
+                ip_address = get_client_ip_address(request)
+                limits = {f"ip:{ip_address}": settings.AUTH_LOGIN_RATE_LIMIT_IP}
+                if not limiter.hit(limits):
+                    return self.rate_limited()
+            if settings.AUTH_LOGIN_RATE_LIMIT_USERNAME:
+                username = request.POST.get("username", "").strip().lower()[:150]
+                limits = {f"user:{username}": settings.AUTH_LOGIN_RATE_LIMIT_USERNAME}
+                if username and not limiter.hit(limits):
+                    return self.rate_limited()
+        return self.get_response(request)
+
+    def rate_limited(self) -> HttpResponse:
+        """Count a rate limited login and return the 429 response."""
+        metrics.inc(metrics.LOGINS, "rate_limited")
+        response = HttpResponse(
+            "Too many login attempts. Please try again later.",
+            status=429,
+            content_type="text/plain",
+        )
+        response["Retry-After"] = settings.AUTH_LOGIN_RATE_WINDOW
+        return response
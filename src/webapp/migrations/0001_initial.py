@@ -0,0 +1,34 @@
+# Generated by Django 2.2.28 on 2026-10-18 13:11
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ("auth", "0011_update_proxy_permissions"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="AuthTokenGeneration",
+            fields=[
+                (
+                    "user",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="auth_token_generation",
+                        serialize=False,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                ("generation", models.PositiveIntegerField(default=0)),
+                ("modified", models.DateTimeField(auto_now=True, db_index=True)),
+            ],
+        ),
+    ]
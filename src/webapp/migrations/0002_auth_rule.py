@@ -0,0 +1,59 @@
+# Generated by Django 2.2.28 on 2026-10-18 13:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("auth", "0011_update_proxy_permissions"),
+        ("webapp", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="AuthRule",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "host",
+                    models.CharField(
+                        blank=True,
+                        help_text="An exact host, or a domain starting with a '.' to match it and every subdomain. Leave blank to match every host.",
+                        max_length=255,
+                    ),
+                ),
+                (
+                    "path",
+                    models.CharField(
+                        help_text="Matches this path and everything below it. A '*' segment matches any one segment, for example /projects/*/settings/.",
+                        max_length=2000,
+                    ),
+                ),
+                (
+                    "groups",
+                    models.ManyToManyField(
+                        blank=True, related_name="auth_rules", to="auth.Group"
+                    ),
+                ),
+                (
+                    "permissions",
+                    models.ManyToManyField(
+                        blank=True, related_name="auth_rules", to="auth.Permission"
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["host", "path"],
+                "unique_together": {("host", "path")},
+            },
+        ),
+    ]
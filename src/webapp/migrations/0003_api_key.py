@@ -0,0 +1,62 @@
+# Generated by Django 2.2.28 on 2026-10-18 13:20
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("webapp", "0002_auth_rule"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="APIKey",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "name",
+                    models.CharField(
+                        help_text="What the key is used for.", max_length=100
+                    ),
+                ),
+                (
+                    "prefix",
+                    models.CharField(editable=False, max_length=12, unique=True),
+                ),
+                ("hashed_key", models.CharField(editable=False, max_length=64)),
+                ("created", models.DateTimeField(auto_now_add=True)),
+                (
+                    "expires",
+                    models.DateTimeField(
+                        blank=True,
+                        help_text="Leave blank for a key that never expires.",
+                        null=True,
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="api_keys",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "API key",
+                "ordering": ["name"],
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 2.2.28 on 2026-10-18 14:29
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("webapp", "0003_api_key"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="authtokengeneration",
+            name="user",
+            field=models.OneToOneField(
+                db_constraint=False,
+                on_delete=django.db.models.deletion.DO_NOTHING,
+                primary_key=True,
+                related_name="auth_token_generation",
+                serialize=False,
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+    ]
@@ -0,0 +1,89 @@
+"""Webapp models."""
+from django.conf import settings
+from django.contrib.auth.models import Group, Permission
+from django.db import models
+
+
+class AuthTokenGeneration(models.Model):
+    """The current generation of a user's auth tokens.
+
+    Tokens carry the generation they were issued with, so bumping it revokes every
+    token issued before. The row outlives its user as a tombstone, so the bump made
+    when the user is deleted reaches every process, see webapp.signals.
+    """
+
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        primary_key=True,
+        related_name="auth_token_generation",
+    )
+    generation = models.PositiveIntegerField(default=0)
+    modified = models.DateTimeField(auto_now=True, db_index=True)
+
+    def __str__(self):
+        """Return the user and generation."""
+        return f"{self.user_id}: {self.generation}"
+
+
+class AuthRule(models.Model):
+    """A rule limiting which users may access which URIs, see webapp.rules."""
+
+    host = models.CharField(
+        max_length=255,
+        blank=True,
+        help_text=(
+            "An exact host, or a domain starting with a '.' to match it and every "
+            "subdomain. Leave blank to match every host."
+        ),
+    )
+    path = models.CharField(
+        max_length=2000,
+        help_text=(
+            "Matches this path and everything below it. A '*' segment matches any "
+            "one segment, for example /projects/*/settings/."
+        ),
+    )
+    groups = models.ManyToManyField(Group, blank=True, related_name="auth_rules")
+    permissions = models.ManyToManyField(
+        Permission, blank=True, related_name="auth_rules"
+    )
+
+    class Meta:
+        """Keep one rule per host and path."""
+
+        ordering = ["host", "path"]
+        unique_together = [("host", "path")]
+
+    def __str__(self):
+        """Return the host and path."""
+        return f"{self.host}{self.path}"
+
+
+class APIKey(models.Model):
+    """A key machine clients send instead of logging in, see webapp.api_keys.
+
+    Only a hash of the key is stored, it is shown once when the key is created.
+    """
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="api_keys"
+    )
+    name = models.CharField(max_length=100, help_text="What the key is used for.")
+    prefix = models.CharField(max_length=12, unique=True, editable=False)
+    hashed_key = models.CharField(max_length=64, editable=False)
+    created = models.DateTimeField(auto_now_add=True)
+    expires = models.DateTimeField(
+        null=True, blank=True, help_text="Leave blank for a key that never expires."
+    )
+
+    class Meta:
+        """Name the model like the admin expects."""
+
+        ordering = ["name"]
+        verbose_name = "API key"
+
+    def __str__(self):
+        """Return the name and prefix."""
+        return f"{self.name} ({self.prefix})"
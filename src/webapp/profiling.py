@@ -0,0 +1,303 @@
+"""Sample where requests spend their time without a profiler attached.
+
+``wrap`` returns the WSGI application unchanged unless profiling is enabled, so it
+costs nothing when off. Otherwise every ``settings.AUTH_PROFILE_SAMPLE_EVERY``th
+request is profiled: a thread takes its stack every
+``settings.AUTH_PROFILE_INTERVAL_MS`` and its queries are counted and timed. With
+``settings.AUTH_PROFILE_SLOW_MS`` every other request is only timed, and the thread
+starts taking its stack once it has been running that long, so fast requests only
+pay for reading the clock and registering with the thread.
+
+Each process adds the samples up by the first segment of the path and every
+``WRITE_INTERVAL`` seconds rewrites two files in ``settings.AUTH_PROFILE_DIR``:
+
+* ``<pid>.folded`` holds collapsed stacks, which ``flamegraph.pl`` or speedscope
+  turn into a flame graph. Concatenate the files to combine the workers.
+* ``<pid>.json`` holds the requests, queries and time spent in each phase
+  (``middleware``, ``session``, ``user``, ``view`` and ``db``) per path.
+"""
+import itertools
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from functools import lru_cache
+from typing import Any, Dict, Optional, Tuple
+
+from django.conf import settings
+from django.db import connection
+
+WRITE_INTERVAL = 10.0
+# NOTE: A sample belongs to the phase of its innermost frame matching a rule. Rules
+# are a module prefix and optionally a function name.
+PHASES = [
+    ("django.db.", None, "db"),
+    ("django.contrib.sessions.", None, "session"),
+    ("webapp.sessions", None, "session"),
+    ("django.contrib.auth.backends", None, "user"),
+    ("webapp.backends", None, "user"),
+    ("django.contrib.auth", "get_user", "user"),
+    ("webapp.auth", "load_user_access", "user"),
+    ("webapp.views", None, "view"),
+    ("django.contrib.auth.views", None, "view"),
+    ("django.contrib.admin.", None, "view"),
+    ("django.views.", None, "view"),
+]
+
+Stack = Tuple[Tuple[str, str], ...]
+
+
+def get_phase(stack: Stack) -> str:
+    """Return the phase a sampled stack belongs to."""
+    for module, function in reversed(stack):
+        for prefix, name, phase in PHASES:
+            if module.startswith(prefix) and name in (None, function):
+                return phase
+    return "middleware"
+
+
+def get_endpoint(environ: Dict[str, Any]) -> str:
+    """Return the first segment of the request's path."""
+    return "/" + environ.get("PATH_INFO", "/").strip("/").split("/")[0]
+
+
+class Trace:
+    """The samples and queries of one profiled request.
+
+    Stacks are only taken from ``sample_after``, a ``time.monotonic`` time.
+    """
+
+    __slots__ = ("sample_after", "stacks", "queries", "query_seconds")
+
+    def __init__(self, sample_after: float = 0.0):
+        """Start empty."""
+        self.sample_after = sample_after
+        self.stacks: Counter = Counter()
+        self.queries = 0
+        self.query_seconds = 0.0
+
+    def query(self, execute, *args):
+        """Count and time a query, for ``connection.execute_wrapper``."""
+        started = time.perf_counter()
+        try:
+            return execute(*args)
+        finally:
+            self.queries += 1
+            self.query_seconds += time.perf_counter() - started
+
+
+class Profiler:
+    """This process' profiled requests and their samples added up."""
+
+    def __init__(self, interval: float, directory: str):
+        """Start without samples, see get_profiler for the sampling thread."""
+        self.interval = interval
+        self.directory = directory
+        self.active: Dict[int, Trace] = {}
+        self.stacks: Counter = Counter()
+        self.endpoints: Dict[str, Dict[str, Any]] = {}
+        self._write_at = time.monotonic() + WRITE_INTERVAL
+        self._lock = threading.Lock()
+
+    def begin(self, sample_after: float = 0.0) -> Trace:
+        """Start sampling the current thread's request from sample_after."""
+        trace = Trace(sample_after)
+        self.active[threading.get_ident()] = trace
+        return trace
+
+    def end(self):
+        """Stop sampling the current thread's request."""
+        self.active.pop(threading.get_ident(), None)
+
+    def run(self):
+        """Sample the active requests forever."""
+        while True:
+            time.sleep(self.interval)
+            self.sample()
+
+    def sample(self):
+        """Add the current stack of each active request due a sample to its trace."""
+        now = time.monotonic()
+        due = [
+            (thread_id, trace)
+            for thread_id, trace in list(self.active.items())
+            if trace.sample_after <= now
+        ]
+        if not due:
+            return
+        frames = sys._current_frames()  # pylint: disable=protected-access
+        for thread_id, trace in due:
+            frame = frames.get(thread_id)
+            if frame is not None:
+                trace.stacks[fold(frame)] += 1
+
+    def record(self, endpoint: str, trace: Trace, seconds: float, queried: bool):
+        """Add a profiled request to the totals, writing them out when due.
+
+        Queries are only added up for requests queried says were counted.
+        """
+        with self._lock:
+            totals = self.endpoints.setdefault(
+                endpoint,
+                {
+                    "requests": 0,
+                    "ms": 0.0,
+                    "queried": 0,
+                    "queries": 0,
+                    "query_ms": 0.0,
+                    "phases": {},
+                },
+            )
+            totals["requests"] += 1
+            totals["ms"] += seconds * 1000
+            if queried:
+                totals["queried"] += 1
+                totals["queries"] += trace.queries
+                totals["query_ms"] += trace.query_seconds * 1000
+            phases = totals["phases"]
+            for stack, count in trace.stacks.items():
+                self.stacks[(endpoint, stack)] += count
+                phase = get_phase(stack)
+                phases[phase] = phases.get(phase, 0.0) + count * self.interval * 1000
+            due = time.monotonic() >= self._write_at
+            if due:
+                self._write_at = time.monotonic() + WRITE_INTERVAL
+        if due:
+            self.write()
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        """Return the mean time, queries and phases per request for each path.
+
+        Queries are None for paths where only slow requests were profiled.
+        """
+        summary = {}
+        with self._lock:
+            for endpoint, totals in self.endpoints.items():
+                requests, queried = totals["requests"], totals["queried"]
+                summary[endpoint] = {
+                    "requests": requests,
+                    "mean_ms": totals["ms"] / requests,
+                    "queries_per_request": (
+                        totals["queries"] / queried if queried else None
+                    ),
+                    "query_ms_per_request": (
+                        totals["query_ms"] / queried if queried else None
+                    ),
+                    "phase_ms_per_request": {
+                        phase: phase_ms / requests
+                        for phase, phase_ms in totals["phases"].items()
+                    },
+                }
+        return summary
+
+    def folded(self) -> str:
+        """Return the samples as collapsed stacks."""
+        with self._lock:
+            stacks = list(self.stacks.items())
+        return "".join(
+            ";".join([endpoint, *[f"{m}:{f}" for m, f in stack]]) + f" {count}\n"
+            for (endpoint, stack), count in stacks
+        )
+
+    def write(self):
+        """Rewrite this process' files."""
+        os.makedirs(self.directory, exist_ok=True)
+        prefix = os.path.join(self.directory, str(os.getpid()))
+        for extension, content in [
+            ("folded", self.folded()),
+            ("json", json.dumps(self.summary(), indent=2)),
+        ]:
+            path = f"{prefix}.{extension}"
+            with open(f"{path}.tmp", "w") as output:
+                output.write(content)
+            os.replace(f"{path}.tmp", path)
+
+
+class ProfilingApplication:
+    """Profile a share of the requests to a WSGI application."""
+
+    def __init__(self, application, sample_every: int, slow_ms: float):
+        """Wrap application."""
+        self.application = application
+        self.sample_every = sample_every
+        self.slow_ms = slow_ms
+        self._requests = itertools.count(1)
+
+    def __call__(self, environ, start_response):
+        """Call the application, profiling the request if it may be kept."""
+        sampled = bool(self.sample_every) and (
+            next(self._requests) % self.sample_every == 0
+        )
+        if sampled:
+            return self.call_sampled(environ, start_response)
+        if self.slow_ms:
+            return self.call_timed(environ, start_response)
+        return self.application(environ, start_response)
+
+    def call_sampled(self, environ, start_response):
+        """Call the application, sampling its stack and counting its queries."""
+        profiler = get_profiler()
+        trace = profiler.begin()
+        started = time.perf_counter()
+        try:
+            with connection.execute_wrapper(trace.query):
+                return self.application(environ, start_response)
+        finally:
+            seconds = time.perf_counter() - started
+            profiler.end()
+            profiler.record(get_endpoint(environ), trace, seconds, queried=True)
+
+    def call_timed(self, environ, start_response):
+        """Call the application, sampling its stack only once it is slow."""
+        profiler = get_profiler()
+        started = time.perf_counter()
+        trace = profiler.begin(time.monotonic() + self.slow_ms / 1000)
+        try:
+            return self.application(environ, start_response)
+        finally:
+            seconds = time.perf_counter() - started
+            profiler.end()
+            if seconds * 1000 >= self.slow_ms:
+                profiler.record(get_endpoint(environ), trace, seconds, queried=False)
+
+
+STOP_CODES = {
+    ProfilingApplication.call_sampled.__code__,
+    ProfilingApplication.call_timed.__code__,
+}
+
+
+def fold(frame) -> Stack:
+    """Return the stack below ProfilingApplication, outermost first."""
+    stack = []
+    current: Optional[Any] = frame
+    while current is not None and current.f_code not in STOP_CODES:
+        module = current.f_globals.get("__name__", "?")
+        stack.append((module, current.f_code.co_name))
+        current = current.f_back
+    return tuple(reversed(stack))
+
+
+@lru_cache(maxsize=None)
+def get_profiler() -> Profiler:
+    """Return this process' profiler, starting its sampling thread."""
+    profiler = Profiler(
+        settings.AUTH_PROFILE_INTERVAL_MS / 1000, settings.AUTH_PROFILE_DIR
+    )
+    threading.Thread(target=profiler.run, name="profiler", daemon=True).start()
+    return profiler
+
+
+# NOTE: The sampling thread does not survive a fork, so children start their own.
+os.register_at_fork(after_in_child=get_profiler.cache_clear)
+
+
+def wrap(application):
+    """Return the application profiled as configured, or unchanged when off."""
+    if not settings.AUTH_PROFILE_SAMPLE_EVERY and not settings.AUTH_PROFILE_SLOW_MS:
+        return application
+    return ProfilingApplication(
+        application, settings.AUTH_PROFILE_SAMPLE_EVERY, settings.AUTH_PROFILE_SLOW_MS
+    )
@@ -0,0 +1,141 @@
+"""Limit how often logins are attempted per IP address and per username.
+
+Each key is counted in fixed windows of ``settings.AUTH_LOGIN_RATE_WINDOW`` seconds
+and the rate is the current window's count plus the share of the previous window's
+count that still overlaps a sliding window ending now. Counts are shared through the
+auth cache, but each process only sends its hits every
+``settings.AUTH_LOGIN_RATE_SYNC_EVERY`` requests or second, adding its unsent hits to
+the last count it saw in between. Every key of a request is synced with one pipelined
+round trip to redis, and a key over its limit is rejected without any.
+"""
+import threading
+import time
+from functools import lru_cache
+from typing import Dict, List, Tuple
+
+from django.conf import settings
+from django.core.cache import caches
+from django_redis import get_redis_connection
+
+from webapp.local_cache import LocalCache
+
+SYNC_INTERVAL = 1.0
+
+
+class Counter:
+    """This process' view of one key's count."""
+
+    __slots__ = ("window", "previous", "current", "pending", "synced")
+
+    def __init__(self, window: int):
+        """Start a key's count in a window."""
+        self.window = window
+        self.previous = 0
+        self.current = 0
+        self.pending = 0
+        self.synced = 0.0
+
+    def roll(self, window: int):
+        """Move on to a later window."""
+        self.previous = self.current + self.pending if window == self.window + 1 else 0
+        self.window = window
+        self.current = 0
+        self.pending = 0
+        self.synced = 0.0
+
+    def rate(self, overlap: float) -> float:
+        """Return the approximate count over the sliding window."""
+        return self.previous * overlap + self.current + self.pending
+
+
+def sync_counts(
+    window: int, counts: List[Tuple[str, int]], timeout: int
+) -> List[Tuple[int, int]]:
+    """Add hits to the shared counts and return each key's current and previous count."""
+    cache = caches[settings.AUTH_TEST_CACHE]
+    try:
+        connection = get_redis_connection(settings.AUTH_TEST_CACHE)
+    except NotImplementedError:
+        results = []
+        for key, count in counts:
+            current_key = f"rate-limit:{key}:{window}"
+            cache.add(current_key, 0, timeout)
+            results.append(
+                (
+                    cache.incr(current_key, count),
+                    cache.get(f"rate-limit:{key}:{window - 1}", 0),
+                )
+            )
+        return results
+    pipeline = connection.pipeline(transaction=False)
+    for key, count in counts:
+        current_key = cache.make_key(f"rate-limit:{key}:{window}")
+        pipeline.incrby(current_key, count)
+        pipeline.expire(current_key, timeout)
+        pipeline.get(cache.make_key(f"rate-limit:{key}:{window - 1}"))
+    replies = pipeline.execute()
+    return [
+        (int(replies[index]), int(replies[index + 2] or 0))
+        for index in range(0, len(replies), 3)
+    ]
+
+
+class RateLimiter:
+    """Approximate sliding window rate limits shared between processes."""
+
+    def __init__(self, window: int, sync_every: int):
+        """Start without any counts."""
+        self.window = window
+        self.sync_every = sync_every
+        self.counters = LocalCache(settings.AUTH_TEST_LOCAL_CACHE_SIZE, window * 2)
+        self._lock = threading.Lock()
+
+    def hit(self, limits: Dict[str, int]) -> bool:
+        """Count a request against each key and return whether all are in limit."""
+        now = time.time()
+        window, offset = divmod(now, self.window)
+        window = int(window)
+        overlap = 1 - offset / self.window
+        due = []
+        with self._lock:
+            counters = {}
+            for key in limits:
+                counter = self.counters.get(key)
+                if counter is None:
+                    counter = Counter(window)
+                    self.counters.set(key, counter)
+                elif counter.window != window:
+                    counter.roll(window)
+                counters[key] = counter
+            if any(
+                counters[key].rate(overlap) >= limit for key, limit in limits.items()
+            ):
+                return False
+            for key, counter in counters.items():
+                counter.pending += 1
+                if (
+                    counter.pending >= self.sync_every
+                    or now - counter.synced >= SYNC_INTERVAL
+                ):
+                    due.append((key, counter.pending))
+        if due:
+            results = sync_counts(window, due, self.window * 2)
+            with self._lock:
+                for (key, sent), (current, previous) in zip(due, results):
+                    counter = counters[key]
+                    if counter.window == window:
+                        counter.pending -= sent
+                        counter.current = current
+                        counter.previous = previous
+                        counter.synced = now
+        return all(
+            counters[key].rate(overlap) <= limit for key, limit in limits.items()
+        )
+
+
+@lru_cache(maxsize=None)
+def get_login_rate_limiter() -> RateLimiter:
+    """Return this process' login rate limiter."""
+    return RateLimiter(
+        settings.AUTH_LOGIN_RATE_WINDOW, settings.AUTH_LOGIN_RATE_SYNC_EVERY
+    )
@@ -0,0 +1,261 @@
+"""Decide which users may access which URIs behind nginx.
+
+A rule is a dict with a ``path`` pattern and optionally a ``host``, ``groups`` and
+``permissions``:
+
+* ``path`` is a prefix split into segments, a ``*`` segment matches any one
+  segment. ``/projects/*/settings/`` matches ``/projects/1/settings/billing/``.
+* ``host`` is an exact host or, like ``ALLOWED_HOSTS``, a domain starting with a
+  ``.`` which matches the domain and every subdomain. Rules without one apply to
+  every host.
+* A user may access a matching URI when they are a superuser, in any of the
+  ``groups`` or have any of the ``permissions``. A rule with neither lets every
+  logged in user through.
+
+The most specific rule wins: rules for the request's host beat rules for every host,
+then the rule matching the most segments, preferring literal segments over ``*``.
+URIs no rule matches are open to every logged in user.
+
+Rules come from ``settings.AUTH_RULES`` and the ``AuthRule`` model, with the model
+winning when both have a rule for the same host and path. Changing an ``AuthRule``
+bumps a version counter in the shared cache. Every process polls it at most every
+``settings.AUTH_RULES_POLL_INTERVAL`` seconds and recompiles when it changes, so no
+restart is needed.
+"""
+import posixpath
+import threading
+import time
+from functools import lru_cache
+from typing import (
+    Any,
+    Dict,
+    FrozenSet,
+    Iterable,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+    cast,
+)
+from urllib.parse import unquote
+
+from django.conf import settings
+from django.db import transaction
+from django.http.request import split_domain_port
+
+from webapp.auth import Access, LookupRequired, get_cache
+from webapp.models import AuthRule
+
+WILDCARD = "*"
+VERSION_KEY = "auth-rules:version"
+
+
+class Rule(NamedTuple):
+    """A compiled rule."""
+
+    path: str
+    host: str
+    groups: FrozenSet[str]
+    permissions: FrozenSet[str]
+
+    @classmethod
+    def from_dict(cls, rule: Dict[str, Any]) -> "Rule":
+        """Return the rule described by a dict."""
+        return cls(
+            path=rule["path"],
+            host=rule.get("host", "").lower(),
+            groups=frozenset(rule.get("groups", [])),
+            permissions=frozenset(rule.get("permissions", [])),
+        )
+
+    @classmethod
+    def from_model(cls, rule: AuthRule) -> "Rule":
+        """Return the rule stored in an AuthRule."""
+        return cls(
+            path=rule.path,
+            host=rule.host.lower(),
+            groups=frozenset(group.name for group in rule.groups.all()),
+            permissions=frozenset(
+                f"{perm.content_type.app_label}.{perm.codename}"
+                for perm in rule.permissions.all()
+            ),
+        )
+
+    def allows(self, access: Access) -> bool:
+        """Return whether a user with the given access may use the URI."""
+        if access.is_superuser or not (self.groups or self.permissions):
+            return True
+        return bool(
+            self.groups & access.groups or self.permissions & access.permissions
+        )
+
+
+def split_path(path: str) -> List[str]:
+    """Return the non-empty segments of a path."""
+    return [segment for segment in path.split("/") if segment]
+
+
+def normalise_uri(uri: str) -> str:
+    """Return the decoded path of a URI with any ``.`` and ``..`` resolved."""
+    path = unquote(uri.split("?", 1)[0].split("#", 1)[0])
+    return posixpath.normpath("/" + path.lstrip("/"))
+
+
+def get_host_keys(host: str) -> List[str]:
+    """Return the keys that could hold rules for a host, most specific first."""
+    host = split_domain_port(host)[0]
+    labels = host.split(".")
+    suffixes = ["." + ".".join(labels[index:]) for index in range(len(labels))]
+    return [host, *suffixes, ""]
+
+
+class Node:
+    """A node of a segment trie."""
+
+    __slots__ = ("children", "rule")
+
+    def __init__(self):
+        """Start without children or a rule."""
+        self.children: Dict[str, "Node"] = {}
+        self.rule: Optional[Rule] = None
+
+
+class PathTrie:
+    """Rules for one host indexed by their path segments."""
+
+    def __init__(self):
+        """Start empty."""
+        self.root = Node()
+
+    def add(self, rule: Rule):
+        """Add a rule, replacing any earlier rule with the same path."""
+        node = self.root
+        for segment in split_path(rule.path):
+            node = node.children.setdefault(segment, Node())
+        node.rule = rule
+
+    def match(self, segments: List[str]) -> Optional[Rule]:
+        """Return the most specific rule matching the segments."""
+        best: Tuple[int, Optional[Rule]] = (-1, None)
+        stack = [(self.root, 0)]
+        while stack:
+            node, depth = stack.pop()
+            if node.rule is not None and depth > best[0]:
+                best = (depth, node.rule)
+            if depth == len(segments):
+                continue
+            # NOTE: Pushed last so it is visited first and wins ties against `*`.
+            for key in (WILDCARD, segments[depth]):
+                child = node.children.get(key)
+                if child is not None:
+                    stack.append((child, depth + 1))
+        return best[1]
+
+
+class RuleSet:
+    """Rules compiled into a segment trie per host."""
+
+    def __init__(self, rules: Iterable[Rule]):
+        """Compile the rules."""
+        self.hosts: Dict[str, PathTrie] = {}
+        for rule in rules:
+            self.hosts.setdefault(rule.host, PathTrie()).add(rule)
+
+    def __bool__(self):
+        """Return whether there are any rules."""
+        return bool(self.hosts)
+
+    def match(self, host: str, uri: str) -> Optional[Rule]:
+        """Return the rule deciding access to the URI or None if it is open."""
+        segments = split_path(normalise_uri(uri))
+        for key in get_host_keys(host):
+            trie = self.hosts.get(key)
+            if trie is not None:
+                rule = trie.match(segments)
+                if rule is not None:
+                    return rule
+        return None
+
+
+def load_rule_set() -> RuleSet:
+    """Compile the rules from ``settings.AUTH_RULES`` and the database."""
+    queryset = AuthRule.objects.prefetch_related("groups", "permissions__content_type")
+    return RuleSet(
+        [
+            *[Rule.from_dict(rule) for rule in settings.AUTH_RULES],
+            *[Rule.from_model(rule) for rule in queryset],
+        ]
+    )
+
+
+class RuleStore:
+    """This process' compiled rules, kept in step with the shared version counter.
+
+    Requests always read the current rule set without locking. Whichever request
+    finds a poll is due checks the version and swaps in a recompiled rule set, while
+    any others arriving meanwhile carry on with the old one.
+    """
+
+    def __init__(self, poll_interval: float):
+        """Start without any rules so the first request compiles them."""
+        self.poll_interval = poll_interval
+        self.rule_set: Optional[RuleSet] = None
+        self.version: Optional[int] = None
+        self._next_poll = 0.0
+        self._lock = threading.Lock()
+
+    def get(self, local_only: bool = False) -> RuleSet:
+        """Return the current rule set.
+
+        With local_only, LookupRequired is raised instead of polling.
+        """
+        rule_set = self.rule_set
+        if rule_set is not None and time.monotonic() < self._next_poll:
+            return rule_set
+        if local_only:
+            raise LookupRequired()
+        self.refresh()
+        return cast(RuleSet, self.rule_set)
+
+    def refresh(self):
+        """Recompile the rules if the version has changed."""
+        if not self._lock.acquire(blocking=self.rule_set is None):
+            return
+        try:
+            version = get_cache().get(VERSION_KEY, 0)
+            if self.rule_set is None or version != self.version:
+                self.rule_set = load_rule_set()
+                self.version = version
+            self._next_poll = time.monotonic() + self.poll_interval
+        finally:
+            self._lock.release()
+
+    def expire(self):
+        """Poll on the next request."""
+        self._next_poll = 0.0
+
+
+@lru_cache(maxsize=None)
+def get_rule_store() -> RuleStore:
+    """Return this process' rule store."""
+    return RuleStore(settings.AUTH_RULES_POLL_INTERVAL)
+
+
+def get_rule_set(local_only: bool = False) -> RuleSet:
+    """Return the current rule set."""
+    return get_rule_store().get(local_only)
+
+
+def bump_version():
+    """Make every process recompile its rules once the transaction commits."""
+
+    def bump():
+        cache = get_cache()
+        cache.add(VERSION_KEY, 0, None)
+        try:
+            cache.incr(VERSION_KEY)
+        except ValueError:
+            cache.set(VERSION_KEY, 1, None)
+        get_rule_store().expire()
+
+    transaction.on_commit(bump)
@@ -0,0 +1,171 @@
+"""Buffer session expiry refreshes and ``last_login`` updates.
+
+With ``settings.AUTH_SESSION_SLIDING`` a session's expiry is pushed back while it is
+used, but only once less than ``settings.AUTH_SESSION_REFRESH_THRESHOLD`` seconds of
+it are left. With ``settings.AUTH_LAST_LOGIN_BUFFERED`` logging in does not save the
+user. Either way auth-test and the login view only add to a redis set or hash, which
+``webapp.tasks.flush_session_writes`` drains into one UPDATE per batch every
+``settings.AUTH_SESSION_FLUSH_INTERVAL`` seconds.
+
+Expired database sessions are deleted a batch at a time by
+``webapp.tasks.purge_expired_sessions``.
+"""
+import time
+from datetime import datetime, timedelta
+from importlib import import_module
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.sessions.backends.base import SessionBase
+from django.core.cache import caches
+from django.db.models import Q
+from django.utils import timezone
+from django_redis import get_redis_connection
+
+TOUCHES_KEY = "session-touches"
+LOGINS_KEY = "last-logins"
+BATCH_SIZE = 500
+
+
+def needs_touch(session: SessionBase) -> bool:
+    """Return whether a loaded session is close enough to expiring to refresh."""
+    expire_date = getattr(session, "expire_date", None)
+    if expire_date is None:
+        return False
+    remaining = expire_date - timezone.now()
+    return remaining < timedelta(seconds=settings.AUTH_SESSION_REFRESH_THRESHOLD)
+
+
+def record_touch(session_key: str):
+    """Queue a session to have its expiry refreshed by the next flush."""
+    cache = caches[settings.AUTH_TEST_CACHE]
+    try:
+        connection = get_redis_connection(settings.AUTH_TEST_CACHE)
+    except NotImplementedError:
+        cache.set(TOUCHES_KEY, {*cache.get(TOUCHES_KEY, set()), session_key}, None)
+        return
+    connection.sadd(cache.make_key(TOUCHES_KEY), session_key)
+
+
+def record_login(user_id: int, last_login: datetime):
+    """Queue a user's ``last_login`` for the next flush, the latest login wins."""
+    cache = caches[settings.AUTH_TEST_CACHE]
+    try:
+        connection = get_redis_connection(settings.AUTH_TEST_CACHE)
+    except NotImplementedError:
+        logins = cache.get(LOGINS_KEY, {})
+        logins[user_id] = last_login.isoformat()
+        cache.set(LOGINS_KEY, logins, None)
+        return
+    connection.hset(cache.make_key(LOGINS_KEY), user_id, last_login.isoformat())
+
+
+def drain_touches() -> List[str]:
+    """Remove and return the keys of every session queued for a refresh."""
+    cache = caches[settings.AUTH_TEST_CACHE]
+    try:
+        connection = get_redis_connection(settings.AUTH_TEST_CACHE)
+    except NotImplementedError:
+        session_keys = cache.get(TOUCHES_KEY, set())
+        cache.delete(TOUCHES_KEY)
+        return list(session_keys)
+    key = cache.make_key(TOUCHES_KEY)
+    pipeline = connection.pipeline()
+    pipeline.smembers(key)
+    pipeline.delete(key)
+    return [session_key.decode() for session_key in pipeline.execute()[0]]
+
+
+def drain_logins() -> Dict[int, datetime]:
+    """Remove and return every queued ``last_login`` by user id."""
+    cache = caches[settings.AUTH_TEST_CACHE]
+    try:
+        connection = get_redis_connection(settings.AUTH_TEST_CACHE)
+    except NotImplementedError:
+        logins = cache.get(LOGINS_KEY, {})
+        cache.delete(LOGINS_KEY)
+    else:
+        key = cache.make_key(LOGINS_KEY)
+        pipeline = connection.pipeline()
+        pipeline.hgetall(key)
+        pipeline.delete(key)
+        logins = {
+            int(user_id): value.decode()
+            for user_id, value in pipeline.execute()[0].items()
+        }
+    return {user_id: datetime.fromisoformat(value) for user_id, value in logins.items()}
+
+
+def get_session_store() -> Any:
+    """Return the SessionStore class of ``settings.SESSION_ENGINE``."""
+    engine: Any = import_module(settings.SESSION_ENGINE)
+    return engine.SessionStore
+
+
+def batches(items: List, size: int = BATCH_SIZE) -> Iterable[List]:
+    """Split items into lists of at most size."""
+    for index in range(0, len(items), size):
+        yield items[index : index + size]
+
+
+def touch_sessions(session_keys: List[str]) -> int:
+    """Refresh the expiry of the sessions that have not expired yet.
+
+    Every session gets the same new expiry, so each batch is a single UPDATE or
+    redis round trip. Needs one of the webapp.sessions engines. Returns the number of
+    sessions refreshed.
+    """
+    expire_date = timezone.now() + timedelta(seconds=settings.SESSION_COOKIE_AGE)
+    store = get_session_store()
+    return sum(store.touch(batch, expire_date) for batch in batches(session_keys))
+
+
+def update_last_logins(logins: Dict[int, datetime]):
+    """Save the users' ``last_login`` in bulk without loading them or sending signals.
+
+    Users deleted meanwhile are skipped.
+    """
+    user_model = get_user_model()
+    users = [
+        user_model(pk=user_id, last_login=last_login)
+        for user_id, last_login in logins.items()
+    ]
+    user_model.objects.bulk_update(users, ["last_login"], batch_size=BATCH_SIZE)
+
+
+def purge_expired_sessions(batch_size: int, time_budget: float) -> Tuple[int, float]:
+    """Delete expired database sessions until none are left or time runs out.
+
+    Sessions are deleted longest expired first, one short DELETE per batch, so no
+    lock is held for long and each batch is found by walking the ``expire_date``
+    index from where the last one stopped. Returns the number deleted and how many
+    seconds the oldest expired session left behind has been expired, 0 once caught
+    up.
+    """
+    store = get_session_store()
+    if not hasattr(store, "get_model_class"):
+        return 0, 0.0
+    model = store.get_model_class()
+    now = timezone.now()
+    expired = model.objects.filter(expire_date__lt=now)
+    deadline = time.monotonic() + time_budget
+    deleted = 0
+    last_date: Optional[datetime] = None
+    last_key = ""
+    while time.monotonic() < deadline:
+        batch = expired.order_by("expire_date", "pk")
+        if last_date is not None:
+            batch = batch.filter(
+                Q(expire_date__gt=last_date) | Q(expire_date=last_date, pk__gt=last_key)
+            )
+        rows = list(batch.values_list("expire_date", "pk")[:batch_size])
+        if rows:
+            deleted += expired.filter(pk__in=[key for _, key in rows]).delete()[0]
+            last_date, last_key = rows[-1]
+        if len(rows) < batch_size:
+            return deleted, 0.0
+    oldest = expired.order_by("expire_date").values_list("expire_date", flat=True)
+    oldest_date = oldest.first()
+    lag = (now - oldest_date).total_seconds() if oldest_date is not None else 0.0
+    return deleted, lag
@@ -0,0 +1,30 @@
+"""Database sessions which remember when they expire, see webapp.sessions."""
+from datetime import datetime
+from typing import List, Optional
+
+from django.contrib.sessions.backends import db
+from django.utils import timezone
+
+
+class SessionStore(db.SessionStore):
+    """Keep the expiry of the session row once it has been loaded."""
+
+    expire_date: Optional[datetime] = None
+
+    def _get_session_from_db(self):
+        """Load the session row and remember its expiry."""
+        session = super()._get_session_from_db()
+        if session is not None:
+            self.expire_date = session.expire_date
+        return session
+
+    @classmethod
+    def touch(cls, session_keys: List[str], expire_date: datetime) -> int:
+        """Move the expiry of the sessions that have not expired, return how many."""
+        return (
+            cls.get_model_class()
+            .objects.filter(
+                session_key__in=session_keys, expire_date__gt=timezone.now()
+            )
+            .update(expire_date=expire_date)
+        )
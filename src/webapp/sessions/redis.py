@@ -0,0 +1,216 @@
+"""Sessions kept in the redis cache named by ``settings.SESSION_CACHE_ALIAS``.
+
+Commands go straight to django-redis' connection pool, which every thread of a
+process shares. Loading a session reads its data and remaining lifetime in one
+pipelined round trip. Session data is stored as the serializer's bytes without the
+base64 and signature the database needs, compressed once it is larger than
+``COMPRESS_MIN_LENGTH`` bytes.
+
+Other caches fall back to the cache API so the engine also works without redis,
+for example in tests.
+"""
+import zlib
+from datetime import datetime, timedelta
+from typing import Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.contrib.sessions.backends.base import CreateError, SessionBase, UpdateError
+from django.core.cache import caches
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from django_redis import get_redis_connection
+
+KEY_PREFIX = "session:"
+COMPRESS_MIN_LENGTH = 512
+PLAIN = b"p"
+COMPRESSED = b"z"
+
+
+def get_cache():
+    """Return the cache sessions are kept in."""
+    return caches[settings.SESSION_CACHE_ALIAS]
+
+
+def session_cache_key(session_key: str) -> str:
+    """Return the cache key holding a session."""
+    return f"{KEY_PREFIX}{session_key}"
+
+
+def encode(session_dict: dict) -> bytes:
+    """Return the session data as stored in redis."""
+    data = import_string(settings.SESSION_SERIALIZER)().dumps(session_dict)
+    if len(data) < COMPRESS_MIN_LENGTH:
+        return PLAIN + data
+    return COMPRESSED + zlib.compress(data)
+
+
+def decode(data: bytes) -> dict:
+    """Return the session data stored in redis or an empty session if corrupt."""
+    serializer = import_string(settings.SESSION_SERIALIZER)()
+    try:
+        if data[:1] == COMPRESSED:
+            return serializer.loads(zlib.decompress(data[1:]))
+        return serializer.loads(data[1:])
+    except (ValueError, zlib.error):
+        return {}
+
+
+def read(session_key: str) -> Optional[Tuple[bytes, Optional[datetime]]]:
+    """Return a session's data and expiry or None if it does not exist."""
+    cache = get_cache()
+    key = session_cache_key(session_key)
+    try:
+        connection = get_redis_connection(settings.SESSION_CACHE_ALIAS)
+    except NotImplementedError:
+        return cache.get(key)
+    pipeline = connection.pipeline(transaction=False)
+    pipeline.get(cache.make_key(key))
+    pipeline.pttl(cache.make_key(key))
+    data, ttl = pipeline.execute()
+    if data is None:
+        return None
+    expire_date = timezone.now() + timedelta(milliseconds=ttl) if ttl >= 0 else None
+    return data, expire_date
+
+
+def write(
+    session_key: str,
+    data: bytes,
+    age: int,
+    only_new: bool = False,
+    only_existing: bool = False,
+) -> bool:
+    """Store a session for age seconds and return whether it was written.
+
+    With only_new it is only written if it does not exist yet, with only_existing
+    only if it does.
+    """
+    age = max(age, 1)
+    cache = get_cache()
+    key = session_cache_key(session_key)
+    try:
+        connection = get_redis_connection(settings.SESSION_CACHE_ALIAS)
+    except NotImplementedError:
+        value = (data, timezone.now() + timedelta(seconds=age))
+        if only_new:
+            return cache.add(key, value, age)
+        if only_existing and key not in cache:
+            return False
+        cache.set(key, value, age)
+        return True
+    return bool(
+        connection.set(cache.make_key(key), data, ex=age, nx=only_new, xx=only_existing)
+    )
+
+
+def write_many(sessions: Iterable[Tuple[str, bytes, int]]) -> int:
+    """Store sessions that do not exist yet in one round trip, return how many."""
+    cache = get_cache()
+    try:
+        connection = get_redis_connection(settings.SESSION_CACHE_ALIAS)
+    except NotImplementedError:
+        return sum(write(*session, only_new=True) for session in sessions)
+    pipeline = connection.pipeline(transaction=False)
+    for session_key, data, age in sessions:
+        key = cache.make_key(session_cache_key(session_key))
+        pipeline.set(key, data, ex=age, nx=True)
+    return sum(bool(result) for result in pipeline.execute())
+
+
+def exists(session_key: str) -> bool:
+    """Return whether a session exists."""
+    cache = get_cache()
+    key = session_cache_key(session_key)
+    try:
+        connection = get_redis_connection(settings.SESSION_CACHE_ALIAS)
+    except NotImplementedError:
+        return key in cache
+    return bool(connection.exists(cache.make_key(key)))
+
+
+def delete(session_key: str):
+    """Remove a session."""
+    get_cache().delete(session_cache_key(session_key))
+
+
+def expire(session_keys: List[str], expire_date: datetime) -> int:
+    """Move the expiry of the sessions that still exist, return how many."""
+    cache = get_cache()
+    try:
+        connection = get_redis_connection(settings.SESSION_CACHE_ALIAS)
+    except NotImplementedError:
+        touched = 0
+        for session_key in session_keys:
+            stored = read(session_key)
+            if stored is not None:
+                age = int((expire_date - timezone.now()).total_seconds())
+                touched += write(session_key, stored[0], age, only_existing=True)
+        return touched
+    pipeline = connection.pipeline(transaction=False)
+    for session_key in session_keys:
+        pipeline.expireat(cache.make_key(session_cache_key(session_key)), expire_date)
+    return sum(bool(result) for result in pipeline.execute())
+
+
+class SessionStore(SessionBase):
+    """Sessions kept in redis only, see webapp.sessions.redis_db for durability."""
+
+    expire_date: Optional[datetime] = None
+
+    def load(self):
+        """Load the session data and its expiry."""
+        stored = read(self.session_key) if self.session_key else None
+        if stored is None:
+            self._session_key = None
+            return {}
+        data, self.expire_date = stored
+        return decode(data)
+
+    def exists(self, session_key):
+        """Return whether a session exists."""
+        return bool(session_key) and exists(session_key)
+
+    def create(self):
+        """Save a new empty session under a new key."""
+        while True:
+            self._session_key = self._get_new_session_key()
+            try:
+                self.save(must_create=True)
+            except CreateError:
+                continue
+            self.modified = True
+            return
+
+    def save(self, must_create=False):
+        """Save the session, which must not exist yet with must_create."""
+        if self.session_key is None:
+            return self.create()
+        data = encode(self._get_session(no_load=must_create))
+        age = self.get_expiry_age()
+        written = write(
+            self.session_key,
+            data,
+            age,
+            only_new=must_create,
+            only_existing=not must_create,
+        )
+        if not written:
+            raise CreateError if must_create else UpdateError
+        return None
+
+    def delete(self, session_key=None):
+        """Remove the session."""
+        if session_key is None:
+            if self.session_key is None:
+                return
+            session_key = self.session_key
+        delete(session_key)
+
+    @classmethod
+    def clear_expired(cls):
+        """Do nothing as redis expires sessions itself."""
+
+    @classmethod
+    def touch(cls, session_keys: List[str], expire_date: datetime) -> int:
+        """Move the expiry of the sessions that still exist, return how many."""
+        return expire(session_keys, expire_date)
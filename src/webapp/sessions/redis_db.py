@@ -0,0 +1,52 @@
+"""Sessions kept in redis and written through to the database, like cached_db.
+
+Reads are answered by redis, see webapp.sessions.redis. A session missing there is
+loaded from the database and put back, so losing redis logs nobody out.
+"""
+from datetime import datetime
+from typing import List
+
+from webapp.sessions import db, redis
+
+
+class SessionStore(db.SessionStore):
+    """Read sessions from redis and write them to both."""
+
+    def load(self):
+        """Load the session from redis, or from the database and cache it."""
+        stored = redis.read(self.session_key) if self.session_key else None
+        if stored is not None:
+            data, self.expire_date = stored
+            return redis.decode(data)
+        session_dict = super().load()
+        if self.session_key and self.expire_date is not None:
+            age = self.get_expiry_age(expiry=self.expire_date)
+            redis.write(
+                self.session_key, redis.encode(session_dict), age, only_new=True
+            )
+        return session_dict
+
+    def exists(self, session_key):
+        """Return whether a session exists in either."""
+        return redis.exists(session_key) or super().exists(session_key)
+
+    def save(self, must_create=False):
+        """Save the session to the database and then redis."""
+        super().save(must_create)
+        data = redis.encode(self._get_session(no_load=must_create))
+        redis.write(self.session_key, data, self.get_expiry_age())
+
+    def delete(self, session_key=None):
+        """Remove the session from both."""
+        super().delete(session_key)
+        if session_key is None:
+            if self.session_key is None:
+                return
+            session_key = self.session_key
+        redis.delete(session_key)
+
+    @classmethod
+    def touch(cls, session_keys: List[str], expire_date: datetime) -> int:
+        """Move the expiry of the sessions in both, return how many were in the DB."""
+        redis.expire(session_keys, expire_date)
+        return super().touch(session_keys, expire_date)
@@ -1,7 +1,7 @@
 """Settings for your application."""
 from datetime import timedelta
 from pathlib import Path
-from typing import Any, Dict, List, Tuple, Type
+from typing import Any, Dict, List, Optional, Tuple, Type
 from urllib.parse import urlparse
 
 from environ import Env
@@ -16,6 +16,47 @@ default_databse_url = env.NOTSET
 scheme: Dict[str, Tuple[Type, Any]] = {
     "CELERY_BROKER_URL": (str, "redis://"),
     "AXES_META_PRECEDENCE_ORDER": (tuple, ("HTTP_X_FORWARDED_FOR", "X_FORWARDED_FOR")),
+    "AUTH_CACHE_URL": (str, "locmemcache://"),
+    "SESSION_ENGINE": (str, "webapp.sessions.db"),
+    "SESSION_CACHE_URL": (str, "locmemcache://sessions"),
+    "AUTH_TEST_CACHE_TIMEOUT": (int, 60),
+    "AUTH_TEST_LOCAL_CACHE_SIZE": (int, 10000),
+    "AUTH_TEST_LOCAL_CACHE_TIMEOUT": (int, 5),
+    "AUTH_TEST_NGINX_CACHE_TIMEOUT": (int, 0),
+    "AUTH_RULES_POLL_INTERVAL": (int, 2),
+    "AUTH_TOKEN_ENABLED": (bool, False),
+    "AUTH_TOKEN_MAX_AGE": (int, 60 * 60 * 12),
+    "AUTH_TOKEN_REFRESH_INTERVAL": (int, 5),
+    "AUTH_BASIC_ENABLED": (bool, False),
+    "AUTH_BASIC_CACHE_TIMEOUT": (int, 60),
+    "AUTH_HASH_WORKERS": (int, 1),
+    "AUTH_HASH_QUEUE_SIZE": (int, 1),
+    "AUTH_HASH_TIMEOUT": (float, 5.0),
+    "AUTH_PASSWORD_ITERATIONS": (int, 0),
+    "AUTH_LOCKOUT_LOCAL_TIMEOUT": (int, 60),
+    "AUTH_LOCKOUT_DIGEST_INTERVAL": (int, 300),
+    "AUTH_LOGIN_RATE_LIMIT_IP": (int, 30),
+    "AUTH_LOGIN_RATE_LIMIT_USERNAME": (int, 10),
+    "AUTH_LOGIN_RATE_WINDOW": (int, 60),
+    "AUTH_LOGIN_RATE_SYNC_EVERY": (int, 5),
+    "AUTH_SESSION_SLIDING": (bool, False),
+    "AUTH_SESSION_REFRESH_THRESHOLD": (int, 60 * 60 * 24 * 7),
+    "AUTH_LAST_LOGIN_BUFFERED": (bool, False),
+    "AUTH_SESSION_FLUSH_INTERVAL": (int, 30),
+    "AUTH_SESSION_PURGE_INTERVAL": (int, 300),
+    "AUTH_SESSION_PURGE_BATCH_SIZE": (int, 500),
+    "AUTH_SESSION_PURGE_TIME_BUDGET": (float, 10.0),
+    "AUTH_METRICS_ENABLED": (bool, False),
+    "AUTH_GATEWAY": (bool, False),
+    "DATABASE_CONN_MAX_AGE": (int, 0),
+    "AUTH_MEDIA_BACKEND": (str, "local"),
+    "AUTH_MEDIA_URL_EXPIRY": (int, 60),
+    "AUTH_DECISION_LOG": (str, ""),
+    "AUTH_DECISION_LOG_BUFFER_SIZE": (int, 10000),
+    "AUTH_DECISION_LOG_FLUSH_INTERVAL": (float, 0.5),
+    "AUTH_PROFILE_SAMPLE_EVERY": (int, 0),
+    "AUTH_PROFILE_SLOW_MS": (float, 0.0),
+    "AUTH_PROFILE_INTERVAL_MS": (float, 1.0),
 }
 
 if DEBUG:
@@ -33,6 +74,8 @@ if DEBUG:
             "CELERY_TASK_DEFAULT_QUEUE": (str, "celery"),
             "AXES_KEY_PREFIX": (str, "axes"),
             "AXES_REDIS_URL": (str, "rediscache://redis/1"),
+            "AUTH_CACHE_URL": (str, "rediscache://redis/2"),
+            "SESSION_CACHE_URL": (str, "rediscache://redis/3"),
             "SECRET_KEY": (str, "super_secret_secret_key"),
         },
     }
@@ -62,6 +105,9 @@ CELERY_BROKER_URL = env("CELERY_BROKER_URL")
 # celery instances data is namespaced on the shared broker (probably redis)
 CELERY_TASK_DEFAULT_QUEUE = env.str("CELERY_TASK_DEFAULT_QUEUE")
 DATABASES = {"default": env.db_url(default=default_databse_url)}
+# The seconds a thread keeps its database connection open between requests, see
+# conf/gunicorn/gunicorn.conf.py. 0 closes it after every request.
+DATABASES["default"]["CONN_MAX_AGE"] = env("DATABASE_CONN_MAX_AGE")
 
 # Storage
 DEFAULT_FILE_STORAGE = "webapp.storage.MediaS3"
@@ -90,6 +136,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # NOTE: This must come first so auth-test subrequests skip everything below.
+    "webapp.middleware.AuthTestMiddleware",
+    "webapp.middleware.LoginRateLimitMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "corsheaders.middleware.CorsMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -134,7 +183,28 @@ USE_TZ = True
 ANONYMOUS_USER_ID = -1
 AUTHENTICATION_BACKENDS = [
     "axes.backends.AxesBackend",
-    "django.contrib.auth.backends.ModelBackend",
+    "webapp.backends.HashPoolBackend",
+]
+# Password hashes run on at most AUTH_HASH_WORKERS threads per process, so a burst of
+# logins can not tie up every worker thread. Up to AUTH_HASH_QUEUE_SIZE more wait for
+# at most AUTH_HASH_TIMEOUT seconds, anything beyond that is asked to try again. Keep
+# the two together below the number of threads per worker (3, see
+# conf/gunicorn/gunicorn.conf.py) so some are always left for auth-test. Set
+# AUTH_HASH_WORKERS to 0 to hash on the request's thread.
+AUTH_HASH_WORKERS = env("AUTH_HASH_WORKERS")
+AUTH_HASH_QUEUE_SIZE = env("AUTH_HASH_QUEUE_SIZE")
+AUTH_HASH_TIMEOUT = env("AUTH_HASH_TIMEOUT")
+# The PBKDF2 iterations for new password hashes, 0 for Django's default. Run the
+# benchmark_hashers command on the production hosts for a recommendation. Outdated
+# hashes are rehashed in the background when their user logs in, the password waits
+# encrypted on the broker for at most AUTH_PASSWORD_REHASH_TTL seconds.
+AUTH_PASSWORD_ITERATIONS = env("AUTH_PASSWORD_ITERATIONS")
+AUTH_PASSWORD_REHASH_TTL = 60 * 60
+PASSWORD_HASHERS = [
+    "webapp.hashers.PBKDF2PasswordHasher",
+    "django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher",
+    "django.contrib.auth.hashers.Argon2PasswordHasher",
+    "django.contrib.auth.hashers.BCryptSHA256PasswordHasher",
 ]
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -164,7 +234,7 @@ STATIC_URL = "/assets/static/"
 
 # Celery
 CELERY_BROKER_TRANSPORT_OPTIONS = {"visibility_timeout": 3600}  # 1 hour.
-CELERY_RESULT_BACKEND = "django-db"
+CELERY_RESULT_BACKEND: Optional[str] = "django-db"
 CELERY_TIMEZONE = "UTC"
 CELERY_ENABLE_UTC = True
 CELERY_BEAT_SCHEDULER = "django_celery_beat.schedulers:DatabaseScheduler"
@@ -179,11 +249,23 @@ SERVER_EMAIL = f"no-reply@{url.hostname}"
 FRONTEND_URL = SITE_URL
 
 # Django-axes
-AXES_HANDLER = "axes.handlers.cache.AxesCacheHandler"
+AXES_HANDLER = "webapp.lockouts.LockoutFilterHandler"
 AXES_CACHE = "axes"
 AXES_ENABLE_ADMIN = False
 AXES_FAILURE_LIMIT = 10
 AXES_COOLOFF_TIME = timedelta(hours=1)
+# Each worker rejects clients it knows are locked out without asking the axes cache
+# for this many seconds, see webapp.lockouts. Resetting a lockout reaches every worker
+# through redis, otherwise this is how long the cache may be out of step.
+AUTH_LOCKOUT_LOCAL_TIMEOUT = env("AUTH_LOCKOUT_LOCAL_TIMEOUT")
+# Lockouts are queued and admins get one digest email every this many seconds.
+AUTH_LOCKOUT_DIGEST_INTERVAL = env("AUTH_LOCKOUT_DIGEST_INTERVAL")
+CELERY_BEAT_SCHEDULE = {
+    "email-admins-lockout-digest": {
+        "task": "webapp.tasks.email_admins_lockout_digest",
+        "schedule": AUTH_LOCKOUT_DIGEST_INTERVAL,
+    },
+}
 # NOTE: This value should be set in the env to use HTTP_X_FORWARDED_FOR in most
 # cases since most projects will be behind a reverse proxy.
 # WARNING: *DO NOT* put HTTP_X_FORWARDED_FOR in the variable if this project is
@@ -208,8 +290,141 @@ axes_cache_config["OPTIONS"][
 CACHES = {
     "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
     AXES_CACHE: axes_cache_config,
+    "auth": env.cache_url("AUTH_CACHE_URL"),
+    "sessions": env.cache_url("SESSION_CACHE_URL"),
 }
 
+# Auth test
+# NOTE: This should be a cache shared between all workers (probably redis) so that
+# logging out or changing a password is seen by every worker straight away.
+AUTH_TEST_CACHE = "auth"
+# The number of seconds a verified session is trusted without touching the session
+# store or the database. Set to 0 to check the session on every request.
+AUTH_TEST_CACHE_TIMEOUT = env("AUTH_TEST_CACHE_TIMEOUT")
+# Each worker also keeps up to AUTH_TEST_LOCAL_CACHE_SIZE verified sessions in memory
+# so a burst of requests costs one lookup in the shared cache. Other workers only see
+# a logout or password change once their copy expires, so keep the timeout short.
+# Set either to 0 to disable the in-process cache.
+AUTH_TEST_LOCAL_CACHE_SIZE = env("AUTH_TEST_LOCAL_CACHE_SIZE")
+AUTH_TEST_LOCAL_CACHE_TIMEOUT = env("AUTH_TEST_LOCAL_CACHE_TIMEOUT")
+# When set, a 204 carries X-Accel-Expires so nginx can cache it for this many seconds
+# (see conf/nginx/auth_test_cache.conf). nginx cannot purge an entry on logout, so
+# this is how long a logged out session can still get through.
+AUTH_TEST_NGINX_CACHE_TIMEOUT = env("AUTH_TEST_NGINX_CACHE_TIMEOUT")
+# Headers identifying the user on a 204, which nginx can pass on to the upstream app
+# (see conf/nginx/auth_identity.conf). Maps each header to "username", "groups" or
+# any other user field, for example {"X-Auth-User": "username"}. The values are
+# percent-encoded and cached with the user's groups and permissions.
+AUTH_TEST_IDENTITY_HEADERS: Dict[str, str] = {}
+
+# Login rate limits
+# The number of login attempts allowed per IP address and per username in any
+# AUTH_LOGIN_RATE_WINDOW seconds, more get a 429. Set a limit to 0 to disable it.
+# Each worker only syncs its counts with the auth cache every
+# AUTH_LOGIN_RATE_SYNC_EVERY attempts or second, so the limits are approximate.
+AUTH_LOGIN_RATE_LIMIT_IP = env("AUTH_LOGIN_RATE_LIMIT_IP")
+AUTH_LOGIN_RATE_LIMIT_USERNAME = env("AUTH_LOGIN_RATE_LIMIT_USERNAME")
+AUTH_LOGIN_RATE_WINDOW = env("AUTH_LOGIN_RATE_WINDOW")
+AUTH_LOGIN_RATE_SYNC_EVERY = env("AUTH_LOGIN_RATE_SYNC_EVERY")
+
+# Sessions
+# "webapp.sessions.db" keeps sessions in the database. "webapp.sessions.redis" keeps
+# them in the SESSION_CACHE_URL redis only and "webapp.sessions.redis_db" also writes
+# them through to the database, so losing redis logs nobody out. Run the
+# copy_sessions_to_redis command before switching so nobody is logged out.
+SESSION_ENGINE = env("SESSION_ENGINE")
+SESSION_CACHE_ALIAS = "sessions"
+# With sliding sessions, using a session with less than AUTH_SESSION_REFRESH_THRESHOLD
+# seconds left queues it to expire SESSION_COOKIE_AGE seconds from the next flush, see
+# webapp.sessions. The cookie then lasts until the browser closes so the session row
+# decides. Sessions are checked whenever auth-test misses the auth cache.
+AUTH_SESSION_SLIDING = env("AUTH_SESSION_SLIDING")
+AUTH_SESSION_REFRESH_THRESHOLD = env("AUTH_SESSION_REFRESH_THRESHOLD")
+SESSION_EXPIRE_AT_BROWSER_CLOSE = AUTH_SESSION_SLIDING
+# When enabled, logging in queues last_login instead of saving the user. Password
+# reset links stay valid until the next flush after a login.
+AUTH_LAST_LOGIN_BUFFERED = env("AUTH_LAST_LOGIN_BUFFERED")
+# How often queued session refreshes and last logins are saved, in seconds.
+AUTH_SESSION_FLUSH_INTERVAL = env("AUTH_SESSION_FLUSH_INTERVAL")
+CELERY_BEAT_SCHEDULE["flush-session-writes"] = {
+    "task": "webapp.tasks.flush_session_writes",
+    "schedule": AUTH_SESSION_FLUSH_INTERVAL,
+}
+# Every AUTH_SESSION_PURGE_INTERVAL seconds expired database sessions are deleted
+# AUTH_SESSION_PURGE_BATCH_SIZE at a time for at most AUTH_SESSION_PURGE_TIME_BUDGET
+# seconds, instead of one big DELETE from clearsessions. The task logs and returns
+# how far behind it is.
+AUTH_SESSION_PURGE_INTERVAL = env("AUTH_SESSION_PURGE_INTERVAL")
+AUTH_SESSION_PURGE_BATCH_SIZE = env("AUTH_SESSION_PURGE_BATCH_SIZE")
+AUTH_SESSION_PURGE_TIME_BUDGET = env("AUTH_SESSION_PURGE_TIME_BUDGET")
+CELERY_BEAT_SCHEDULE["purge-expired-sessions"] = {
+    "task": "webapp.tasks.purge_expired_sessions",
+    "schedule": AUTH_SESSION_PURGE_INTERVAL,
+}
+
+# Metrics
+# When enabled, /metrics serves Prometheus metrics for auth-test and logins, see
+# webapp.metrics. Scrape the workers directly, nginx should not proxy it. Set the
+# prometheus_multiproc_dir environment variable to count every worker.
+AUTH_METRICS_ENABLED = env("AUTH_METRICS_ENABLED")
+
+# Decision log
+# When set to "-" or a file path, every auth-test answer is written there as a line
+# of JSON, see webapp.decision_log. Records wait in a buffer of
+# AUTH_DECISION_LOG_BUFFER_SIZE and are written every AUTH_DECISION_LOG_FLUSH_INTERVAL
+# seconds by a background thread, the oldest are dropped if it falls behind.
+AUTH_DECISION_LOG = env("AUTH_DECISION_LOG")
+AUTH_DECISION_LOG_BUFFER_SIZE = env("AUTH_DECISION_LOG_BUFFER_SIZE")
+AUTH_DECISION_LOG_FLUSH_INTERVAL = env("AUTH_DECISION_LOG_FLUSH_INTERVAL")
+
+# Profiling
+# Every AUTH_PROFILE_SAMPLE_EVERY-th request has its stack sampled every
+# AUTH_PROFILE_INTERVAL_MS milliseconds and its queries timed. With
+# AUTH_PROFILE_SLOW_MS every request slower than that many milliseconds also has its
+# stack sampled from then on, see webapp.profiling.
+# Each worker writes collapsed stacks and a per phase summary to AUTH_PROFILE_DIR.
+# Leave both at 0 to serve the WSGI application unwrapped.
+AUTH_PROFILE_SAMPLE_EVERY = env("AUTH_PROFILE_SAMPLE_EVERY")
+AUTH_PROFILE_SLOW_MS = env("AUTH_PROFILE_SLOW_MS")
+AUTH_PROFILE_INTERVAL_MS = env("AUTH_PROFILE_INTERVAL_MS")
+AUTH_PROFILE_DIR = f"{project_root}/var/profiles"
+
+# Auth rules
+# Limit which users may access which URIs, see webapp.rules for the format. More
+# rules can be added in the admin. nginx must forward the URI in the X-Original-URI
+# header. Without any rules every logged in user may access everything.
+AUTH_RULES: List[Dict[str, Any]] = []
+# How often each worker checks whether the rules in the admin have changed.
+AUTH_RULES_POLL_INTERVAL = env("AUTH_RULES_POLL_INTERVAL")
+
+# Protected media
+# When set to "local" or "s3", /auth-media/ checks each download against the auth
+# rules (nginx forwards the public URI in X-Original-URI) and hands the transfer to
+# the matching internal nginx location, see webapp.media. "local" serves MEDIA_ROOT
+# from disk as nginx did before. "s3" presigns URLs valid for AUTH_MEDIA_URL_EXPIRY
+# seconds. Set it to "" to answer 404 instead.
+AUTH_MEDIA_BACKEND = env("AUTH_MEDIA_BACKEND")
+AUTH_MEDIA_URL_EXPIRY = env("AUTH_MEDIA_URL_EXPIRY")
+AUTH_MEDIA_LOCAL_LOCATION = "/protected-media/"
+AUTH_MEDIA_S3_LOCATION = "/protected-media-s3/"
+
+# Auth tokens
+# When enabled, logging in also issues a signed token cookie which auth-test accepts
+# without touching the session store. Revoking a user's tokens (logout, password or
+# is_active changes) reaches other workers within AUTH_TOKEN_REFRESH_INTERVAL seconds.
+AUTH_TOKEN_ENABLED = env("AUTH_TOKEN_ENABLED")
+AUTH_TOKEN_COOKIE_NAME = "authtoken"
+AUTH_TOKEN_MAX_AGE = env("AUTH_TOKEN_MAX_AGE")
+AUTH_TOKEN_REFRESH_INTERVAL = env("AUTH_TOKEN_REFRESH_INTERVAL")
+
+# Basic auth
+# When enabled, auth-test also accepts an `Authorization: Basic` header. Verified
+# credentials are cached for AUTH_BASIC_CACHE_TIMEOUT seconds under a keyed hash, so
+# only the first request in that window runs the password hasher. Changing the
+# password or a lockout drops them straight away.
+AUTH_BASIC_ENABLED = env("AUTH_BASIC_ENABLED")
+AUTH_BASIC_CACHE_TIMEOUT = env("AUTH_BASIC_CACHE_TIMEOUT")
+
 # DRF Core
 LOGIN_URL = "/backend/api/v1/login/"
 LOGIN_REDIRECT_URL = "/backend/api/v1/"
@@ -265,6 +480,30 @@ REST_AUTH_SERIALIZERS = {
     "TOKEN_SERIALIZER": "users.serializers.TokenSerializer",
 }
 
+# Auth gateway
+# Workers that only answer auth-test, login, logout and the admin can leave out the
+# apps nothing there uses, so they start faster and take less memory, see the
+# benchmark_startup command. Celery and beat load the same .env, so set it for
+# gunicorn alone, see conf/systemd/production_gunicorn.service, and run migrations,
+# celery and the API without it. Gateway workers still send tasks but never read
+# results.
+AUTH_GATEWAY = env("AUTH_GATEWAY")
+AUTH_GATEWAY_EXCLUDED_APPS = [
+    "django_extensions",
+    "django_celery_beat",
+    "django_celery_results",
+    "rest_framework",
+    "rest_framework.authtoken",
+    "dj_rest_auth",
+    "allauth",
+    "django_filters",
+]
+if AUTH_GATEWAY:
+    INSTALLED_APPS = [
+        app for app in INSTALLED_APPS if app not in AUTH_GATEWAY_EXCLUDED_APPS
+    ]
+    CELERY_RESULT_BACKEND = None
+
 if DEBUG:
     ALLOWED_HOSTS = ["*"]
     ADMINS = [("Nat Gordon", "nat@nattyg93.com")]
@@ -1,15 +1,182 @@
 """Project wide signals."""
 # pylint: disable=unused-argument
-from axes.helpers import get_client_cache_key, get_credentials
+from axes.helpers import get_credentials
 from axes.signals import user_locked_out
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group, update_last_login
+from django.contrib.auth.signals import (
+    user_logged_in,
+    user_logged_out,
+    user_login_failed,
+)
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
 from django.dispatch import receiver
+from django.utils import timezone
 
-from webapp import tasks
+from webapp import (
+    api_keys,
+    auth,
+    basic_auth,
+    lockouts,
+    metrics,
+    rules,
+    sessions,
+    tokens,
+)
+from webapp.models import APIKey, AuthRule
 
 
 @receiver(user_locked_out)
-def email_admins_on_user_locked_out(request, username, ip_address, **kwargs):
-    """Email admins on user locked out."""
-    tasks.email_admins_on_user_locked_out.apply_async(
-        [get_client_cache_key(request, get_credentials(username)), ip_address]
-    )
+def count_lockout_on_user_locked_out(**kwargs):
+    """Count the lockout."""
+    metrics.inc(metrics.LOGINS, "locked_out")
+
+
+@receiver(user_login_failed)
+def count_failure_on_user_login_failed(**kwargs):
+    """Count the failed login."""
+    metrics.inc(metrics.LOGINS, "failure")
+
+
+@receiver(user_logged_in)
+def count_success_on_user_logged_in(**kwargs):
+    """Count the login."""
+    metrics.inc(metrics.LOGINS, "success")
+
+
+@receiver(user_locked_out)
+def queue_lockout_on_user_locked_out(request, username, ip_address, **kwargs):
+    """Queue the lockout for the next digest email to admins."""
+    lockouts.record_lockout(username, ip_address)
+
+
+@receiver(user_locked_out)
+def remember_lockout_on_user_locked_out(request, username, **kwargs):
+    """Let every process reject the client without asking the axes cache."""
+    lockouts.remember_lockout(request, get_credentials(username))
+
+
+@receiver(user_locked_out)
+def forget_credentials_on_user_locked_out(username, **kwargs):
+    """Stop accepting cached Basic credentials for a user that is locked out."""
+    if not settings.AUTH_BASIC_ENABLED or not username:
+        return
+    user_model = get_user_model()
+    users = user_model.objects.filter(**{user_model.USERNAME_FIELD: username})
+    for user_id in users.values_list("pk", flat=True):
+        basic_auth.forget_credentials(user_id)
+
+
+# NOTE: django.contrib.auth connects update_last_login with this dispatch_uid. webapp
+# is installed first, so this receiver takes its place.
+@receiver(user_logged_in, dispatch_uid="update_last_login")
+def update_last_login_on_user_logged_in(sender, user, **kwargs):
+    """Queue the user's ``last_login`` for the next flush instead of saving it."""
+    if not settings.AUTH_LAST_LOGIN_BUFFERED:
+        update_last_login(sender, user, **kwargs)
+        return
+    user.last_login = timezone.now()
+    sessions.record_login(user.pk, user.last_login)
+
+
+@receiver(user_logged_out)
+def forget_session_on_user_logged_out(request, **kwargs):
+    """Stop trusting the cached session on logout."""
+    session_key = request.session.session_key
+    if session_key:
+        auth.forget_session(session_key)
+
+
+@receiver(user_logged_out)
+def revoke_tokens_on_user_logged_out(request, user, **kwargs):
+    """Revoke the user's auth tokens on logout."""
+    if settings.AUTH_TOKEN_ENABLED and user is not None:
+        tokens.revoke_tokens(user.pk)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def forget_sessions_on_user_saved(instance, created, update_fields, **kwargs):
+    """Stop trusting sessions, tokens and keys when a password or is_active may change.
+
+    Logging in only updates ``last_login`` so those saves are ignored.
+    """
+    if created or (update_fields is not None and set(update_fields) <= {"last_login"}):
+        return
+    auth.forget_user(instance.pk, instance.is_active)
+    auth.forget_access([instance.pk])
+    api_keys.forget_api_keys(instance.api_keys.values_list("prefix", flat=True))
+    if settings.AUTH_BASIC_ENABLED:
+        basic_auth.forget_credentials(instance.pk)
+    if settings.AUTH_TOKEN_ENABLED:
+        tokens.revoke_tokens(instance.pk)
+
+
+@receiver(pre_delete, sender=settings.AUTH_USER_MODEL)
+def revoke_tokens_on_user_deleted(instance, **kwargs):
+    """Revoke the user's auth tokens, leaving a tombstone for other processes."""
+    if settings.AUTH_TOKEN_ENABLED:
+        tokens.revoke_tokens(instance.pk)
+
+
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def forget_sessions_on_user_deleted(instance, **kwargs):
+    """Stop trusting the sessions and cached credentials of a deleted user."""
+    auth.forget_user(instance.pk, is_active=False)
+    auth.forget_access([instance.pk])
+    if settings.AUTH_BASIC_ENABLED:
+        basic_auth.forget_credentials(instance.pk)
+
+
+@receiver(m2m_changed, sender=get_user_model().groups.through)
+@receiver(m2m_changed, sender=get_user_model().user_permissions.through)
+def forget_access_on_user_changed(instance, action, reverse, pk_set, **kwargs):
+    """Forget what users may access when their groups or permissions change."""
+    if action not in ("post_add", "post_remove", "pre_clear"):
+        return
+    if not reverse:
+        auth.forget_access([instance.pk])
+    elif pk_set is not None:
+        auth.forget_access(pk_set)
+    else:
+        auth.forget_access(instance.user_set.values_list("pk", flat=True))
+
+
+@receiver(m2m_changed, sender=Group.permissions.through)
+def forget_access_on_group_changed(instance, action, reverse, pk_set, **kwargs):
+    """Forget what a group's users may access when its permissions change."""
+    if action not in ("post_add", "post_remove", "pre_clear"):
+        return
+    users = get_user_model().objects.all()
+    if not reverse:
+        users = users.filter(groups=instance)
+    elif pk_set is not None:
+        users = users.filter(groups__in=pk_set)
+    else:
+        users = users.filter(groups__permissions=instance)
+    auth.forget_access(users.values_list("pk", flat=True).distinct())
+
+
+@receiver(post_save, sender=Group)
+@receiver(pre_delete, sender=Group)
+def forget_access_on_group_saved(instance, **kwargs):
+    """Forget what a group's users may access when it is renamed or deleted."""
+    auth.forget_access(instance.user_set.values_list("pk", flat=True))
+    if instance.auth_rules.exists():
+        rules.bump_version()
+
+
+@receiver(post_save, sender=AuthRule)
+@receiver(post_delete, sender=AuthRule)
+@receiver(m2m_changed, sender=AuthRule.groups.through)
+@receiver(m2m_changed, sender=AuthRule.permissions.through)
+def bump_rules_version_on_rule_changed(**kwargs):
+    """Make every process recompile its rules."""
+    rules.bump_version()
+
+
+@receiver(post_save, sender=APIKey)
+@receiver(post_delete, sender=APIKey)
+def forget_api_key_on_api_key_changed(instance, **kwargs):
+    """Stop trusting a cached key when it changes or is deleted."""
+    api_keys.forget_api_keys([instance.prefix])
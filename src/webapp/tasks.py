@@ -1,29 +1,109 @@
 """Project wide tasks."""
-from axes.helpers import get_cache, get_cache_timeout
+import logging
+from importlib import import_module
+from typing import Any, Dict, Optional, Tuple
+
 from celery import shared_task
 from django.conf import settings
+from django.contrib.auth import HASH_SESSION_KEY, get_user_model
 from django.core.mail import mail_admins
+from django.db import transaction
 from django.template.loader import render_to_string
-from django.utils.timezone import now
+from django.utils.dateparse import parse_datetime
+
+from webapp import sessions
+from webapp.celery import app  # noqa pylint: disable=unused-import
+from webapp.hashers import decrypt_password
+from webapp.lockouts import drain_lockouts
+
+logger = logging.getLogger(__name__)
 
 
 @shared_task
-def email_admins_on_user_locked_out(cache_key, ip_address):
-    """Email admins on user locked out."""
-    cache = get_cache()
-    key = f"{cache_key}-notified"
-    lockout_email_sent = cache.get(key, False)
-    if not lockout_email_sent:
-        cache.set(key, True, get_cache_timeout())
-        context = {
-            "ip_address": ip_address,
-            "time": now(),
-            "project_name": settings.PROJECT_NAME,
-        }
-        mail_admins(
-            subject="A lockout has occured",
-            message=render_to_string("axes/lockout_admin_email.txt", context=context),
-            html_message=render_to_string(
-                "axes/lockout_admin_email.html", context=context
-            ),
+def email_admins_lockout_digest():
+    """Email admins one digest of the lockouts since the last one."""
+    events = drain_lockouts()
+    if not events:
+        return
+    clients: Dict[Tuple[str, Optional[str]], Dict[str, Any]] = {}
+    for event in events:
+        locked_at = parse_datetime(event["time"])
+        client = clients.setdefault(
+            (event["ip_address"], event["username"]),
+            {
+                "ip_address": event["ip_address"],
+                "username": event["username"],
+                "count": 0,
+                "first": locked_at,
+            },
         )
+        client["count"] += 1
+        client["last"] = locked_at
+    context = {
+        "clients": sorted(clients.values(), key=lambda client: -client["count"]),
+        "lockouts": len(events),
+        "project_name": settings.PROJECT_NAME,
+    }
+    mail_admins(
+        subject=f"Login attempts were blocked for {len(clients)} clients",
+        message=render_to_string("axes/lockout_digest_email.txt", context=context),
+        html_message=render_to_string(
+            "axes/lockout_digest_email.html", context=context
+        ),
+    )
+
+
+@shared_task(bind=True, max_retries=5, default_retry_delay=1)
+def rehash_password(
+    self,
+    user_id: int,
+    encrypted_password: str,
+    encoded: str,
+    session_key: Optional[str],
+):
+    """Rehash a password with the preferred hasher after its user logged in.
+
+    Nothing happens if the password changed meanwhile. Changing the hash changes the
+    session auth hash, so the session that logged in is updated to stay logged in.
+    The task is queued before the login response saves that session, so it retries
+    until the session holds an auth hash and gives up without rehashing otherwise.
+    Signals are skipped as the password itself is unchanged.
+    """
+    password = decrypt_password(encrypted_password)
+    if password is None:
+        return
+    users = get_user_model().objects.filter(pk=user_id, password=encoded)
+    user = users.first()
+    if user is None:
+        return
+    session = None
+    if session_key:
+        engine: Any = import_module(settings.SESSION_ENGINE)
+        session = engine.SessionStore(session_key)
+        if HASH_SESSION_KEY not in session:
+            if self.request.retries >= self.max_retries:
+                return
+            raise self.retry()
+    user.set_password(password)
+    with transaction.atomic():
+        if not users.update(password=user.password) or session is None:
+            return
+        session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+        session.save()
+
+
+@shared_task
+def flush_session_writes():
+    """Save the queued session expiry refreshes and last logins in bulk."""
+    sessions.touch_sessions(sessions.drain_touches())
+    sessions.update_last_logins(sessions.drain_logins())
+
+
+@shared_task
+def purge_expired_sessions() -> Dict[str, float]:
+    """Delete a time boxed share of the expired sessions and report the lag."""
+    deleted, lag = sessions.purge_expired_sessions(
+        settings.AUTH_SESSION_PURGE_BATCH_SIZE, settings.AUTH_SESSION_PURGE_TIME_BUDGET
+    )
+    logger.info("Purged %d expired sessions, %.0f seconds behind.", deleted, lag)
+    return {"deleted": deleted, "lag": lag}
@@ -0,0 +1,43 @@
+"""A stand-in for nginx caching auth-test decisions."""
+import time
+from typing import Dict, Tuple
+
+from django.conf import settings
+from django.test import Client
+from django.urls import reverse
+
+
+class AuthTestCache:
+    """Mimic conf/nginx/auth_test_cache.conf in front of a test client.
+
+    Decisions are cached per session and auth token cookie and URI, but only when
+    the response carries X-Accel-Expires. Requests without either cookie or with an
+    Authorization header bypass the cache.
+    """
+
+    def __init__(self, client: Client):
+        """Start with an empty cache."""
+        self.client = client
+        self.path = reverse("auth-test")
+        self.entries: Dict[str, Tuple[float, int]] = {}
+        self.upstream_requests = 0
+
+    def check(self, **extra) -> int:
+        """Return the status code nginx would act on."""
+        cookies = [
+            self.client.cookies.get(name)
+            for name in [settings.SESSION_COOKIE_NAME, settings.AUTH_TOKEN_COOKIE_NAME]
+        ]
+        values = [cookie.value if cookie is not None else "" for cookie in cookies]
+        key = ":".join([*values, extra.get("HTTP_X_ORIGINAL_URI", "")])
+        bypass = not any(values) or "HTTP_AUTHORIZATION" in extra
+        if not bypass:
+            expires, status_code = self.entries.get(key, (0.0, 0))
+            if expires > time.monotonic():
+                return status_code
+        self.upstream_requests += 1
+        response = self.client.get(self.path, **extra)
+        timeout = int(response.get("X-Accel-Expires", "0"))
+        if not bypass and timeout:
+            self.entries[key] = (time.monotonic() + timeout, response.status_code)
+        return response.status_code
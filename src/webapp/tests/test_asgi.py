@@ -0,0 +1,94 @@
+"""Ensure the ASGI entry point answers auth-test and forwards everything else."""
+import asyncio
+from typing import Any, Dict, List
+
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TransactionTestCase
+from django.urls import reverse
+
+from webapp import auth
+from webapp.asgi import application, get_environ
+
+
+def call(path: str, cookie: str = "") -> Dict[str, Any]:
+    """Send a GET through the ASGI application and return the response."""
+    scope = {
+        "type": "http",
+        "method": "GET",
+        "path": path,
+        "query_string": b"",
+        "headers": [(b"host", b"testserver"), (b"cookie", cookie.encode())],
+    }
+    messages: List[Dict[str, Any]] = []
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        messages.append(message)
+
+    asyncio.run(application(scope, receive, send))
+    return {**messages[0], "body": messages[1]["body"]}
+
+
+class GetEnvironTestCase(SimpleTestCase):
+    """Ensure ASGI scopes are translated to WSGI environs."""
+
+    def test_repeated_headers(self):
+        """Repeated headers are joined with commas and cookies with semicolons."""
+        scope = {
+            "type": "http",
+            "method": "GET",
+            "path": "/",
+            "headers": [
+                (b"accept", b"text/html"),
+                (b"accept", b"*/*"),
+                (b"cookie", b"a=1"),
+                (b"cookie", b"b=2"),
+            ],
+        }
+        environ = get_environ(scope, b"")
+        self.assertEqual(environ["HTTP_ACCEPT"], "text/html,*/*")
+        self.assertEqual(environ["HTTP_COOKIE"], "a=1; b=2")
+
+
+class ASGITestCase(TransactionTestCase):
+    """Ensure the ASGI application behaves like the WSGI one.
+
+    NOTE: Requests that reach the database run on another thread, so this can't be
+    a TestCase which keeps the data in an uncommitted transaction.
+    """
+
+    def setUp(self):
+        """Create and log in a user."""
+        auth.get_cache().clear()
+        auth.get_local_cache().clear()
+        user = get_user_model().objects.create_user(
+            "user", "user@example.com", "password"
+        )
+        self.client.force_login(user)
+        self.cookie = "; ".join(
+            f"{k}={v.value}" for k, v in self.client.cookies.items()
+        )
+
+    def test_anonymous(self):
+        """Requests without a session are rejected."""
+        self.assertEqual(call(reverse("auth-test"))["status"], 401)
+
+    def test_authenticated(self):
+        """Requests from a logged in user are accepted."""
+        self.assertEqual(call(reverse("auth-test"), self.cookie)["status"], 204)
+
+    def test_answered_on_event_loop(self):
+        """Cached sessions are answered without leaving the event loop."""
+        call(reverse("auth-test"), self.cookie)
+        with self.assertNumQueries(0):
+            self.assertEqual(call(reverse("auth-test"), self.cookie)["status"], 204)
+        self.assertEqual(auth.get_local_cache().stats()["hits"], 1)
+
+    def test_wsgi(self):
+        """Other requests are handled by the WSGI application."""
+        response = call(reverse("login"))
+        self.assertEqual(response["status"], 200)
+        self.assertIn(b"Set-Cookie", dict(response["headers"]))
+        self.assertIn(b"<form", response["body"])
@@ -0,0 +1,59 @@
+"""Ensure the benchmark suite runs and catches regressions."""
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+
+from webapp.benchmark import compare, summarise
+from webapp.management.commands.benchmark_startup import start_worker
+from webapp.management.commands.benchmark_suite import run_suite
+
+RESULT = {"p99_ms": 10.0, "requests_per_second": 100.0, "queries_per_request": 1.0}
+
+
+class BenchmarkTestCase(TransactionTestCase):
+    """Ensure the suite measures every scenario and compares results.
+
+    NOTE: Requests are sent from other threads, so this can't be a TestCase which
+    keeps the data in an uncommitted transaction.
+    """
+
+    @override_settings(
+        PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"]
+    )
+    def test_run_suite(self):
+        """Every scenario is timed and its queries counted."""
+        results = run_suite(requests=3, concurrency=1, warmup=1)
+        self.assertEqual(
+            list(results), ["auth-test 204", "auth-test 401", "login", "logout"]
+        )
+        self.assertEqual(results["auth-test 401"]["queries_per_request"], 0)
+        self.assertGreater(results["login"]["queries_per_request"], 0)
+
+    def test_summarise(self):
+        """Percentiles come from the sorted samples."""
+        summary = summarise([i / 1000 for i in range(100, 0, -1)], 1.0)
+        self.assertAlmostEqual(summary["p50_ms"], 51)
+        self.assertAlmostEqual(summary["p99_ms"], 99)
+        self.assertEqual(summary["requests_per_second"], 100)
+
+    def test_compare(self):
+        """Only changes beyond the threshold and extra queries are regressions."""
+        baseline = {"login": RESULT, "gone": RESULT}
+        self.assertEqual(compare(baseline, {"login": RESULT, "new": RESULT}, 10), [])
+        slower = {**RESULT, "p99_ms": 10.5, "requests_per_second": 95.0}
+        self.assertEqual(compare(baseline, {"login": slower}, 10), [])
+        regressed = {
+            "p99_ms": 12.0,
+            "requests_per_second": 80.0,
+            "queries_per_request": 2,
+        }
+        self.assertEqual(len(compare(baseline, {"login": regressed}, 10)), 3)
+
+
+class StartupTestCase(SimpleTestCase):
+    """Ensure gateway workers start lighter."""
+
+    def test_gateway(self):
+        """A gateway worker answers auth-test having imported fewer modules."""
+        full = start_worker("false")
+        gateway = start_worker("true")
+        self.assertLess(gateway["modules"], full["modules"])
+        self.assertGreater(gateway["ready_ms"], 0)
@@ -0,0 +1,83 @@
+"""Ensure auth-test decisions are logged as newline-delimited JSON."""
+import json
+import os
+import tempfile
+from typing import Any, Dict, List
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from webapp import auth, decision_log
+
+
+class DecisionLogTestCase(TestCase):
+    """Ensure each answer is logged with its reason."""
+
+    def setUp(self):
+        """Log to a file only the tests flush and start with empty caches."""
+        self.path = os.path.join(tempfile.mkdtemp(), "decisions.log")
+        settings_override = override_settings(
+            AUTH_DECISION_LOG=self.path, AUTH_DECISION_LOG_FLUSH_INTERVAL=60
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        decision_log.get_decision_log.cache_clear()
+        self.addCleanup(decision_log.get_decision_log.cache_clear)
+        auth.get_cache().clear()
+        auth.get_local_cache().clear()
+        self.user = get_user_model().objects.create_user(
+            "user", "user@example.com", "password"
+        )
+
+    def read(self) -> List[Dict[str, Any]]:
+        """Flush the log and return its records."""
+        decisions = decision_log.get_decision_log()
+        assert decisions is not None
+        decisions.flush()
+        with open(self.path) as log:
+            return [json.loads(line) for line in log]
+
+    def test_decisions(self):
+        """Answers are logged with the user, reason and session lookup."""
+        self.client.get(reverse("auth-test"), HTTP_X_ORIGINAL_URI="/private/")
+        self.client.force_login(self.user)
+        self.client.get(reverse("auth-test"), HTTP_X_ORIGINAL_URI="/private/")
+        self.client.get(reverse("auth-test"))
+        anonymous, database, local = self.read()
+        self.assertEqual(anonymous["status"], 401)
+        self.assertEqual(anonymous["reason"], "anonymous")
+        self.assertEqual(anonymous["credential"], "none")
+        self.assertIsNone(anonymous["user_id"])
+        self.assertEqual(anonymous["uri"], "/private/")
+        self.assertEqual(database["status"], 204)
+        self.assertEqual(database["reason"], "allowed")
+        self.assertEqual(database["credential"], "session")
+        self.assertEqual(database["user_id"], self.user.pk)
+        self.assertEqual(database["session_lookup"], "database")
+        self.assertGreaterEqual(database["ms"], 0)
+        self.assertEqual(local["session_lookup"], "local")
+
+    def test_invalid_session(self):
+        """An unknown session is logged as invalid."""
+        self.client.cookies["sessionid"] = "unknown"
+        self.client.get(reverse("auth-test"))
+        (record,) = self.read()
+        self.assertEqual(record["reason"], "invalid")
+        self.assertEqual(record["credential"], "session")
+
+    @override_settings(AUTH_DECISION_LOG_BUFFER_SIZE=2)
+    def test_dropped(self):
+        """The oldest records are dropped when the buffer is full."""
+        for _ in range(3):
+            self.client.get(reverse("auth-test"))
+        *records, dropped = self.read()
+        self.assertEqual(len(records), 2)
+        self.assertEqual(dropped["dropped"], 1)
+
+    @override_settings(AUTH_DECISION_LOG="")
+    def test_disabled(self):
+        """Nothing is recorded unless enabled."""
+        self.client.get(reverse("auth-test"))
+        self.assertIsNone(decision_log.get_decision_log())
+        self.assertFalse(os.path.exists(self.path))
@@ -0,0 +1,87 @@
+"""Ensure password hashing is bounded and turns away what it can not handle."""
+import threading
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+
+from webapp import hash_pool
+from webapp.forms import LoginForm
+from webapp.hash_pool import HashPool, PoolFull
+
+
+class HashPoolTestCase(SimpleTestCase):
+    """Ensure HashPool applies admission control."""
+
+    def block(self, pool: HashPool) -> threading.Event:
+        """Occupy the pool's only worker until the returned event is set."""
+        started = threading.Event()
+        release = threading.Event()
+
+        def hold():
+            started.set()
+            release.wait()
+
+        threading.Thread(target=pool.run, args=[hold]).start()
+        started.wait()
+        self.addCleanup(release.set)
+        return release
+
+    def test_run(self):
+        """Functions run on the pool and return their result."""
+        pool = HashPool(2, 2, 1)
+        self.assertNotEqual(pool.run(threading.get_ident), threading.get_ident())
+        self.assertEqual(pool.stats()["completed"], 1)
+
+    def test_inline(self):
+        """Without workers functions run on the calling thread."""
+        pool = HashPool(0, 0, 1)
+        self.assertEqual(pool.run(threading.get_ident), threading.get_ident())
+
+    def test_full(self):
+        """Work beyond the workers and queue is rejected straight away."""
+        pool = HashPool(1, 0, 1)
+        self.block(pool)
+        with self.assertRaises(PoolFull):
+            pool.run(abs, 1)
+        self.assertEqual(pool.stats()["rejected"], 1)
+        self.assertEqual(pool.stats()["running"], 1)
+
+    def test_timeout(self):
+        """Queued work that does not start in time is cancelled."""
+        pool = HashPool(1, 1, 0.01)
+        release = self.block(pool)
+        with self.assertRaises(PoolFull):
+            pool.run(abs, 1)
+        self.assertEqual(pool.stats()["queued"], 0)
+        release.set()
+        self.assertEqual(pool.run(abs, -1), 1)
+
+
+class LoginTestCase(TestCase):
+    """Ensure logging in hashes on the pool."""
+
+    def setUp(self):
+        """Create a user and start with a fresh pool."""
+        hash_pool.get_hash_pool.cache_clear()
+        self.addCleanup(hash_pool.get_hash_pool.cache_clear)
+        get_user_model().objects.create_user("user", "user@example.com", "password")
+
+    def login(self):
+        """Post the login form."""
+        return self.client.post(
+            reverse("login"), {"username": "user", "password": "password"}
+        )
+
+    def test_login(self):
+        """Correct credentials log the user in."""
+        self.assertEqual(self.login().status_code, 302)
+        self.assertEqual(hash_pool.get_hash_pool().stats()["completed"], 1)
+
+    def test_busy(self):
+        """The user is asked to try again when the pool is full."""
+        with mock.patch.object(HashPool, "run", side_effect=PoolFull):
+            response = self.login()
+        self.assertEqual(response.status_code, 200)
+        self.assertFormError(response, "form", None, LoginForm.error_messages["busy"])
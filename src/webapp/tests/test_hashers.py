@@ -0,0 +1,102 @@
+"""Ensure passwords are hashed with the configured cost and rehashed after login."""
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from webapp import auth, tasks
+from webapp.hashers import decrypt_password, encrypt_password, needs_rehash
+
+
+@override_settings(AUTH_PASSWORD_ITERATIONS=1000)
+class HasherTestCase(SimpleTestCase):
+    """Ensure the preferred hasher follows AUTH_PASSWORD_ITERATIONS."""
+
+    def test_iterations(self):
+        """New hashes use the configured iterations."""
+        self.assertTrue(make_password("password").startswith("pbkdf2_sha256$1000$"))
+
+    def test_needs_rehash(self):
+        """Hashes with other iterations or hashers need rehashing."""
+        encoded = make_password("password")
+        self.assertFalse(needs_rehash(encoded))
+        with override_settings(AUTH_PASSWORD_ITERATIONS=2000):
+            self.assertTrue(needs_rehash(encoded))
+            self.assertFalse(needs_rehash(make_password("password")))
+        self.assertTrue(needs_rehash(make_password("password", hasher="pbkdf2_sha1")))
+        self.assertFalse(needs_rehash(make_password(None)))
+
+    def test_encrypt(self):
+        """Encrypted passwords can only be decrypted until they expire."""
+        encrypted = encrypt_password("password")
+        self.assertNotIn("password", encrypted)
+        self.assertEqual(decrypt_password(encrypted), "password")
+        with mock.patch("cryptography.fernet.time.time", return_value=2 ** 40):
+            self.assertIsNone(decrypt_password(encrypted))
+        self.assertIsNone(decrypt_password("tampered"))
+
+    def test_benchmark(self):
+        """The benchmark recommends iterations for the target."""
+        stdout = StringIO()
+        call_command("benchmark_hashers", rounds=1, stdout=stdout)
+        self.assertRegex(stdout.getvalue(), r"pbkdf2_sha256 +iterations +1000 ")
+
+
+@override_settings(AUTH_PASSWORD_ITERATIONS=1000)
+class RehashTestCase(TestCase):
+    """Ensure outdated hashes are rehashed in the background after logging in."""
+
+    def setUp(self):
+        """Create a user with an outdated hash."""
+        auth.get_cache().clear()
+        auth.get_local_cache().clear()
+        self.user = get_user_model().objects.create_user(
+            "user", "user@example.com", "password"
+        )
+
+    @override_settings(AUTH_PASSWORD_ITERATIONS=2000)
+    @mock.patch("webapp.tasks.rehash_password.apply_async")
+    def test_rehash(self, apply_async):
+        """The hash is upgraded without logging the user out."""
+        self.client.post(reverse("login"), {"username": "user", "password": "password"})
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith("pbkdf2_sha256$1000$"))
+        tasks.rehash_password(*apply_async.call_args[0][0])
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith("pbkdf2_sha256$2000$"))
+        self.assertTrue(self.user.check_password("password"))
+        self.assertEqual(self.client.get(reverse("auth-test")).status_code, 204)
+
+    @override_settings(AUTH_PASSWORD_ITERATIONS=2000)
+    @mock.patch("webapp.tasks.rehash_password.apply_async")
+    def test_before_session_saved(self, apply_async):
+        """A task run before the login saves its session waits for it."""
+        apply_async.side_effect = lambda args: tasks.rehash_password.apply(args)
+        self.client.post(reverse("login"), {"username": "user", "password": "password"})
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith("pbkdf2_sha256$1000$"))
+        self.assertEqual(self.client.get(reverse("auth-test")).status_code, 204)
+        tasks.rehash_password(*apply_async.call_args[0][0])
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith("pbkdf2_sha256$2000$"))
+        self.assertEqual(self.client.get(reverse("auth-test")).status_code, 204)
+
+    @mock.patch("webapp.tasks.rehash_password.apply_async")
+    def test_current(self, apply_async):
+        """Current hashes are left alone."""
+        self.client.post(reverse("login"), {"username": "user", "password": "password"})
+        self.assertFalse(apply_async.called)
+
+    @override_settings(AUTH_PASSWORD_ITERATIONS=2000)
+    def test_changed_meanwhile(self):
+        """Passwords changed before the task runs are left alone."""
+        encoded = self.user.password
+        self.user.set_password("new-password")
+        self.user.save()
+        tasks.rehash_password(self.user.pk, encrypt_password("password"), encoded, None)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.check_password("new-password"))
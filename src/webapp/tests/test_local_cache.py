@@ -0,0 +1,62 @@
+"""Ensure the in-process cache expires, evicts and counts correctly."""
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from webapp.local_cache import LocalCache
+
+
+class LocalCacheTestCase(SimpleTestCase):
+    """Ensure LocalCache behaves like a bounded LRU cache with a timeout."""
+
+    def test_get_set(self):
+        """Values can be stored and retrieved."""
+        cache = LocalCache(10, 60)
+        cache.set("key", "value")
+        self.assertEqual(cache.get("key"), "value")
+        self.assertIsNone(cache.get("missing"))
+
+    def test_expiry(self):
+        """Values expire after the timeout."""
+        cache = LocalCache(10, 60)
+        with mock.patch("webapp.local_cache.time.monotonic", return_value=0):
+            cache.set("key", "value")
+        with mock.patch("webapp.local_cache.time.monotonic", return_value=61):
+            self.assertIsNone(cache.get("key"))
+        self.assertEqual(cache.stats()["size"], 0)
+
+    def test_eviction(self):
+        """The least recently used value is evicted when full."""
+        cache = LocalCache(2, 60)
+        cache.set("first", 1)
+        cache.set("second", 2)
+        cache.get("first")
+        cache.set("third", 3)
+        self.assertEqual(cache.get("first"), 1)
+        self.assertIsNone(cache.get("second"))
+        self.assertEqual(cache.get("third"), 3)
+
+    def test_disabled(self):
+        """Nothing is stored when the size or timeout is 0."""
+        for cache in [LocalCache(0, 60), LocalCache(10, 0)]:
+            cache.set("key", "value")
+            self.assertIsNone(cache.get("key"))
+
+    def test_delete_matching(self):
+        """Values can be removed by a predicate."""
+        cache = LocalCache(10, 60)
+        cache.set("one", 1)
+        cache.set("two", 2)
+        self.assertEqual(cache.delete_matching(lambda value: value == 1), ["one"])
+        self.assertIsNone(cache.get("one"))
+        self.assertEqual(cache.get("two"), 2)
+
+    def test_stats(self):
+        """Hits and misses are counted."""
+        cache = LocalCache(10, 60)
+        cache.set("key", "value")
+        cache.get("key")
+        cache.get("missing")
+        self.assertEqual(
+            cache.stats(), {"size": 1, "hits": 1, "misses": 1, "hit_ratio": 0.5}
+        )
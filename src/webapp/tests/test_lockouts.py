@@ -0,0 +1,127 @@
+"""Ensure locked out clients are rejected without asking the axes cache."""
+from unittest import mock
+
+from axes.handlers.proxy import AxesProxyHandler
+from axes.helpers import get_client_cache_key
+from axes.models import AccessAttempt
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.core.cache import caches
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from webapp import lockouts, tasks
+
+
+@override_settings(AUTH_LOGIN_RATE_LIMIT_IP=0, AUTH_LOGIN_RATE_LIMIT_USERNAME=0)
+class LockoutFilterTestCase(TestCase):
+    """Ensure the lockout filter short-circuits the axes cache."""
+
+    def setUp(self):
+        """Create a user and start with empty caches."""
+        caches[settings.AXES_CACHE].clear()
+        self.addCleanup(caches[settings.AXES_CACHE].clear)
+        lockouts.get_lockout_filter.cache_clear()
+        self.addCleanup(lockouts.get_lockout_filter.cache_clear)
+        get_user_model().objects.create_user("user", "user@example.com", "password")
+
+    def login(self, password: str) -> int:
+        """Post the login form and return the status code."""
+        data = {"username": "user", "password": password}
+        return self.client.post(reverse("login"), data).status_code
+
+    def lock_out(self):
+        """Fail to log in until locked out."""
+        for _ in range(settings.AXES_FAILURE_LIMIT):
+            self.login("wrong")
+
+    def test_locked_out(self):
+        """Known locked out clients do not touch the axes cache."""
+        self.lock_out()
+        handler = AxesProxyHandler.get_implementation()
+        with mock.patch.object(handler, "cache") as cache:
+            self.assertEqual(self.login("password"), 200)
+        self.assertFalse(cache.method_calls)
+
+    def test_cache_authoritative(self):
+        """Clients this process has not seen locked out are looked up."""
+        self.lock_out()
+        lockouts.get_lockout_filter().locked.clear()
+        self.assertEqual(self.login("password"), 200)
+        self.assertTrue(lockouts.get_lockout_filter().locked.stats()["size"])
+
+    @override_settings(AXES_ONLY_USER_FAILURES=True)
+    def test_locked_out_username(self):
+        """Lockouts by username are published under the username's key."""
+        lockout_filter = lockouts.get_lockout_filter()
+        with mock.patch.object(lockout_filter, "publish") as publish:
+            self.lock_out()
+        attempt = AccessAttempt(username="user", ip_address="127.0.0.1")
+        keys = get_client_cache_key(attempt)
+        publish.assert_any_call({"locked": keys})
+
+    def test_reset(self):
+        """Resetting a lockout forgets it straight away."""
+        self.lock_out()
+        count = AxesProxyHandler.reset_attempts(ip_address="127.0.0.1")
+        self.assertEqual(count, settings.AXES_FAILURE_LIMIT)
+        self.assertEqual(self.login("password"), 302)
+
+    def test_receive(self):
+        """Lockouts published by other processes are applied."""
+        lockout_filter = lockouts.get_lockout_filter()
+        lockout_filter.receive({"locked": ["key"]})
+        self.assertTrue(lockout_filter.is_locked(["other", "key"]))
+        lockout_filter.receive({"reset": ["key"]})
+        self.assertFalse(lockout_filter.is_locked(["key"]))
+
+
+@override_settings(
+    ADMINS=[("Admin", "admin@example.com")],
+    AUTH_LOGIN_RATE_LIMIT_IP=0,
+    AUTH_LOGIN_RATE_LIMIT_USERNAME=0,
+)
+class LockoutDigestTestCase(TestCase):
+    """Ensure lockouts are emailed to admins in one digest."""
+
+    def setUp(self):
+        """Start and end without any queued or known lockouts."""
+        caches[settings.AXES_CACHE].clear()
+        self.addCleanup(caches[settings.AXES_CACHE].clear)
+        lockouts.get_lockout_filter.cache_clear()
+        self.addCleanup(lockouts.get_lockout_filter.cache_clear)
+
+    def test_digest(self):
+        """Lockouts are grouped by client into one email."""
+        for _ in range(3):
+            lockouts.record_lockout("user", "10.0.0.1")
+        lockouts.record_lockout(None, "10.0.0.2")
+        tasks.email_admins_lockout_digest()
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertIn("2 clients", mail.outbox[0].subject)
+        self.assertIn("10.0.0.1 (user): 3", mail.outbox[0].body)
+        self.assertIn("10.0.0.2 (-): 1", mail.outbox[0].body)
+        self.assertEqual(lockouts.drain_lockouts(), [])
+
+    def test_empty(self):
+        """Nothing is sent without lockouts."""
+        tasks.email_admins_lockout_digest()
+        self.assertEqual(len(mail.outbox), 0)
+
+    def test_escaped(self):
+        """Usernames are escaped in the HTML email."""
+        lockouts.record_lockout("<b>user</b>", "10.0.0.1")
+        tasks.email_admins_lockout_digest()
+        html = mail.outbox[0].alternatives[0][0]
+        self.assertIn("&lt;b&gt;user&lt;/b&gt;", html)
+
+    def test_queued_on_lockout(self):
+        """Locking a client out queues it for the digest."""
+        get_user_model().objects.create_user("user", "user@example.com", "password")
+        data = {"username": "user", "password": "wrong"}
+        for _ in range(settings.AXES_FAILURE_LIMIT):
+            self.client.post(reverse("login"), data)
+        events = lockouts.drain_lockouts()
+        self.assertEqual(len(events), 1)
+        self.assertEqual(events[0]["username"], "user")
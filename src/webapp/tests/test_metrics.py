@@ -0,0 +1,111 @@
+"""Ensure auth-test and logins are counted and served to Prometheus."""
+import threading
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from prometheus_client import REGISTRY
+
+from webapp import auth, metrics
+
+
+def get_value(name: str, **labels) -> float:
+    """Return the current value of a sample after flushing this thread's samples."""
+    metrics.flush()
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+@override_settings(AUTH_METRICS_ENABLED=True)
+class MetricsTestCase(TestCase):
+    """Ensure the metrics follow the requests."""
+
+    def setUp(self):
+        """Create a user and start with empty caches."""
+        auth.get_cache().clear()
+        auth.get_local_cache().clear()
+        self.user = get_user_model().objects.create_user(
+            "user", "user@example.com", "password"
+        )
+
+    def test_decisions(self):
+        """auth-test answers are counted and timed."""
+        allowed = get_value("auth_test_decisions_total", status="204")
+        denied = get_value("auth_test_decisions_total", status="401")
+        timed = get_value("auth_test_seconds_count")
+        self.client.get(reverse("auth-test"))
+        self.client.force_login(self.user)
+        self.client.get(reverse("auth-test"))
+        self.client.get(reverse("auth-test"))
+        self.assertEqual(
+            get_value("auth_test_decisions_total", status="204"), allowed + 2
+        )
+        self.assertEqual(
+            get_value("auth_test_decisions_total", status="401"), denied + 1
+        )
+        self.assertEqual(get_value("auth_test_seconds_count"), timed + 3)
+
+    def test_session_lookups(self):
+        """Sessions are counted by where they were found."""
+        local = get_value("auth_test_session_lookups_total", source="local")
+        database = get_value("auth_test_session_lookups_total", source="database")
+        self.client.force_login(self.user)
+        self.client.get(reverse("auth-test"))
+        self.client.get(reverse("auth-test"))
+        self.assertEqual(
+            get_value("auth_test_session_lookups_total", source="database"),
+            database + 1,
+        )
+        self.assertEqual(
+            get_value("auth_test_session_lookups_total", source="local"), local + 1
+        )
+
+    @override_settings(AUTH_LOGIN_RATE_LIMIT_IP=0, AUTH_LOGIN_RATE_LIMIT_USERNAME=0)
+    def test_logins(self):
+        """Logins are counted by result and timed."""
+        success = get_value("auth_logins_total", result="success")
+        failure = get_value("auth_logins_total", result="failure")
+        timed = get_value("auth_login_seconds_count")
+        url = reverse("login")
+        self.client.post(url, {"username": "user", "password": "wrong"})
+        self.client.post(url, {"username": "user", "password": "password"})
+        self.assertEqual(get_value("auth_logins_total", result="success"), success + 1)
+        self.assertEqual(get_value("auth_logins_total", result="failure"), failure + 1)
+        self.assertEqual(get_value("auth_login_seconds_count"), timed + 2)
+
+    def test_buckets(self):
+        """Buffered observations land in the same buckets as observed ones."""
+        before = get_value("auth_test_seconds_bucket", le="0.001")
+        metrics.observe(metrics.AUTH_TEST_SECONDS, 0.001)
+        metrics.observe(metrics.AUTH_TEST_SECONDS, 0.0011)
+        self.assertEqual(get_value("auth_test_seconds_bucket", le="0.001"), before + 1)
+
+    def test_idle_thread(self):
+        """Samples of threads that record nothing more are still flushed."""
+        before = get_value("auth_logins_total", result="idle")
+        thread = threading.Thread(
+            target=metrics.inc, args=[metrics.LOGINS, "idle"], daemon=True
+        )
+        thread.start()
+        thread.join()
+        self.assertEqual(get_value("auth_logins_total", result="idle"), before + 1)
+        self.assertNotIn(thread, [buffer.thread for buffer in metrics.every_buffer])
+
+    def test_unbuffered(self):
+        """Observations go straight to the histogram without its internals."""
+        before = REGISTRY.get_sample_value("auth_test_seconds_count")
+        with mock.patch.object(metrics, "BUFFER_OBSERVATIONS", False):
+            metrics.observe(metrics.AUTH_TEST_SECONDS, 0.001)
+        after = REGISTRY.get_sample_value("auth_test_seconds_count")
+        self.assertEqual(after, before + 1)
+
+    def test_view(self):
+        """The metrics are served in the Prometheus text format."""
+        response = self.client.get(reverse("metrics"))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b"auth_test_decisions_total", response.content)
+
+    @override_settings(AUTH_METRICS_ENABLED=False)
+    def test_disabled(self):
+        """Nothing is served unless enabled."""
+        self.assertEqual(self.client.get(reverse("metrics")).status_code, 404)
@@ -0,0 +1,117 @@
+"""Ensure sampled requests are profiled and written out as collapsed stacks."""
+import json
+import os
+import tempfile
+import threading
+import time
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, override_settings
+
+from webapp import profiling
+
+
+def fast_app(_environ, start_response):
+    """Answer straight away."""
+    start_response("204 No Content", [])
+    return [b""]
+
+
+def slow_app(_environ, start_response):
+    """Answer after a query and a while."""
+    get_user_model().objects.count()
+    time.sleep(0.05)
+    start_response("204 No Content", [])
+    return [b""]
+
+
+def call(application, path: str = "/auth-test/"):
+    """Send one request to a WSGI application."""
+    return application({"PATH_INFO": path}, lambda status, headers: None)
+
+
+class ProfilingTestCase(TestCase):
+    """Ensure the right requests are profiled."""
+
+    def setUp(self):
+        """Start with a fresh profiler writing to a temporary directory."""
+        self.directory = tempfile.mkdtemp()
+        settings_override = override_settings(AUTH_PROFILE_DIR=self.directory)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        profiling.get_profiler.cache_clear()
+        self.addCleanup(profiling.get_profiler.cache_clear)
+
+    @override_settings(AUTH_PROFILE_SAMPLE_EVERY=0, AUTH_PROFILE_SLOW_MS=0)
+    def test_disabled(self):
+        """The application is served unwrapped when profiling is off."""
+        self.assertIs(profiling.wrap(fast_app), fast_app)
+
+    @override_settings(AUTH_PROFILE_SAMPLE_EVERY=2, AUTH_PROFILE_SLOW_MS=0)
+    def test_sample_every(self):
+        """Every Nth request is profiled."""
+        application = profiling.wrap(fast_app)
+        for _ in range(4):
+            call(application)
+        summary = profiling.get_profiler().summary()
+        self.assertEqual(summary["/auth-test"]["requests"], 2)
+
+    @override_settings(AUTH_PROFILE_SAMPLE_EVERY=0, AUTH_PROFILE_SLOW_MS=20)
+    def test_slow(self):
+        """Slow requests are profiled with their stacks and queries."""
+        call(profiling.wrap(fast_app))
+        call(profiling.wrap(slow_app), "/login/")
+        summary = profiling.get_profiler().summary()
+        self.assertEqual(list(summary), ["/login"])
+        self.assertIsNone(summary["/login"]["queries_per_request"])
+        self.assertGreater(summary["/login"]["mean_ms"], 20)
+        self.assertIn(f"{__name__}:slow_app", profiling.get_profiler().folded())
+
+    @override_settings(AUTH_PROFILE_SAMPLE_EVERY=0, AUTH_PROFILE_SLOW_MS=20)
+    def test_slow_untraced(self):
+        """Requests that are not sampled are only timed until they are slow."""
+        wrappers = []
+
+        def app(environ, start_response):
+            wrappers.extend(connection.execute_wrappers)
+            trace = profiling.get_profiler().active[threading.get_ident()]
+            self.assertGreater(trace.sample_after, time.monotonic())
+            return fast_app(environ, start_response)
+
+        call(profiling.wrap(app))
+        self.assertEqual(wrappers, [])
+        self.assertEqual(profiling.get_profiler().active, {})
+
+    @override_settings(AUTH_PROFILE_SAMPLE_EVERY=1, AUTH_PROFILE_SLOW_MS=0)
+    def test_sampled_queries(self):
+        """Sampled requests have their queries counted."""
+        call(profiling.wrap(slow_app), "/login/")
+        summary = profiling.get_profiler().summary()
+        self.assertEqual(summary["/login"]["queries_per_request"], 1)
+
+    def test_phase(self):
+        """Samples belong to the innermost frame with a known phase."""
+        stack = (
+            ("django.core.handlers.base", "get_response"),
+            ("webapp.views", "check_auth"),
+            ("django.contrib.auth", "get_user"),
+            ("django.db.models.query", "get"),
+        )
+        self.assertEqual(profiling.get_phase(stack), "db")
+        self.assertEqual(profiling.get_phase(stack[:3]), "user")
+        self.assertEqual(profiling.get_phase(stack[:2]), "view")
+        self.assertEqual(profiling.get_phase(stack[:1]), "middleware")
+
+    @override_settings(AUTH_PROFILE_SAMPLE_EVERY=1, AUTH_PROFILE_SLOW_MS=0)
+    def test_write(self):
+        """Each process writes its collapsed stacks and summary."""
+        call(profiling.wrap(slow_app), "/login/")
+        profiling.get_profiler().write()
+        prefix = os.path.join(self.directory, str(os.getpid()))
+        with open(f"{prefix}.folded") as folded:
+            line = folded.readline()
+        self.assertTrue(line.startswith("/login;"))
+        self.assertTrue(line.rstrip().rsplit(" ", 1)[1].isdigit())
+        with open(f"{prefix}.json") as summary:
+            self.assertEqual(json.load(summary)["/login"]["requests"], 1)
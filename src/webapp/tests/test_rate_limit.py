@@ -0,0 +1,122 @@
+"""Ensure login attempts are rate limited cheaply."""
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from webapp import auth, lockouts, rate_limit
+from webapp.rate_limit import RateLimiter
+
+
+class RateLimiterTestCase(SimpleTestCase):
+    """Ensure RateLimiter approximates a sliding window shared between processes."""
+
+    def setUp(self):
+        """Start with empty shared counts at the start of a window."""
+        auth.get_cache().clear()
+        patcher = mock.patch("webapp.rate_limit.time.time", return_value=6000.0)
+        self.time = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_limit(self):
+        """Hits beyond the limit are rejected."""
+        limiter = RateLimiter(60, 1)
+        self.assertEqual(
+            [limiter.hit({"key": 3}) for _ in range(4)], [True] * 3 + [False]
+        )
+        self.assertTrue(limiter.hit({"other": 3}))
+
+    def test_sliding(self):
+        """Hits in the previous window count for the part still overlapping."""
+        limiter = RateLimiter(60, 1)
+        for _ in range(4):
+            limiter.hit({"key": 4})
+        self.time.return_value = 6060.0 + 45
+        self.assertEqual(
+            [limiter.hit({"key": 4}) for _ in range(4)], [True] * 3 + [False]
+        )
+
+    def test_shared(self):
+        """Hits in other processes count once synced."""
+        first, second = RateLimiter(60, 1), RateLimiter(60, 1)
+        for _ in range(3):
+            first.hit({"key": 3})
+        self.assertFalse(second.hit({"key": 3}))
+
+    def test_batched(self):
+        """Hits are only synced every sync_every hits or second."""
+        limiter = RateLimiter(60, 5)
+        with mock.patch(
+            "webapp.rate_limit.sync_counts", wraps=rate_limit.sync_counts
+        ) as sync_counts:
+            for _ in range(10):
+                limiter.hit({"key": 100})
+            self.assertEqual(sync_counts.call_count, 2)
+            self.time.return_value += 1
+            limiter.hit({"key": 100})
+            self.assertEqual(sync_counts.call_count, 3)
+
+    def test_rejected_locally(self):
+        """Keys over their limit are rejected without syncing."""
+        limiter = RateLimiter(60, 1)
+        for _ in range(2):
+            limiter.hit({"key": 2})
+        with mock.patch("webapp.rate_limit.sync_counts") as sync_counts:
+            self.assertFalse(limiter.hit({"key": 2}))
+        self.assertFalse(sync_counts.called)
+
+
+@override_settings(AUTH_LOGIN_RATE_LIMIT_IP=5, AUTH_LOGIN_RATE_LIMIT_USERNAME=2)
+class LoginRateLimitTestCase(TestCase):
+    """Ensure the login view is rate limited."""
+
+    def setUp(self):
+        """Create a user and start and end with a fresh rate limiter and lockouts."""
+        auth.get_cache().clear()
+        caches[settings.AXES_CACHE].clear()
+        self.addCleanup(caches[settings.AXES_CACHE].clear)
+        lockouts.get_lockout_filter.cache_clear()
+        self.addCleanup(lockouts.get_lockout_filter.cache_clear)
+        rate_limit.get_login_rate_limiter.cache_clear()
+        self.addCleanup(rate_limit.get_login_rate_limiter.cache_clear)
+        get_user_model().objects.create_user("user", "user@example.com", "password")
+
+    def login(self, username: str):
+        """Post the login form."""
+        data = {"username": username, "password": "wrong"}
+        return self.client.post(reverse("login"), data)
+
+    def test_username(self):
+        """Attempts per username are limited before the form runs."""
+        self.assertEqual(self.login("user").status_code, 200)
+        self.assertEqual(self.login("USER").status_code, 200)
+        with mock.patch("django.contrib.auth.forms.authenticate") as authenticate:
+            response = self.login("user")
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response["Retry-After"], "60")
+        self.assertFalse(authenticate.called)
+
+    def test_ip_address(self):
+        """Attempts per IP address are limited across usernames."""
+        statuses = [self.login(f"user{index}").status_code for index in range(6)]
+        self.assertEqual(statuses, [200] * 5 + [429])
+
+    def test_ip_address_before_form(self):
+        """Attempts over the IP address limit are rejected before parsing the form."""
+        for index in range(5):
+            self.login(f"user{index}")
+        with mock.patch(
+            "django.core.handlers.wsgi.WSGIRequest.POST",
+            new_callable=mock.PropertyMock,
+        ) as post:
+            response = self.login("user")
+        self.assertEqual(response.status_code, 429)
+        self.assertFalse(post.called)
+
+    def test_get(self):
+        """Showing the login form is not limited."""
+        for _ in range(6):
+            self.assertEqual(self.client.get(reverse("login")).status_code, 200)
@@ -0,0 +1,89 @@
+"""Ensure auth rules match the most specific rule."""
+from django.test import SimpleTestCase
+
+from webapp.rules import Access, Rule, RuleSet, normalise_uri
+
+
+def make_rule_set(*rules):
+    """Return a RuleSet of rule dicts."""
+    return RuleSet(Rule.from_dict(rule) for rule in rules)
+
+
+class RuleSetTestCase(SimpleTestCase):
+    """Ensure RuleSet finds the rule deciding access to a URI."""
+
+    def test_empty(self):
+        """An empty rule set matches nothing."""
+        rule_set = make_rule_set()
+        self.assertFalse(rule_set)
+        self.assertIsNone(rule_set.match("example.com", "/"))
+
+    def test_prefix(self):
+        """Paths match themselves and everything below them."""
+        rule_set = make_rule_set({"path": "/docs/"})
+        self.assertEqual(rule_set.match("", "/docs").path, "/docs/")
+        self.assertEqual(rule_set.match("", "/docs/a/b?c=d").path, "/docs/")
+        self.assertIsNone(rule_set.match("", "/doc"))
+        self.assertIsNone(rule_set.match("", "/docsa/"))
+
+    def test_longest_prefix(self):
+        """The rule matching the most segments wins."""
+        rule_set = make_rule_set({"path": "/"}, {"path": "/a/"}, {"path": "/a/b/"})
+        self.assertEqual(rule_set.match("", "/a/b/c").path, "/a/b/")
+        self.assertEqual(rule_set.match("", "/a/c").path, "/a/")
+        self.assertEqual(rule_set.match("", "/c").path, "/")
+
+    def test_wildcard(self):
+        """A `*` segment matches any one segment but loses to a literal."""
+        rule_set = make_rule_set(
+            {"path": "/projects/*/settings/"}, {"path": "/projects/1/"}
+        )
+        self.assertEqual(
+            rule_set.match("", "/projects/2/settings/x").path, "/projects/*/settings/"
+        )
+        self.assertEqual(rule_set.match("", "/projects/1/x").path, "/projects/1/")
+        self.assertIsNone(rule_set.match("", "/projects/2/other/"))
+
+    def test_hosts(self):
+        """Host rules beat rules for every host and domains match subdomains."""
+        rule_set = make_rule_set(
+            {"path": "/", "host": "a.example.com"},
+            {"path": "/", "host": ".example.com"},
+            {"path": "/x/"},
+        )
+        self.assertEqual(
+            rule_set.match("a.example.com:443", "/x/").host, "a.example.com"
+        )
+        self.assertEqual(rule_set.match("b.example.com", "/x/").host, ".example.com")
+        self.assertEqual(rule_set.match("example.com", "/").host, ".example.com")
+        self.assertEqual(rule_set.match("other.com", "/x/").host, "")
+        self.assertIsNone(rule_set.match("other.com", "/"))
+
+    def test_normalise_uri(self):
+        """Encoded and relative segments can't sneak past a rule."""
+        self.assertEqual(normalise_uri("/public/../admin/"), "/admin")
+        self.assertEqual(normalise_uri("/%61dmin/?next=/"), "/admin")
+        rule_set = make_rule_set({"path": "/admin/"})
+        self.assertIsNotNone(rule_set.match("", "/public/%2e%2e/admin/"))
+
+
+class RuleTestCase(SimpleTestCase):
+    """Ensure rules allow the right users."""
+
+    def test_allows(self):
+        """Users need one of the groups or permissions."""
+        rule = Rule.from_dict(
+            {"path": "/", "groups": ["staff"], "permissions": ["app.view"]}
+        )
+        nobody = Access(False, frozenset(), frozenset())
+        self.assertFalse(rule.allows(nobody))
+        self.assertTrue(rule.allows(nobody._replace(groups=frozenset(["staff"]))))
+        self.assertTrue(
+            rule.allows(nobody._replace(permissions=frozenset(["app.view"])))
+        )
+        self.assertTrue(rule.allows(nobody._replace(is_superuser=True)))
+
+    def test_open(self):
+        """Rules without groups or permissions allow everyone."""
+        rule = Rule.from_dict({"path": "/"})
+        self.assertTrue(rule.allows(Access(False, frozenset(), frozenset())))
@@ -0,0 +1,255 @@
+"""Ensure session refreshes and last logins are buffered and flushed in bulk."""
+from datetime import timedelta
+from importlib import import_module
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.sessions.backends.db import SessionStore
+from django.contrib.sessions.models import Session
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from webapp import auth, sessions, tasks
+from webapp.sessions import redis
+
+
+@override_settings(AUTH_SESSION_SLIDING=True, AUTH_SESSION_REFRESH_THRESHOLD=60)
+class SlidingSessionTestCase(TestCase):
+    """Ensure sessions close to expiring are refreshed by the flush."""
+
+    def setUp(self):
+        """Log a user in and start with empty caches and buffers."""
+        auth.get_cache().clear()
+        auth.get_local_cache().clear()
+        user = get_user_model().objects.create_user(
+            "user", "user@example.com", "password"
+        )
+        self.client.force_login(user)
+        self.session_key = self.client.cookies[settings.SESSION_COOKIE_NAME].value
+        sessions.drain_touches()
+
+    def expire_in(self, seconds: int):
+        """Move the session's expiry."""
+        Session.objects.filter(session_key=self.session_key).update(
+            expire_date=timezone.now() + timedelta(seconds=seconds)
+        )
+
+    def test_fresh(self):
+        """Sessions with plenty of time left are not queued."""
+        self.assertEqual(self.client.get(reverse("auth-test")).status_code, 204)
+        self.assertEqual(sessions.drain_touches(), [])
+
+    def test_expiring(self):
+        """Sessions close to expiring are queued and refreshed by the flush."""
+        self.expire_in(30)
+        with self.assertNumQueries(2):
+            self.assertEqual(self.client.get(reverse("auth-test")).status_code, 204)
+        with self.assertNumQueries(1):
+            tasks.flush_session_writes()
+        session = Session.objects.get(session_key=self.session_key)
+        remaining = session.expire_date - timezone.now()
+        self.assertGreater(
+            remaining, timedelta(seconds=settings.SESSION_COOKIE_AGE - 60)
+        )
+        self.assertEqual(sessions.drain_touches(), [])
+
+    def test_expired(self):
+        """Sessions that expired before the flush stay expired."""
+        sessions.record_touch(self.session_key)
+        self.expire_in(-1)
+        self.assertEqual(sessions.touch_sessions(sessions.drain_touches()), 0)
+
+    @override_settings(AUTH_SESSION_SLIDING=False)
+    def test_disabled(self):
+        """Nothing is queued without sliding sessions."""
+        self.expire_in(30)
+        self.client.get(reverse("auth-test"))
+        self.assertEqual(sessions.drain_touches(), [])
+
+
+class LastLoginTestCase(TestCase):
+    """Ensure last_login is queued instead of saved when buffered."""
+
+    def setUp(self):
+        """Create a user and start with an empty buffer."""
+        self.user = get_user_model().objects.create_user(
+            "user", "user@example.com", "password"
+        )
+        sessions.drain_logins()
+
+    def login(self):
+        """Log in through the login form."""
+        data = {"username": "user", "password": "password"}
+        self.assertEqual(self.client.post(reverse("login"), data).status_code, 302)
+
+    @override_settings(AUTH_LAST_LOGIN_BUFFERED=True)
+    def test_buffered(self):
+        """Logging in leaves the user alone until the flush."""
+        self.login()
+        self.user.refresh_from_db()
+        self.assertIsNone(self.user.last_login)
+        with self.assertNumQueries(1):
+            tasks.flush_session_writes()
+        self.user.refresh_from_db()
+        self.assertIsNotNone(self.user.last_login)
+
+    def test_unbuffered(self):
+        """Logging in saves last_login straight away by default."""
+        self.login()
+        self.user.refresh_from_db()
+        self.assertIsNotNone(self.user.last_login)
+        self.assertEqual(sessions.drain_logins(), {})
+
+
+@override_settings(SESSION_ENGINE="webapp.sessions.redis")
+class RedisSessionTestCase(TestCase):
+    """Ensure sessions can live in the session cache alone."""
+
+    def setUp(self):
+        """Create a user and start with empty caches."""
+        redis.get_cache().clear()
+        auth.get_cache().clear()
+        auth.get_local_cache().clear()
+        self.user = get_user_model().objects.create_user(
+            "user", "user@example.com", "password"
+        )
+
+    def test_login(self):
+        """Logged in sessions are stored in the cache and not the database."""
+        self.client.force_login(self.user)
+        session_key = self.client.cookies[settings.SESSION_COOKIE_NAME].value
+        self.assertTrue(redis.exists(session_key))
+        self.assertFalse(Session.objects.exists())
+        self.assertEqual(self.client.get(reverse("auth-test")).status_code, 204)
+
+    def test_logout(self):
+        """Logging out removes the session."""
+        self.client.force_login(self.user)
+        session_key = self.client.cookies[settings.SESSION_COOKIE_NAME].value
+        self.client.get(reverse("logout"))
+        self.assertFalse(redis.exists(session_key))
+        self.assertEqual(self.client.get(reverse("auth-test")).status_code, 401)
+
+    def test_encode(self):
+        """Large sessions are compressed and small ones are not."""
+        small = {"key": "value"}
+        large = {"key": "value" * redis.COMPRESS_MIN_LENGTH}
+        self.assertEqual(redis.encode(small)[:1], redis.PLAIN)
+        self.assertEqual(redis.encode(large)[:1], redis.COMPRESSED)
+        self.assertLess(len(redis.encode(large)), redis.COMPRESS_MIN_LENGTH)
+        self.assertEqual(redis.decode(redis.encode(large)), large)
+        self.assertEqual(redis.decode(b"zcorrupt"), {})
+
+    @override_settings(AUTH_SESSION_SLIDING=True)
+    def test_touch(self):
+        """Sliding sessions refresh the cached session's expiry."""
+        self.client.force_login(self.user)
+        session_key = self.client.cookies[settings.SESSION_COOKIE_NAME].value
+        self.assertEqual(sessions.touch_sessions([session_key, "missing"]), 1)
+
+
+@override_settings(SESSION_ENGINE="webapp.sessions.redis_db")
+class RedisDBSessionTestCase(TestCase):
+    """Ensure sessions are written through to the database."""
+
+    def setUp(self):
+        """Log a user in and start with empty caches."""
+        auth.get_cache().clear()
+        auth.get_local_cache().clear()
+        user = get_user_model().objects.create_user(
+            "user", "user@example.com", "password"
+        )
+        self.client.force_login(user)
+        self.session_key = self.client.cookies[settings.SESSION_COOKIE_NAME].value
+
+    def test_write_through(self):
+        """Sessions are saved to both."""
+        self.assertTrue(redis.exists(self.session_key))
+        self.assertTrue(Session.objects.filter(session_key=self.session_key).exists())
+
+    def test_read_from_cache(self):
+        """Loading a cached session makes no queries."""
+        store = import_module(settings.SESSION_ENGINE).SessionStore(self.session_key)
+        with self.assertNumQueries(0):
+            self.assertIn("_auth_user_id", store.load())
+        self.assertIsNotNone(store.expire_date)
+
+    def test_read_through(self):
+        """Sessions missing from redis are loaded from the database and cached."""
+        redis.get_cache().clear()
+        self.assertEqual(self.client.get(reverse("auth-test")).status_code, 204)
+        self.assertTrue(redis.exists(self.session_key))
+
+
+class CopySessionsTestCase(TestCase):
+    """Ensure database sessions are copied to redis."""
+
+    def test_copy(self):
+        """Unexpired sessions are copied and existing ones left alone."""
+        redis.get_cache().clear()
+        for _ in range(3):
+            store = SessionStore()
+            store["key"] = "value"
+            store.create()
+        Session.objects.filter(session_key=store.session_key).update(
+            expire_date=timezone.now() - timedelta(seconds=1)
+        )
+        stdout = StringIO()
+        call_command("copy_sessions_to_redis", batch_size=1, stdout=stdout)
+        self.assertEqual(stdout.getvalue().strip(), "Copied 2 of 2 sessions.")
+        key = Session.objects.exclude(session_key=store.session_key).first()
+        self.assertEqual(redis.decode(redis.read(key.session_key)[0]), {"key": "value"})
+        call_command("copy_sessions_to_redis", stdout=stdout)
+        self.assertIn("Copied 0 of 2 sessions.", stdout.getvalue())
+
+
+class PurgeSessionsTestCase(TestCase):
+    """Ensure expired sessions are purged in batches."""
+
+    def setUp(self):
+        """Create two live and three expired sessions, expired an hour apart."""
+        self.expired = []
+        for hours in [0, 0, 3, 2, 1]:
+            store = SessionStore()
+            store.create()
+            if hours:
+                Session.objects.filter(session_key=store.session_key).update(
+                    expire_date=timezone.now() - timedelta(hours=hours)
+                )
+                self.expired.append(store.session_key)
+
+    @override_settings(AUTH_SESSION_PURGE_BATCH_SIZE=2)
+    def test_purge(self):
+        """Every expired session is deleted in batches."""
+        with self.assertNumQueries(4):
+            result = tasks.purge_expired_sessions()
+        self.assertEqual(result, {"deleted": 3, "lag": 0.0})
+        self.assertEqual(Session.objects.count(), 2)
+
+    @override_settings(AUTH_SESSION_PURGE_BATCH_SIZE=2)
+    def test_oldest_first(self):
+        """The longest expired sessions are deleted first."""
+        # NOTE: Only the clock webapp.sessions reads, other threads keep theirs.
+        with mock.patch.object(sessions, "time") as clock:
+            clock.monotonic.side_effect = [0, 0, 60]
+            result = tasks.purge_expired_sessions()
+        self.assertEqual(result["deleted"], 2)
+        self.assertGreaterEqual(result["lag"], 60 * 60)
+        self.assertFalse(Session.objects.filter(pk__in=self.expired[:2]).exists())
+        self.assertTrue(Session.objects.filter(pk=self.expired[2]).exists())
+
+    @override_settings(AUTH_SESSION_PURGE_TIME_BUDGET=0)
+    def test_time_budget(self):
+        """Runs out of time leave the rest for next time and report the lag."""
+        result = tasks.purge_expired_sessions()
+        self.assertEqual(result["deleted"], 0)
+        self.assertGreaterEqual(result["lag"], 60 * 60)
+
+    @override_settings(SESSION_ENGINE="webapp.sessions.redis")
+    def test_redis(self):
+        """Sessions outside the database are left for redis to expire."""
+        self.assertEqual(tasks.purge_expired_sessions(), {"deleted": 0, "lag": 0.0})
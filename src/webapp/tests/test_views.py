@@ -0,0 +1,688 @@
+"""Ensure the auth-test endpoint answers correctly and cheaply."""
+import base64
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
+from django.core.cache import caches
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from webapp import api_keys, auth, basic_auth, lockouts, rules, tokens
+from webapp.models import APIKey, AuthRule
+from webapp.test.nginx import AuthTestCache
+
+
+class CheckAuthTestCase(TestCase):
+    """Ensure check_auth only lets logged in users through."""
+
+    path = reverse("auth-test")
+
+    def setUp(self):
+        """Create a user and start with an empty cache."""
+        auth.get_cache().clear()
+        auth.get_local_cache().clear()
+        self.user = get_user_model().objects.create_user(
+            "user", "user@example.com", "password"
+        )
+
+    def login(self) -> str:
+        """Log the client in and return the session key."""
+        self.client.force_login(self.user)
+        return self.client.cookies[settings.SESSION_COOKIE_NAME].value
+
+    def test_anonymous(self):
+        """Requests without a session are rejected without any queries."""
+        with self.assertNumQueries(0):
+            response = self.client.get(self.path)
+        self.assertEqual(response.status_code, 401)
+
+    def test_unknown_session(self):
+        """Requests with a made up session are rejected."""
+        self.client.cookies[settings.SESSION_COOKIE_NAME] = "not-a-session"
+        response = self.client.get(self.path)
+        self.assertEqual(response.status_code, 401)
+
+    def test_authenticated(self):
+        """Requests from a logged in user are accepted."""
+        self.login()
+        response = self.client.get(self.path)
+        self.assertEqual(response.status_code, 204)
+
+    def test_cached(self):
+        """Repeat requests do not query the database."""
+        self.login()
+        self.client.get(self.path)
+        with self.assertNumQueries(0):
+            response = self.client.get(self.path)
+        self.assertEqual(response.status_code, 204)
+
+    def test_burst(self):
+        """A burst of requests is answered from this process' cache."""
+        self.login()
+        for _ in range(10):
+            self.client.get(self.path)
+        stats = auth.get_local_cache().stats()
+        self.assertEqual(stats["misses"], 1)
+        self.assertEqual(stats["hits"], 9)
+
+    def test_skips_middleware(self):
+        """The fast path returns before the rest of the middleware runs."""
+        self.login()
+        response = self.client.get(self.path)
+        self.assertNotIn("X-Frame-Options", response)
+        self.assertNotIn(settings.SESSION_COOKIE_NAME, response.cookies)
+
+    def test_logout(self):
+        """Logging out stops the old session from being accepted."""
+        session_key = self.login()
+        self.client.get(self.path)
+        self.client.get(reverse("logout"))
+        self.client.cookies[settings.SESSION_COOKIE_NAME] = session_key
+        response = self.client.get(self.path)
+        self.assertEqual(response.status_code, 401)
+
+    def test_password_change(self):
+        """Changing the password stops existing sessions from being accepted."""
+        self.login()
+        self.client.get(self.path)
+        self.user.set_password("new password")
+        self.user.save()
+        response = self.client.get(self.path)
+        self.assertEqual(response.status_code, 401)
+
+    def test_deactivated(self):
+        """Deactivating a user stops existing sessions from being accepted."""
+        self.login()
+        self.client.get(self.path)
+        self.user.is_active = False
+        self.user.save()
+        response = self.client.get(self.path)
+        self.assertEqual(response.status_code, 401)
+
+    def test_deactivated_stays_cached(self):
+        """A deactivated user's sessions are rejected without a lookup."""
+        session_key = self.login()
+        self.client.get(self.path)
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(auth.get_local_cache().get(session_key).is_active, False)
+        with self.assertNumQueries(0):
+            response = self.client.get(self.path)
+        self.assertEqual(response.status_code, 401)
+
+    def test_deleted(self):
+        """Deleting a user stops existing sessions from being accepted."""
+        self.login()
+        self.client.get(self.path)
+        self.user.delete()
+        response = self.client.get(self.path)
+        self.assertEqual(response.status_code, 401)
+
+
+@override_settings(AUTH_TEST_NGINX_CACHE_TIMEOUT=10)
+class NginxCacheTestCase(TestCase):
+    """Ensure nginx can cache decisions without caching the wrong ones."""
+
+    def setUp(self):
+        """Create a user and put a stand-in nginx cache in front of the client."""
+        auth.get_cache().clear()
+        auth.get_local_cache().clear()
+        self.user = get_user_model().objects.create_user(
+            "user", "user@example.com", "password"
+        )
+        self.nginx = AuthTestCache(self.client)
+
+    def test_cache_policy(self):
+        """Only a 204 carries X-Accel-Expires."""
+        response = self.client.get(reverse("auth-test"))
+        self.assertNotIn("X-Accel-Expires", response)
+        self.client.force_login(self.user)
+        response = self.client.get(reverse("auth-test"))
+        self.assertEqual(response["X-Accel-Expires"], "10")
+
+    @override_settings(AUTH_TEST_NGINX_CACHE_TIMEOUT=0)
+    def test_disabled(self):
+        """No cache policy is sent by default."""
+        self.client.force_login(self.user)
+        response = self.client.get(reverse("auth-test"))
+        self.assertNotIn("X-Accel-Expires", response)
+
+    def test_repeat_checks(self):
+        """Repeat checks never reach the backend."""
+        self.client.force_login(self.user)
+        for _ in range(10):
+            self.assertEqual(self.nginx.check(), 204)
+        self.assertEqual(self.nginx.upstream_requests, 1)
+
+    def test_anonymous_not_cached(self):
+        """Rejections are never cached."""
+        for _ in range(3):
+            self.assertEqual(self.nginx.check(), 401)
+        self.assertEqual(self.nginx.upstream_requests, 3)
+
+    def test_logout(self):
+        """A logged out session gets through until the timeout at most."""
+        self.client.force_login(self.user)
+        session_key = self.client.cookies[settings.SESSION_COOKIE_NAME].value
+        self.nginx.check()
+        self.client.get(reverse("logout"))
+        self.client.cookies[settings.SESSION_COOKIE_NAME] = session_key
+        self.assertEqual(self.nginx.check(), 204)
+        later = mock.patch("webapp.test.nginx.time.monotonic", return_value=10 ** 9)
+        with later:
+            self.assertEqual(self.nginx.check(), 401)
+
+
+@override_settings(AUTH_TOKEN_ENABLED=True)
+class AuthTokenTestCase(TestCase):
+    """Ensure auth tokens are issued, accepted and revoked."""
+
+    path = reverse("auth-test")
+
+    def setUp(self):
+        """Create a user and start with empty caches."""
+        auth.get_cache().clear()
+        auth.get_local_cache().clear()
+        tokens.get_generation_table.cache_clear()
+        self.user = get_user_model().objects.create_user(
+            "user", "user@example.com", "password"
+        )
+
+    def login(self) -> str:
+        """Log in through the login view and return the token."""
+        credentials = {"username": "user", "password": "password"}
+        response = self.client.post(reverse("login"), credentials)
+        self.assertEqual(response.status_code, 302)
+        return response.cookies[settings.AUTH_TOKEN_COOKIE_NAME].value
+
+    def drop_session(self):
+        """Drop the session so only the token can authenticate requests."""
+        del self.client.cookies[settings.SESSION_COOKIE_NAME]
+
+    def test_token_issued(self):
+        """Logging in issues a token for the user."""
+        token = self.login()
+        self.assertTrue(token.startswith(f"{self.user.pk}.0:"))
+
+    @override_settings(AUTH_TOKEN_ENABLED=False)
+    def test_disabled(self):
+        """No token is issued or accepted when disabled."""
+        credentials = {"username": "user", "password": "password"}
+        response = self.client.post(reverse("login"), credentials)
+        self.assertNotIn(settings.AUTH_TOKEN_COOKIE_NAME, response.cookies)
+        self.client.cookies[settings.AUTH_TOKEN_COOKIE_NAME] = tokens.make_token(
+            self.user.pk
+        )
+        del self.client.cookies[settings.SESSION_COOKIE_NAME]
+        self.assertEqual(self.client.get(self.path).status_code, 401)
+
+    def test_token_accepted(self):
+        """A token is accepted without any queries once the table is loaded."""
+        self.login()
+        self.drop_session()
+        self.assertEqual(self.client.get(self.path).status_code, 204)
+        with self.assertNumQueries(0):
+            response = self.client.get(self.path)
+        self.assertEqual(response.status_code, 204)
+
+    def test_tampered(self):
+        """A tampered token is rejected."""
+        token = self.login()
+        self.drop_session()
+        forged = f"{self.user.pk + 1}{token[len(str(self.user.pk)):]}"
+        self.client.cookies[settings.AUTH_TOKEN_COOKIE_NAME] = forged
+        self.assertEqual(self.client.get(self.path).status_code, 401)
+
+    @override_settings(AUTH_TOKEN_MAX_AGE=-1)
+    def test_expired(self):
+        """An expired token is rejected."""
+        self.login()
+        self.drop_session()
+        self.assertEqual(self.client.get(self.path).status_code, 401)
+
+    def test_logout(self):
+        """Logging out revokes the token."""
+        token = self.login()
+        self.client.get(reverse("logout"))
+        self.client.cookies[settings.AUTH_TOKEN_COOKIE_NAME] = token
+        self.assertEqual(self.client.get(self.path).status_code, 401)
+
+    def test_password_change(self):
+        """Changing the password revokes the token."""
+        self.login()
+        self.drop_session()
+        self.user.set_password("new password")
+        self.user.save()
+        self.assertEqual(self.client.get(self.path).status_code, 401)
+
+    def test_new_token_after_revoking(self):
+        """Tokens issued after revoking are accepted."""
+        self.login()
+        tokens.revoke_tokens(self.user.pk)
+        token = self.login()
+        self.drop_session()
+        self.assertTrue(token.startswith(f"{self.user.pk}.1:"))
+        self.assertEqual(self.client.get(self.path).status_code, 204)
+
+    def test_user_deleted(self):
+        """Deleting the user revokes the token in every process."""
+        token = self.login()
+        self.user.delete()
+        tokens.get_generation_table.cache_clear()
+        request = RequestFactory().get(self.path)
+        request.COOKIES[settings.AUTH_TOKEN_COOKIE_NAME] = token
+        self.assertIsNone(tokens.get_token_user_id(request))
+
+
+class APIKeyTestCase(TestCase):
+    """Ensure check_auth accepts API keys."""
+
+    path = reverse("auth-test")
+
+    def setUp(self):
+        """Create a user with an API key."""
+        auth.get_cache().clear()
+        api_keys.get_local_api_key_cache().clear()
+        self.user = get_user_model().objects.create_user(
+            "bot", "bot@example.com", "password"
+        )
+        self.key, prefix, hashed_key = api_keys.make_key()
+        self.api_key = APIKey.objects.create(
+            user=self.user, name="CI", prefix=prefix, hashed_key=hashed_key
+        )
+
+    def check(self, key: str) -> int:
+        """Return the status code for a request with the key."""
+        authorization = f"Bearer {key}"
+        return self.client.get(self.path, HTTP_AUTHORIZATION=authorization).status_code
+
+    def test_hashed(self):
+        """Only a keyed hash of the key is stored."""
+        self.assertNotIn(self.api_key.hashed_key, self.key)
+        self.assertTrue(self.key.startswith(f"{self.api_key.prefix}."))
+
+    def test_accepted(self):
+        """Valid keys are accepted."""
+        self.assertEqual(self.check(self.key), 204)
+
+    def test_cached(self):
+        """Repeat requests do not query the database."""
+        self.check(self.key)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.check(self.key), 204)
+
+    def test_invalid(self):
+        """Wrong secrets and unknown prefixes are rejected."""
+        self.assertEqual(self.check(f"{self.api_key.prefix}.wrong"), 401)
+        self.assertEqual(self.check("000000000000.wrong"), 401)
+        self.assertEqual(self.check("malformed"), 401)
+
+    def test_unknown_cached(self):
+        """Guessing keys does not reach the database or the shared cache."""
+        self.check("000000000000.wrong")
+        with self.assertNumQueries(0):
+            self.assertEqual(self.check("000000000000.other"), 401)
+        self.assertIsNone(auth.get_cache().get(api_keys.api_key_cache_key("0" * 12)))
+
+    def test_other_bearer(self):
+        """Bearer values that are not API keys fall through to the session."""
+        self.client.force_login(self.user)
+        self.assertEqual(self.check("eyJhbGciOiJIUzI1NiJ9.e30.signature"), 204)
+
+    def test_expired(self):
+        """Expired keys are rejected."""
+        self.api_key.expires = timezone.now()
+        self.api_key.save()
+        self.assertEqual(self.check(self.key), 401)
+
+    def test_deleted(self):
+        """Deleting a key is seen straight away."""
+        self.check(self.key)
+        self.api_key.delete()
+        self.assertEqual(self.check(self.key), 401)
+
+    def test_deactivated(self):
+        """Deactivating the user is seen straight away."""
+        self.check(self.key)
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.check(self.key), 401)
+
+    def test_admin(self):
+        """Keys created in the admin are shown once."""
+        admin = get_user_model().objects.create_superuser(
+            "admin", "admin@example.com", "password"
+        )
+        self.client.force_login(admin)
+        response = self.client.post(
+            reverse("admin:webapp_apikey_add"),
+            {"user": self.user.pk, "name": "Monitoring"},
+            follow=True,
+        )
+        api_key = APIKey.objects.get(name="Monitoring")
+        message = str(list(response.context["messages"])[0])
+        key = message.split()[5]
+        self.assertEqual(api_key.hashed_key, api_keys.hash_secret(key.split(".")[1]))
+
+
+@override_settings(AUTH_BASIC_ENABLED=True)
+class BasicAuthTestCase(TestCase):
+    """Ensure check_auth accepts Basic credentials without rehashing every time."""
+
+    path = reverse("auth-test")
+
+    def setUp(self):
+        """Create a user and start with empty caches."""
+        auth.get_cache().clear()
+        caches[settings.AXES_CACHE].clear()
+        lockouts.get_lockout_filter().locked.clear()
+        basic_auth.get_local_credentials_cache().clear()
+        self.user = get_user_model().objects.create_user(
+            "legacy", "legacy@example.com", "password"
+        )
+
+    def check(self, username: str, password: str) -> int:
+        """Return the status code for a request with the credentials."""
+        encoded = base64.b64encode(f"{username}:{password}".encode()).decode()
+        authorization = f"Basic {encoded}"
+        return self.client.get(self.path, HTTP_AUTHORIZATION=authorization).status_code
+
+    def test_accepted(self):
+        """Valid credentials are accepted."""
+        self.assertEqual(self.check("legacy", "password"), 204)
+
+    def test_rejected(self):
+        """Wrong or malformed credentials are rejected."""
+        self.assertEqual(self.check("legacy", "wrong"), 401)
+        authorization = "Basic not-base64"
+        response = self.client.get(self.path, HTTP_AUTHORIZATION=authorization)
+        self.assertEqual(response.status_code, 401)
+
+    @override_settings(AUTH_BASIC_ENABLED=False)
+    def test_disabled(self):
+        """Basic credentials are ignored unless enabled."""
+        self.assertEqual(self.check("legacy", "password"), 401)
+
+    def test_cached(self):
+        """Only the first request checks the password."""
+        with mock.patch(
+            "webapp.basic_auth.authenticate", wraps=basic_auth.authenticate
+        ) as authenticate:
+            self.check("legacy", "password")
+            with self.assertNumQueries(0):
+                self.assertEqual(self.check("legacy", "password"), 204)
+            basic_auth.get_local_credentials_cache().clear()
+            self.assertEqual(self.check("legacy", "password"), 204)
+        self.assertEqual(authenticate.call_count, 1)
+
+    def test_password_change(self):
+        """Changing the password is seen straight away."""
+        self.check("legacy", "password")
+        self.user.set_password("new-password")
+        self.user.save()
+        self.assertEqual(self.check("legacy", "password"), 401)
+        self.assertEqual(self.check("legacy", "new-password"), 204)
+
+    def test_locked_out(self):
+        """Locking a user out drops their cached credentials."""
+        self.check("legacy", "password")
+        for _ in range(settings.AXES_FAILURE_LIMIT):
+            self.check("legacy", "wrong")
+        self.assertTrue(lockouts.drain_lockouts())
+        self.assertEqual(self.check("legacy", "password"), 401)
+
+
+@override_settings(
+    AUTH_RULES=[
+        {"path": "/staff/", "groups": ["staff"]},
+        {"path": "/staff/public/"},
+    ]
+)
+class AuthRulesTestCase(TestCase):
+    """Ensure check_auth applies the auth rules."""
+
+    path = reverse("auth-test")
+
+    def setUp(self):
+        """Create and log in a user and compile the rules."""
+        auth.get_cache().clear()
+        auth.get_local_cache().clear()
+        auth.get_local_access_cache().clear()
+        rules.get_rule_store.cache_clear()
+        self.addCleanup(rules.get_rule_store.cache_clear)
+        self.user = get_user_model().objects.create_user(
+            "user", "user@example.com", "password"
+        )
+        self.group = Group.objects.create(name="staff")
+        self.client.force_login(self.user)
+
+    def check(self, uri: str) -> int:
+        """Return the status code for a URI."""
+        return self.client.get(self.path, HTTP_X_ORIGINAL_URI=uri).status_code
+
+    def test_open(self):
+        """A URI without a rule is open to every logged in user."""
+        self.assertEqual(self.check("/other/"), 204)
+        self.assertEqual(self.check("/staff/public/page"), 204)
+
+    def test_forbidden(self):
+        """Users outside the rule's groups are forbidden."""
+        self.assertEqual(self.check("/staff/page"), 403)
+
+    def test_anonymous(self):
+        """Anonymous users still get a 401."""
+        self.client.logout()
+        self.assertEqual(self.check("/staff/page"), 401)
+
+    def test_group(self):
+        """Joining the group is seen straight away."""
+        self.check("/staff/page")
+        self.user.groups.add(self.group)
+        self.assertEqual(self.check("/staff/page"), 204)
+        self.group.user_set.remove(self.user)
+        self.assertEqual(self.check("/staff/page"), 403)
+
+    def test_cached(self):
+        """Group membership is not queried on every request."""
+        self.user.groups.add(self.group)
+        self.check("/staff/page")
+        with self.assertNumQueries(0):
+            self.assertEqual(self.check("/staff/page"), 204)
+
+
+@override_settings(
+    AUTH_TEST_IDENTITY_HEADERS={
+        "X-Auth-User": "username",
+        "X-Auth-Email": "email",
+        "X-Auth-Groups": "groups",
+    }
+)
+class IdentityHeadersTestCase(TestCase):
+    """Ensure a 204 identifies the user to the upstream app."""
+
+    path = reverse("auth-test")
+
+    def setUp(self):
+        """Create and log in a user in two groups."""
+        auth.get_cache().clear()
+        auth.get_local_cache().clear()
+        auth.get_local_access_cache().clear()
+        self.user = get_user_model().objects.create_user(
+            "user", "user+tag@example.com", "password"
+        )
+        self.user.groups.add(
+            Group.objects.create(name="staff"), Group.objects.create(name="a, b")
+        )
+        self.client.force_login(self.user)
+
+    def test_headers(self):
+        """The configured headers are percent-encoded."""
+        response = self.client.get(self.path)
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(response["X-Auth-User"], "user")
+        self.assertEqual(response["X-Auth-Email"], "user%2Btag@example.com")
+        self.assertEqual(response["X-Auth-Groups"], "a%2C b,staff")
+
+    def test_anonymous(self):
+        """Rejections do not carry the headers."""
+        self.client.logout()
+        response = self.client.get(self.path)
+        self.assertEqual(response.status_code, 401)
+        self.assertNotIn("X-Auth-User", response)
+
+    def test_cached(self):
+        """The headers are not looked up on every request."""
+        self.client.get(self.path)
+        with self.assertNumQueries(0):
+            response = self.client.get(self.path)
+        self.assertEqual(response["X-Auth-User"], "user")
+
+    def test_user_missing(self):
+        """A user deleted since their credential was checked is not authenticated."""
+        with mock.patch("webapp.views.get_user_id", return_value=(0, "session")):
+            response = self.client.get(self.path)
+        self.assertEqual(response.status_code, 401)
+        self.assertIsNone(auth.get_user_access(0))
+
+    def test_user_changed(self):
+        """Changing the user is seen straight away."""
+        self.client.get(self.path)
+        self.user.email = "new@example.com"
+        self.user.save()
+        response = self.client.get(self.path)
+        self.assertEqual(response["X-Auth-Email"], "new@example.com")
+
+    @override_settings(AUTH_TEST_IDENTITY_HEADERS={})
+    def test_disabled(self):
+        """No headers are sent unless configured."""
+        response = self.client.get(self.path)
+        self.assertNotIn("X-Auth-User", response)
+
+
+class AuthRuleReloadTestCase(TransactionTestCase):
+    """Ensure rules in the database apply without restarting.
+
+    NOTE: Rules are reloaded once the transaction commits, so this can't be a
+    TestCase which never commits.
+    """
+
+    path = reverse("auth-test")
+
+    def setUp(self):
+        """Create and log in a user and compile the rules."""
+        auth.get_cache().clear()
+        auth.get_local_cache().clear()
+        auth.get_local_access_cache().clear()
+        rules.get_rule_store.cache_clear()
+        self.addCleanup(rules.get_rule_store.cache_clear)
+        self.user = get_user_model().objects.create_user(
+            "user", "user@example.com", "password"
+        )
+        self.client.force_login(self.user)
+
+    def check(self, uri: str) -> int:
+        """Return the status code for a URI."""
+        return self.client.get(self.path, HTTP_X_ORIGINAL_URI=uri).status_code
+
+    def test_reload(self):
+        """Adding, changing and deleting rules applies straight away."""
+        self.assertEqual(self.check("/staff/"), 204)
+        rule = AuthRule.objects.create(path="/staff/")
+        group = Group.objects.create(name="staff")
+        rule.groups.add(group)
+        self.assertEqual(self.check("/staff/"), 403)
+        self.user.groups.add(group)
+        self.assertEqual(self.check("/staff/"), 204)
+        rule.delete()
+        self.user.groups.remove(group)
+        self.assertEqual(self.check("/staff/"), 204)
+
+    def test_other_process(self):
+        """Changes made by another process apply once the poll interval passes."""
+        self.assertEqual(self.check("/staff/"), 204)
+        store = rules.get_rule_store()
+        rule = AuthRule(path="/staff/")
+        # NOTE: Save without signals, the way another process's change looks here.
+        AuthRule.objects.bulk_create([rule])
+        rule = AuthRule.objects.get()
+        rule.groups.through.objects.create(
+            authrule=rule, group=Group.objects.create(name="staff")
+        )
+        self.assertEqual(self.check("/staff/"), 204)
+        auth.get_cache().set(rules.VERSION_KEY, 1)
+        self.assertEqual(self.check("/staff/"), 204)
+        store.expire()
+        self.assertEqual(self.check("/staff/"), 403)
+
+
+@override_settings(
+    AUTH_MEDIA_BACKEND="local",
+    AUTH_RULES=[{"path": "/assets/media/staff/", "groups": ["staff"]}],
+)
+class ProtectedMediaTestCase(TestCase):
+    """Ensure media downloads are checked per file and handed to nginx."""
+
+    def setUp(self):
+        """Create and log in a user and compile the rules."""
+        auth.get_cache().clear()
+        auth.get_local_cache().clear()
+        auth.get_local_access_cache().clear()
+        rules.get_rule_store.cache_clear()
+        self.addCleanup(rules.get_rule_store.cache_clear)
+        self.user = get_user_model().objects.create_user(
+            "user", "user@example.com", "password"
+        )
+        self.client.force_login(self.user)
+
+    def download(self, path: str):
+        """Request a media file the way nginx forwards it."""
+        return self.client.get(
+            reverse("media", args=[path]), HTTP_X_ORIGINAL_URI=f"/assets/media/{path}"
+        )
+
+    def test_allowed(self):
+        """Tell nginx to send the file from disk."""
+        response = self.download("reports/2020 q1.pdf")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response["X-Accel-Redirect"], "/protected-media/reports/2020%20q1.pdf"
+        )
+        self.assertEqual(response["Content-Type"], "application/pdf")
+        self.assertEqual(response.content, b"")
+
+    def test_forbidden(self):
+        """Files under a rule are only sent to its groups."""
+        self.assertEqual(self.download("staff/salaries.csv").status_code, 403)
+
+    def test_anonymous(self):
+        """Anonymous users are sent to log in and back."""
+        self.client.logout()
+        response = self.download("reports/q1.pdf")
+        self.assertEqual(response.status_code, 302)
+        self.assertIn("next=/assets/media/reports/q1.pdf", response["Location"])
+
+    def test_traversal(self):
+        """Paths leaving MEDIA_ROOT are not found."""
+        self.assertEqual(self.download("../secrets.txt").status_code, 404)
+        self.assertEqual(self.download("reports/../../secrets").status_code, 404)
+
+    @override_settings(AUTH_MEDIA_BACKEND="s3")
+    def test_s3(self):
+        """Tell nginx to proxy a presigned URL."""
+        url = "https://bucket.s3.amazonaws.com/assets/media/q1.pdf?X-Amz-Signature=a"
+        with mock.patch("webapp.media.default_storage.url", return_value=url) as sign:
+            response = self.download("q1.pdf")
+        sign.assert_called_once_with("q1.pdf", expire=60)
+        self.assertEqual(
+            response["X-Accel-Redirect"],
+            "/protected-media-s3/https/bucket.s3.amazonaws.com/assets/media/q1.pdf"
+            "?X-Amz-Signature=a",
+        )
+
+    @override_settings(AUTH_MEDIA_BACKEND="")
+    def test_disabled(self):
+        """Nothing is served unless enabled."""
+        self.assertEqual(self.download("reports/q1.pdf").status_code, 404)
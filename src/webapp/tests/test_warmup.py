@@ -0,0 +1,46 @@
+"""Ensure new workers are warmed up before serving requests."""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+from django.test import TestCase
+
+from webapp import rules, warmup
+
+
+class WarmUpTestCase(TestCase):
+    """Ensure every step runs and failures are left to the requests."""
+
+    def setUp(self):
+        """Start with no compiled rules and keep the test's database connection."""
+        rules.get_rule_store.cache_clear()
+        self.addCleanup(rules.get_rule_store.cache_clear)
+        patcher = mock.patch.object(warmup.connections, "close_all")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_warm_up(self):
+        """The rules are compiled."""
+        warmup.warm_up()
+        self.assertIsNotNone(rules.get_rule_store().rule_set)
+
+    def test_failure(self):
+        """A failing step is logged and the rest still run."""
+        ran = []
+
+        def fail():
+            raise ConnectionError()
+
+        with mock.patch.object(warmup, "STEPS", [fail, lambda: ran.append(True)]):
+            with self.assertLogs("webapp.warmup", "ERROR"):
+                warmup.warm_up()
+        self.assertEqual(ran, [True])
+
+    def test_run_on_each_thread(self):
+        """Each of the pool's threads runs the function once."""
+        idents = []
+        with ThreadPoolExecutor(3) as pool:
+            warmup.run_on_each_thread(
+                pool, 3, lambda: idents.append(threading.get_ident())
+            )
+        self.assertEqual(len(set(idents)), 3)
@@ -0,0 +1,136 @@
+"""Stateless signed auth tokens for the auth-test hot path.
+
+A token is ``<user id>.<generation>:<timestamp>:<signature>``. Checking one is an
+HMAC and a lookup in this process' table of generations, which is refreshed from the
+database at most every ``settings.AUTH_TOKEN_REFRESH_INTERVAL`` seconds.
+"""
+import threading
+import time
+from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import Dict, Optional, cast
+
+from django.conf import settings
+from django.core import signing
+from django.db.models import F
+from django.http import HttpRequest, HttpResponse
+from django.utils import timezone
+
+from webapp.auth import LookupRequired
+from webapp.models import AuthTokenGeneration
+
+SALT = "webapp.tokens"
+
+
+class GenerationTable:
+    """This process' copy of every user's token generation."""
+
+    def __init__(self, refresh_interval: float):
+        """Start empty so the first lookup loads the whole table."""
+        self.refresh_interval = refresh_interval
+        self.generations: Dict[int, int] = {}
+        self._since: Optional[datetime] = None
+        self._next_refresh = 0.0
+        self._lock = threading.Lock()
+
+    def get(self, user_id: int, local_only: bool = False) -> int:
+        """Return the user's current generation.
+
+        With local_only, LookupRequired is raised if the table is due a refresh.
+        """
+        if time.monotonic() >= self._next_refresh:
+            if local_only:
+                raise LookupRequired()
+            self.refresh()
+        return self.generations.get(user_id, 0)
+
+    def refresh(self):
+        """Load generations changed since the last refresh.
+
+        Only one thread refreshes at a time, the others carry on with the current
+        table rather than waiting.
+        """
+        if not self._lock.acquire(blocking=False):
+            return
+        try:
+            started = timezone.now()
+            queryset = AuthTokenGeneration.objects.all()
+            if self._since is not None:
+                # NOTE: Overlap with the last refresh so rows committed late are seen.
+                overlap = timedelta(seconds=self.refresh_interval)
+                queryset = queryset.filter(modified__gte=self._since - overlap)
+            self.generations.update(queryset.values_list("user_id", "generation"))
+            self._since = started
+            self._next_refresh = time.monotonic() + self.refresh_interval
+        finally:
+            self._lock.release()
+
+
+@lru_cache(maxsize=None)
+def get_generation_table() -> GenerationTable:
+    """Return this process' table of generations."""
+    return GenerationTable(settings.AUTH_TOKEN_REFRESH_INTERVAL)
+
+
+def make_token(user_id: int) -> str:
+    """Return a signed token for the user's current generation."""
+    generation = (
+        AuthTokenGeneration.objects.filter(user_id=user_id)
+        .values_list("generation", flat=True)
+        .first()
+    )
+    value = f"{user_id}.{generation or 0}"
+    return signing.TimestampSigner(salt=SALT).sign(value)
+
+
+def get_token_user_id(request: HttpRequest, local_only: bool = False) -> Optional[int]:
+    """Return the id of the user the request's token was issued to or None.
+
+    With local_only, LookupRequired is raised instead of querying the database.
+    """
+    token = request.COOKIES.get(settings.AUTH_TOKEN_COOKIE_NAME)
+    if not token:
+        return None
+    signer = signing.TimestampSigner(salt=SALT)
+    try:
+        value = signer.unsign(token, max_age=settings.AUTH_TOKEN_MAX_AGE)
+        user_id, generation = map(int, value.split("."))
+    except (signing.BadSignature, ValueError):
+        return None
+    if generation != get_generation_table().get(user_id, local_only):
+        return None
+    return user_id
+
+
+def revoke_tokens(user_id: int):
+    """Revoke every token issued to the user so far.
+
+    Other processes notice within ``settings.AUTH_TOKEN_REFRESH_INTERVAL`` seconds.
+    """
+    queryset = AuthTokenGeneration.objects.filter(user_id=user_id)
+    if not queryset.update(generation=F("generation") + 1, modified=timezone.now()):
+        AuthTokenGeneration.objects.get_or_create(
+            user_id=user_id, defaults={"generation": 1}
+        )
+    get_generation_table().generations[user_id] = queryset.get().generation
+
+
+def set_token_cookie(response: HttpResponse, user_id: int):
+    """Issue a token cookie to the user."""
+    response.set_cookie(
+        settings.AUTH_TOKEN_COOKIE_NAME,
+        make_token(user_id),
+        max_age=settings.AUTH_TOKEN_MAX_AGE,
+        domain=settings.SESSION_COOKIE_DOMAIN,
+        secure=settings.SESSION_COOKIE_SECURE,
+        httponly=True,
+        # NOTE: None leaves SameSite out, as for the session cookie.
+        samesite=cast(str, settings.SESSION_COOKIE_SAMESITE),
+    )
+
+
+def delete_token_cookie(response: HttpResponse):
+    """Remove the token cookie."""
+    response.delete_cookie(
+        settings.AUTH_TOKEN_COOKIE_NAME, domain=settings.SESSION_COOKIE_DOMAIN
+    )
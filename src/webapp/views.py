@@ -1,9 +1,224 @@
 """Webapp views."""
-from django.http import HttpResponse
+import asyncio
+import time
+from typing import NamedTuple, Optional, Tuple
+
+from django.conf import settings
+from django.contrib.auth import views as auth_views
+from django.db import close_old_connections
+from django.http import Http404, HttpRequest, HttpResponse
+from django.urls import reverse
+from prometheus_client import CONTENT_TYPE_LATEST
+
+from webapp import api_keys, basic_auth, decision_log, media, metrics, tokens
+from webapp.auth import LookupRequired, get_session_user_id, get_user_access
+from webapp.forms import LoginForm
+from webapp.hashers import encrypt_password, needs_rehash
+from webapp.rules import Rule, get_rule_set
+
+
+def get_user_id(
+    request: HttpRequest, local_only: bool = False
+) -> Tuple[Optional[int], str]:
+    """Return the id of the user making the request or None and the credential used.
+
+    Requests with a bearer API key or, when enabled, Basic credentials are only
+    checked against those. Other bearer values are left to the upstream app.
+    Otherwise a valid auth token is enough on its own, then the session is checked.
+    The credential is "api_key", "basic", "token", "session" or "none". With
+    local_only, LookupRequired is raised instead of leaving this process.
+    """
+    key = api_keys.get_bearer_key(request)
+    if key is not None:
+        return api_keys.get_api_key_user_id(key, local_only), "api_key"
+    if settings.AUTH_BASIC_ENABLED:
+        credentials = basic_auth.get_basic_credentials(request)
+        if credentials is not None:
+            user_id = basic_auth.get_basic_user_id(request, credentials, local_only)
+            return user_id, "basic"
+    if settings.AUTH_TOKEN_ENABLED:
+        user_id = tokens.get_token_user_id(request, local_only)
+        if user_id is not None:
+            return user_id, "token"
+    if settings.SESSION_COOKIE_NAME in request.COOKIES:
+        return get_session_user_id(request, local_only), "session"
+    if (
+        settings.AUTH_TOKEN_ENABLED
+        and settings.AUTH_TOKEN_COOKIE_NAME in request.COOKIES
+    ):
+        return None, "token"
+    return None, "none"
+
+
+def get_rule(request: HttpRequest, local_only: bool = False) -> Optional[Rule]:
+    """Return the rule deciding access to the URI nginx is asking about or None.
+
+    nginx forwards the URI in the X-Original-URI header, see webapp.rules.
+    """
+    rule_set = get_rule_set(local_only)
+    if not rule_set:
+        return None
+    host = request.META.get("HTTP_HOST", "")
+    return rule_set.match(host, request.META.get("HTTP_X_ORIGINAL_URI", "/"))
+
+
+class Decision(NamedTuple):
+    """The answer to an auth-test subrequest."""
+
+    status: int
+    reason: str
+    credential: str
+    user_id: Optional[int] = None
+    headers: Tuple[Tuple[str, str], ...] = ()
+
+
+def get_decision(request: HttpRequest, local_only: bool = False) -> Decision:
+    """Return 401 if not authenticated, 403 if not allowed and 204 otherwise.
+
+    A 204 carries the user's ``settings.AUTH_TEST_IDENTITY_HEADERS``, which are
+    cached with their groups and permissions. A user deleted since their credential
+    was issued is not authenticated.
+    """
+    user_id, credential = get_user_id(request, local_only)
+    if user_id is None:
+        reason = "invalid" if credential != "none" else "anonymous"
+        return Decision(401, reason, credential)
+    rule = get_rule(request, local_only)
+    if rule is None and not settings.AUTH_TEST_IDENTITY_HEADERS:
+        return Decision(204, "allowed", credential, user_id)
+    access = get_user_access(user_id, local_only)
+    if access is None:
+        return Decision(401, "invalid", credential)
+    if rule is not None and not rule.allows(access):
+        return Decision(403, "rule", credential, user_id)
+    headers: Tuple[Tuple[str, str], ...] = ()
+    if settings.AUTH_TEST_IDENTITY_HEADERS:
+        headers = access.headers
+    return Decision(204, "allowed", credential, user_id, headers)
+
+
+def auth_test_response(decision: Decision) -> HttpResponse:
+    """Return the auth-test response for the decision.
+
+    A 204 may be cached by nginx for ``settings.AUTH_TEST_NGINX_CACHE_TIMEOUT``.
+    """
+    response = HttpResponse(status=decision.status)
+    for header, value in decision.headers:
+        response[header] = value
+    if decision.status == 204 and settings.AUTH_TEST_NGINX_CACHE_TIMEOUT:
+        response["X-Accel-Expires"] = settings.AUTH_TEST_NGINX_CACHE_TIMEOUT
+    return response
+
+
+def record_decision(request: HttpRequest, decision: Decision, started: float):
+    """Count, time and log an auth-test answer."""
+    seconds = time.perf_counter() - started
+    metrics.inc(metrics.AUTH_TEST_DECISIONS, str(decision.status))
+    metrics.observe(metrics.AUTH_TEST_SECONDS, seconds)
+    decision_log.record(request, decision, seconds)
 
 
 def check_auth(request, *args, **kwargs):  # pylint: disable=unused-argument
-    """Return 401 if not authenticated and 204 otherwise."""
-    if not request.user.is_authenticated:
-        return HttpResponse(status=401)
-    return HttpResponse(status=204)
+    """Return 401 if not authenticated, 403 if not allowed and 204 otherwise."""
+    started = time.perf_counter()
+    decision = get_decision(request)
+    record_decision(request, decision, started)
+    return auth_test_response(decision)
+
+
+def check_auth_blocking(request: HttpRequest) -> HttpResponse:
+    """Run check_auth on a worker thread, cleaning up its database connection."""
+    close_old_connections()
+    try:
+        return check_auth(request)
+    finally:
+        close_old_connections()
+
+
+async def check_auth_async(request: HttpRequest) -> HttpResponse:
+    """Return the same response as check_auth without blocking.
+
+    Requests this process can answer from memory are answered on the event loop,
+    the rest are handed to the loop's default thread pool.
+    """
+    started = time.perf_counter()
+    try:
+        decision = get_decision(request, local_only=True)
+    except LookupRequired:
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(None, check_auth_blocking, request)
+    record_decision(request, decision, started)
+    return auth_test_response(decision)
+
+
+class LoginView(auth_views.LoginView):
+    """Issue an auth token cookie alongside the session when enabled.
+
+    Outdated password hashes are rehashed in the background, see webapp.hashers.
+    """
+
+    form_class = LoginForm
+
+    def dispatch(self, request, *args, **kwargs):
+        """Time the view."""
+        started = time.perf_counter()
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        finally:
+            metrics.observe(metrics.LOGIN_SECONDS, time.perf_counter() - started)
+
+    def form_valid(self, form):
+        """Log the user in."""
+        response = super().form_valid(form)
+        user = self.request.user
+        if needs_rehash(user.password):
+            # NOTE: Imported here so auth gateway workers only load celery once a
+            # password needs rehashing.
+            # pylint: disable=import-outside-toplevel
+            from webapp import tasks
+
+            tasks.rehash_password.apply_async(
+                [
+                    user.pk,
+                    encrypt_password(form.cleaned_data["password"]),
+                    user.password,
+                    self.request.session.session_key,
+                ]
+            )
+        if settings.AUTH_TOKEN_ENABLED:
+            tokens.set_token_cookie(response, self.request.user.pk)
+        return response
+
+
+def logout_then_login(request, login_url=None):
+    """Log the user out, remove the auth token cookie and redirect to login."""
+    response = auth_views.logout_then_login(request, login_url)
+    tokens.delete_token_cookie(response)
+    return response
+
+
+def metrics_view(request):
+    """Return the Prometheus metrics when enabled."""
+    if not settings.AUTH_METRICS_ENABLED:
+        raise Http404()
+    return HttpResponse(metrics.render(), content_type=CONTENT_TYPE_LATEST)
+
+
+def protected_media(request, path):
+    """Let nginx send a media file if the user may access it.
+
+    The user is checked like auth-test, against the URI nginx forwards in the
+    X-Original-URI header. Anonymous users are redirected to log in.
+    """
+    name = media.get_media_name(path)
+    if not settings.AUTH_MEDIA_BACKEND or name is None:
+        raise Http404()
+    decision = get_decision(request)
+    if decision.status == 401:
+        uri = request.META.get("HTTP_X_ORIGINAL_URI", request.get_full_path())
+        return auth_views.redirect_to_login(uri, reverse("login"))
+    if decision.status == 403:
+        return HttpResponse(status=403)
+    response = HttpResponse(content_type=media.get_content_type(name))
+    response["X-Accel-Redirect"] = media.get_redirect(name)
+    return response
@@ -3,6 +3,9 @@ WSGI config for webapp project.
 
 It exposes the WSGI callable as a module-level variable named ``application``.
 
+When ``settings.AUTH_PROFILE_SAMPLE_EVERY`` or ``settings.AUTH_PROFILE_SLOW_MS`` is
+set, a share of the requests is profiled, see ``webapp.profiling``.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/2.2/howto/deployment/wsgi/
 """
@@ -14,3 +17,9 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "webapp.settings")
 
 application = get_wsgi_application()
+
+# NOTE: The settings can only be read once Django has been set up.
+# pylint: disable=wrong-import-position
+from webapp import profiling  # isort:skip
+
+application = profiling.wrap(application)